@@ -6,16 +6,18 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
+from django.db import transaction
 from datetime import datetime, timedelta
 import json
-from employee.views import (
-    calculate_weekly_hours, calculate_sprint_hours, calculate_monthly_hours,
-    get_upcoming_deadlines )
+from employee.dashboard import build_developer_dashboard_context
 from core.models import (
     User, Department, EmployeeProfile, Project, Task,
-    Sprint, UserActivity, Message, Notification,StandupUpdate
+    UserActivity, Message, Notification
 )
-from django.db.models import Count, Q, Sum
+from core.dashboard_cache import GLOBAL, cached_fragment
+from core.fanout import fan_out
+from core.unread_counts import get_unread_counts
+from django.db.models import Count, Sum
 from django.core.paginator import Paginator
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
@@ -90,104 +92,8 @@ def pm_dashboard_view(request):
 @login_required
 def developer_dashboard(request):
     """Developer dashboard view"""
-    # Get employee profile
     employee = get_object_or_404(EmployeeProfile, user=request.user)
-    
-    # Today's date
-    today = timezone.now().date()
-    
-    # Today's tasks
-    today_tasks = Task.objects.filter(
-        assigned_to=employee,
-        due_date=today,
-        status__in=['todo', 'in_progress']
-    ).select_related('project').prefetch_related('files')
-    
-    # Pending tasks
-    pending_tasks = Task.objects.filter(
-        assigned_to=employee,
-        status__in=['todo', 'in_progress']
-    ).exclude(due_date=today)
-    
-    # Due this week
-    week_end = today + timedelta(days=7)
-    due_this_week = Task.objects.filter(
-        assigned_to=employee,
-        due_date__range=[today, week_end],
-        status__in=['todo', 'in_progress']
-    ).count()
-    
-    # Get current sprint
-    current_sprint = Sprint.objects.filter(
-        project__members__employee=employee,
-        status='active'
-    ).first()
-    
-    # Calculate sprint progress
-    sprint_progress = 0
-    if current_sprint:
-        total_points = current_sprint.total_points()
-        completed_points = current_sprint.completed_points()
-        if total_points > 0:
-            sprint_progress = int((completed_points / total_points) * 100)
-    
-    # Workload calculation
-    weekly_hours = calculate_weekly_hours(employee)
-    sprint_hours = calculate_sprint_hours(employee, current_sprint)
-    monthly_hours = calculate_monthly_hours(employee)
-    
-    # Determine workload status
-    total_hours = weekly_hours.get('percentage', 0)
-    if total_hours >= 90:
-        workload_status = "Overloaded"
-    elif total_hours >= 70:
-        workload_status = "Heavy"
-    elif total_hours >= 40:
-        workload_status = "Manageable"
-    else:
-        workload_status = "Light"
-    
-    # Upcoming deadlines
-    upcoming_deadlines = get_upcoming_deadlines(employee)
-    
-    # Recent messages
-    recent_messages = Message.objects.filter(
-        Q(recipients=request.user) | Q(sender=request.user)
-    ).distinct().select_related('sender', 'task')[:3]
-    
-    # Today's standup (if exists)
-    standup = StandupUpdate.objects.filter(
-        employee=employee,
-        date=today
-    ).first()
-    
-    # Prepare context
-    context = {
-        'employee': employee,
-        'today_tasks': today_tasks,
-        'today_tasks_count': today_tasks.count(),
-        'in_progress_tasks_count': today_tasks.filter(status='in_progress').count(),
-        'pending_tasks_count': pending_tasks.count(),
-        'due_this_week_count': due_this_week,
-        'sprint_progress': sprint_progress,
-        'workload_percentage': weekly_hours.get('percentage', 0),
-        'workload_status': workload_status,
-        'weekly_hours': weekly_hours,
-        'sprint_hours': sprint_hours,
-        'monthly_hours': monthly_hours,
-        'upcoming_deadlines': upcoming_deadlines,
-        'recent_messages': recent_messages,
-        'standup': standup,
-        'unread_notifications': Notification.objects.filter(
-            user=request.user, 
-            is_read=False
-        ).count(),
-        'unread_messages': Message.objects.filter(
-            recipients=request.user,
-            is_read=False
-        ).count(),
-    }
-    
+    context = build_developer_dashboard_context(request.user, employee)
     return render(request, 'employee/dashboard.html', context)
 @login_required
 def employee_dashboard_view(request):
@@ -289,65 +195,50 @@ def api_send_announcement(request):
             return JsonResponse({'error': 'Subject and content are required'}, status=400)
         
         # Get recipients
-        recipients = []
+        recipient_ids = set()
         recipient_data = data.get('recipients', '').split(',')
         
         for recipient in recipient_data:
             if recipient == 'all':
-                recipients.extend(User.objects.filter(is_active=True))
+                recipient_ids.update(User.objects.filter(is_active=True).values_list('id', flat=True))
             elif recipient == 'pms':
-                recipients.extend(User.objects.filter(role='pm', is_active=True))
+                recipient_ids.update(User.objects.filter(role='pm', is_active=True).values_list('id', flat=True))
             elif recipient.startswith('department:'):
                 dept_id = recipient.split(':')[1]
-                employees = EmployeeProfile.objects.filter(
+                recipient_ids.update(EmployeeProfile.objects.filter(
                     department_id=dept_id, 
                     status='active'
-                ).select_related('user')
-                recipients.extend([emp.user for emp in employees])
-        
-        # Remove duplicates
-        recipients = list(set(recipients))
-        
-        # Create message
-        message = Message.objects.create(
-            sender=request.user,
-            message_type='announcement',
-            subject=data['subject'],
-            content=data['content'],
-            is_read=False
-        )
-        
-        # Add recipients
-        message.recipients.set(recipients)
-        
-        # Create notifications for recipients
-        notifications = []
-        for recipient in recipients:
-            notifications.append(
-                Notification(
-                    user=recipient,
-                    notification_type='message',
-                    title=f'New Announcement: {data["subject"]}',
-                    message=data['content'][:100] + '...',
-                    related_id=message.id,
-                    related_type='message'
-                )
+                ).values_list('user_id', flat=True))
+        
+        # Create message and deliver it with notifications to every recipient
+        with transaction.atomic():
+            message = Message.objects.create(
+                sender=request.user,
+                message_type='announcement',
+                subject=data['subject'],
+                content=data['content'],
+                is_read=False
             )
-        
-        Notification.objects.bulk_create(notifications)
+            recipient_count = fan_out(recipient_ids, message=message, notification={
+                'notification_type': 'message',
+                'title': f'New Announcement: {data["subject"]}',
+                'message': data['content'][:100] + '...',
+                'related_id': message.id,
+                'related_type': 'message',
+            })
         
         # Log activity
         UserActivity.objects.create(
             user=request.user,
             action=f'Sent announcement: {data["subject"]}',
-            description=f'To {len(recipients)} recipients',
+            description=f'To {recipient_count} recipients',
             ip_address=request.META.get('REMOTE_ADDR')
         )
         
         return JsonResponse({
             'success': True,
-            'message': f'Announcement sent to {len(recipients)} recipients',
-            'recipient_count': len(recipients)
+            'message': f'Announcement sent to {recipient_count} recipients',
+            'recipient_count': recipient_count
         })
         
     except Exception as e:
@@ -412,49 +303,55 @@ def api_stats_details(request, type):
             
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
-@login_required
-@staff_member_required
-def dashboard_view(request):
-    """Render the admin dashboard"""
-    # Get stats
-    total_projects = Project.objects.count()
-    total_employees = EmployeeProfile.objects.filter(status='active').count()
-    active_pms = User.objects.filter(role='pm', is_active=True).count()
-    pending_tasks = Task.objects.filter(status__in=['todo', 'in_progress']).count()
-    
-    # Get this month's stats
-    today = timezone.now()
+
+
+def build_admin_dashboard_stats(today):
+    """Organisation-wide counts and the five active projects for the admin dashboard"""
     first_day_of_month = today.replace(day=1)
     
-    new_projects_this_month = Project.objects.filter(
-        created_at__gte=first_day_of_month
-    ).count()
-    
-    new_employees_this_month = EmployeeProfile.objects.filter(
-        hire_date__gte=first_day_of_month
-    ).count()
-    
-    overdue_tasks = Task.objects.filter(
-        due_date__lt=today,
-        status__in=['todo', 'in_progress']
-    ).count()
-    
     # Get active projects with progress
-    active_projects = Project.objects.filter(status='active').order_by('-due_date')[:5]
+    active_projects = list(Project.objects.filter(status='active').order_by('-due_date')[:5])
     
     # Add color classes for progress bars
     color_classes = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron']
     for i, project in enumerate(active_projects):
-        # Compute progress based on tasks (completed / total)
-        total_tasks = Task.objects.filter(project=project).count()
-        completed_tasks = Task.objects.filter(project=project, status='done').count()
-        try:
-            project.progress = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
-        except Exception:
-            project.progress = getattr(project, 'progress', 0) or 0
+        # Compute progress from the denormalized task counters (completed / total)
+        if project.tasks_total > 0:
+            project.progress = int((project.tasks_done / project.tasks_total) * 100)
+        else:
+            project.progress = 0
 
         project.color_class = color_classes[i % len(color_classes)]
     
+    return {
+        'total_projects': Project.objects.count(),
+        'total_employees': EmployeeProfile.objects.filter(status='active').count(),
+        'active_pms': User.objects.filter(role='pm', is_active=True).count(),
+        'pending_tasks': Task.objects.filter(status__in=['todo', 'in_progress']).count(),
+        'new_projects_this_month': Project.objects.filter(
+            created_at__gte=first_day_of_month
+        ).count(),
+        'new_employees_this_month': EmployeeProfile.objects.filter(
+            hire_date__gte=first_day_of_month
+        ).count(),
+        'overdue_tasks': Task.objects.filter(
+            due_date__lt=today,
+            status__in=['todo', 'in_progress']
+        ).count(),
+        'active_projects': active_projects,
+    }
+
+
+@login_required
+@staff_member_required
+def dashboard_view(request):
+    """Render the admin dashboard"""
+    today = timezone.now()
+    # Stats and active projects are cached until any task/project/member changes
+    stats = cached_fragment(
+        'admin_stats', [GLOBAL], lambda: build_admin_dashboard_stats(today), parts=[today.date()]
+    )
+    
     # Get recent activities
     recent_activities = UserActivity.objects.select_related('user').order_by('-created_at')[:10]
     
@@ -497,14 +394,7 @@ def dashboard_view(request):
     ).select_related('user')
     
     context = {
-        'total_projects': total_projects,
-        'total_employees': total_employees,
-        'active_pms': active_pms,
-        'pending_tasks': pending_tasks,
-        'new_projects_this_month': new_projects_this_month,
-        'new_employees_this_month': new_employees_this_month,
-        'overdue_tasks': overdue_tasks,
-        'active_projects': active_projects,
+        **stats,
         'recent_activities': recent_activities,
         'managers': managers,
         'departments': departments,
@@ -584,13 +474,10 @@ def employees_view(request):
 @staff_member_required
 def projects_view(request):
     """Render projects page"""
-    # Annotate projects with task counts to compute accurate progress
+    # Task counts come from the denormalized counters on Project
     projects = Project.objects.select_related(
         'department', 'project_manager'
-    ).prefetch_related('members').annotate(
-        total_tasks=Count('tasks'),
-        completed_tasks=Count('tasks', filter=Q(tasks__status='done'))
-    ).all()
+    ).prefetch_related('members').all()
     
     # Get departments and project managers for dropdowns
     departments = Department.objects.filter(status='active')
@@ -604,14 +491,12 @@ def projects_view(request):
     now = timezone.now()
     active_project_count = projects.filter(status='active').count()
     completed_projects_count = projects.filter(status='completed').count()
-    # Compute progress percent for each project using annotated counts
+    # Compute progress percent for each project using the task counters
     for project in projects:
-        total = getattr(project, 'total_tasks', 0) or 0
-        completed = getattr(project, 'completed_tasks', 0) or 0
-        try:
-            project.progress = int((completed / total) * 100) if total > 0 else 0
-        except Exception:
-            project.progress = getattr(project, 'progress', 0) or 0
+        if project.tasks_total > 0:
+            project.progress = int((project.tasks_done / project.tasks_total) * 100)
+        else:
+            project.progress = 0
     context = {
         'projects': projects,
         'departments': departments,
@@ -929,7 +814,7 @@ def api_dashboard_stats(request):
 def api_notification_count(request):
     """API endpoint to get unread notification count"""
     try:
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        count = get_unread_counts(request.user)['notifications']
         return JsonResponse({'count': count})
     except Exception as e:
         return JsonResponse({'count': 0})
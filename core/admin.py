@@ -6,7 +6,8 @@ from .models import (
     Project, ProjectMember, ProjectFile,
     Sprint, SprintReport,
     Task, Subtask, TaskDependency, TimeLog, TaskFile,
-    Message, Comment, Notification, StandupUpdate
+    Message, MessageReceipt, Conversation, ConversationParticipant,
+    Comment, Notification, OutboxEvent, StandupUpdate
 )
 
 # ============================================================
@@ -202,6 +203,27 @@ class MessageAdmin(admin.ModelAdmin):
     list_filter = ('message_type', 'is_read', 'created_at')
 
 
+@admin.register(MessageReceipt)
+class MessageReceiptAdmin(admin.ModelAdmin):
+    list_display = ('message', 'user', 'read_at')
+    search_fields = ('user__username',)
+    raw_id_fields = ('message', 'user')
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('user_low', 'user_high', 'last_message_at', 'created_at')
+    search_fields = ('user_low__username', 'user_high__username')
+    raw_id_fields = ('user_low', 'user_high', 'last_message')
+
+
+@admin.register(ConversationParticipant)
+class ConversationParticipantAdmin(admin.ModelAdmin):
+    list_display = ('user', 'peer', 'unread_count', 'last_message_at')
+    search_fields = ('user__username', 'peer__username')
+    raw_id_fields = ('conversation', 'user', 'peer')
+
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('task', 'user', 'created_at')
@@ -215,6 +237,13 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('title', 'message')
 
 
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'attempts', 'available_at', 'processed_at', 'created_at')
+    list_filter = ('event_type', 'processed_at')
+    search_fields = ('last_error',)
+
+
 @admin.register(StandupUpdate)
 class StandupUpdateAdmin(admin.ModelAdmin):
     list_display = ('employee', 'date', 'created_at')
@@ -0,0 +1,104 @@
+# core/channel_layers.py
+"""Channel layers that report group-send fan-out and latency.
+
+`InstrumentedRedisChannelLayer` (the production layer, see CHANNEL_LAYERS
+in settings) and `InstrumentedInMemoryChannelLayer` behave exactly like
+their Channels counterparts, but after every `group_send` they call each
+registered metrics hook as `hook(group, fanout, seconds)`: the number of
+channels in the group and how long the send took. Hooks come from the
+CHANNEL_LAYER_METRICS_HOOKS setting (dotted paths) or
+`add_group_send_hook()`. With no hooks registered nothing is measured.
+
+Sharding: with several `hosts` the Redis layer spreads channels across
+them by consistent hashing, and each group's membership set lives on one
+host chosen by hashing the group name. Every process must list the hosts
+in the same order.
+
+Backpressure: each channel holds at most `capacity` messages, and a
+message is discarded after `expiry` seconds if nobody reads it.
+`group_send` never raises `ChannelFull`. A channel that is full just
+misses that message (channels_redis logs "channels over capacity" at INFO).
+So a slow client can silently lose real-time events. Clients recover on
+reconnect, when `MessageConsumer` sends fresh unread counts. Only a direct
+`channel_layer.send()` raises `ChannelFull`. Group memberships expire
+after `group_expiry` seconds, so the consumer re-adds its groups
+periodically from its heartbeat.
+"""
+import contextvars
+import logging
+import time
+
+from channels.layers import InMemoryChannelLayer
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_hooks = []
+_configured_hooks = None
+# Fan-out seen by the Redis layer while the current group_send runs
+_fanout = contextvars.ContextVar('group_send_fanout', default=None)
+
+
+def add_group_send_hook(hook):
+    _hooks.append(hook)
+
+
+def remove_group_send_hook(hook):
+    _hooks.remove(hook)
+
+
+def get_group_send_hooks():
+    global _configured_hooks
+    if _configured_hooks is None:
+        _configured_hooks = [
+            import_string(path) for path in getattr(settings, 'CHANNEL_LAYER_METRICS_HOOKS', [])
+        ]
+    return _configured_hooks + _hooks
+
+
+def log_group_send(group, fanout, seconds):
+    """Metrics hook that logs every group send at DEBUG"""
+    logger.debug('group_send %s: %d channels in %.1f ms', group, fanout, seconds * 1000)
+
+
+def report_group_send(group, fanout, seconds):
+    for hook in get_group_send_hooks():
+        try:
+            hook(group, fanout, seconds)
+        except Exception:
+            logger.exception('Channel layer metrics hook %r failed', hook)
+
+
+class InstrumentedRedisChannelLayer(RedisChannelLayer):
+
+    async def group_send(self, group, message):
+        if not get_group_send_hooks():
+            return await super().group_send(group, message)
+        fanout = [0]
+        token = _fanout.set(fanout)
+        start = time.perf_counter()
+        try:
+            await super().group_send(group, message)
+        finally:
+            _fanout.reset(token)
+        report_group_send(group, fanout[0], time.perf_counter() - start)
+
+    def _map_channel_keys_to_connection(self, channel_names, message):
+        # Only group_send calls this, once, with the group's current members
+        fanout = _fanout.get()
+        if fanout is not None:
+            fanout[0] = len(channel_names)
+        return super()._map_channel_keys_to_connection(channel_names, message)
+
+
+class InstrumentedInMemoryChannelLayer(InMemoryChannelLayer):
+
+    async def group_send(self, group, message):
+        if not get_group_send_hooks():
+            return await super().group_send(group, message)
+        start = time.perf_counter()
+        fanout = len(self.groups.get(group, {}))
+        await super().group_send(group, message)
+        report_group_send(group, fanout, time.perf_counter() - start)
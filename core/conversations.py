@@ -0,0 +1,163 @@
+# core/conversations.py
+"""Conversation index for direct messages.
+
+Every send path calls `record_direct_message()` so the inbox can be read
+from ConversationParticipant rows instead of being derived from the whole
+Message/recipients table. Thread history is served in keyset pages on
+`(created_at, id)` by `get_message_page()`.
+"""
+import base64
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+
+from .models import Conversation, ConversationParticipant, Message
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def get_or_create_conversation(user_a, user_b):
+    """Return `(conversation, created)` for the unordered pair of users"""
+    low, high = sorted((user_a.id, user_b.id))
+    with transaction.atomic():
+        conversation, created = Conversation.objects.get_or_create(
+            user_low_id=low, user_high_id=high
+        )
+        if created:
+            ConversationParticipant.objects.bulk_create([
+                ConversationParticipant(conversation=conversation, user_id=low, peer_id=high),
+                ConversationParticipant(conversation=conversation, user_id=high, peer_id=low),
+            ])
+    return conversation, created
+
+
+def record_direct_message(message, sender, recipient, unread=1):
+    """Point the sender/recipient conversation at `message`.
+
+    Bumps the recipient's unread count by `unread` (the number of messages
+    being recorded, `message` being the newest) and moves the thread to the
+    top of both inboxes. Returns `(conversation, created)`; messages to
+    oneself are not indexed and return `(None, False)`.
+    """
+    if sender.id == recipient.id:
+        return None, False
+
+    with transaction.atomic():
+        conversation, created = get_or_create_conversation(sender, recipient)
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message=message, last_message_at=message.created_at
+        )
+        ConversationParticipant.objects.filter(
+            conversation=conversation, user=sender
+        ).update(last_message_at=message.created_at)
+        ConversationParticipant.objects.filter(
+            conversation=conversation, user=recipient
+        ).update(last_message_at=message.created_at, unread_count=F('unread_count') + unread)
+    conversation.last_message = message
+    conversation.last_message_at = message.created_at
+    return conversation, created
+
+
+def mark_conversation_read(user, peer):
+    """Reset `user`'s unread count for their conversation with `peer`"""
+    ConversationParticipant.objects.filter(
+        user=user, peer=peer, unread_count__gt=0
+    ).update(unread_count=0)
+
+
+def decrement_unread(user, peer, count=1):
+    """Take `count` newly read messages off `user`'s unread count with `peer`"""
+    if count <= 0:
+        return
+    ConversationParticipant.objects.filter(
+        user=user, peer=peer, unread_count__gt=0
+    ).update(unread_count=Greatest(F('unread_count') - count, 0))
+
+
+def get_unread_total(user):
+    """Total unread direct messages across all of the user's conversations"""
+    return ConversationParticipant.objects.filter(user=user).aggregate(
+        total=Sum('unread_count')
+    )['total'] or 0
+
+
+def get_inbox(user):
+    """The user's conversations, most recent first, in one indexed query"""
+    return ConversationParticipant.objects.filter(
+        user=user,
+        last_message_at__isnull=False
+    ).select_related(
+        'peer__employee_profile', 'conversation__last_message'
+    ).order_by('-last_message_at')
+
+
+def conversation_exists(user_a, user_b):
+    """Whether the two users have exchanged any direct message"""
+    low, high = sorted((user_a.id, user_b.id))
+    return Conversation.objects.filter(
+        user_low_id=low, user_high_id=high, last_message_at__isnull=False
+    ).exists()
+
+
+def encode_cursor(message):
+    """Opaque cursor for a message's `(created_at, id)` position"""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of `encode_cursor()`; raises ValueError on malformed input"""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def get_page_size(value):
+    """Parse a `limit` query parameter, capped at MAX_PAGE_SIZE"""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def get_message_page(user, peer, before=None, after=None, limit=DEFAULT_PAGE_SIZE,
+                     message_type='direct'):
+    """One page of the thread between `user` and `peer`, oldest first.
+
+    Without a cursor the newest page is returned. `before` walks back to
+    older messages and `after` forward to newer ones; both are cursors from
+    `encode_cursor()`. Returns `(messages, next_cursor)`, where
+    `next_cursor` continues in the same direction and is None at the end.
+    Pass `message_type=None` to include every message type.
+    """
+    thread = Q(sender=user, recipients=peer) | Q(sender=peer, recipients=user)
+    if message_type is not None:
+        thread &= Q(message_type=message_type)
+    messages = Message.objects.filter(thread).select_related('sender')
+
+    if after is not None:
+        created_at, message_id = decode_cursor(after)
+        messages = messages.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+        ).order_by('created_at', 'id')
+    else:
+        if before is not None:
+            created_at, message_id = decode_cursor(before)
+            messages = messages.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+            )
+        messages = messages.order_by('-created_at', '-id')
+
+    page = list(messages[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = encode_cursor(page[-1]) if has_more else None
+    if after is None:
+        page.reverse()
+    return page, next_cursor
+
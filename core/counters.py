@@ -0,0 +1,114 @@
+# core/counters.py
+"""Denormalized task counters on Project and Sprint.
+
+`tasks_total`, `tasks_done`, `tasks_open`, `points_total` and `points_done`
+are maintained incrementally with F() updates whenever a Task is created,
+deleted, changes status/estimate, or moves between projects and sprints
+(see core/signals.py). `tasks_overdue_snapshot` depends on the current date,
+so it is only refreshed by `rebuild_counters()` / the `rebuild_task_counters`
+management command. Nothing schedules that, so views that show an overdue
+count compute it live instead of reading the snapshot.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+OPEN_STATUSES = ('todo', 'in_progress', 'review')
+MAINTAINED_FIELDS = ('tasks_total', 'tasks_done', 'tasks_open', 'points_total', 'points_done')
+COUNTER_FIELDS = MAINTAINED_FIELDS + ('tasks_overdue_snapshot',)
+
+
+def task_counter_state(task):
+    """Snapshot of the Task fields that feed the counters"""
+    hours = task.estimated_hours
+    return {
+        'project_id': task.project_id,
+        'sprint_id': task.sprint_id,
+        'status': task.status,
+        'estimated_hours': Decimal(str(hours)) if hours not in (None, '') else Decimal('0'),
+    }
+
+
+def _contribution(state):
+    done = state['status'] == 'done'
+    return {
+        'tasks_total': 1,
+        'tasks_done': 1 if done else 0,
+        'tasks_open': 1 if state['status'] in OPEN_STATUSES else 0,
+        'points_total': state['estimated_hours'],
+        'points_done': state['estimated_hours'] if done else 0,
+    }
+
+
+def apply_task_counter_change(old_state, new_state):
+    """Move a task's contribution from `old_state` to `new_state`.
+
+    Either state may be None (task created / deleted). Issues at most one
+    UPDATE per affected project and sprint, and none if nothing relevant
+    changed.
+    """
+    from .models import Project, Sprint
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        for field, value in _contribution(state).items():
+            deltas[(Project, state['project_id'])][field] += sign * value
+            if state['sprint_id'] is not None:
+                deltas[(Sprint, state['sprint_id'])][field] += sign * value
+
+    for (model, pk), fields in deltas.items():
+        changes = {field: F(field) + value for field, value in fields.items() if value}
+        if pk is not None and changes:
+            model.objects.filter(pk=pk).update(**changes)
+
+
+def _counter_annotations(prefix, today):
+    points = DecimalField(max_digits=10, decimal_places=2)
+    open_q = Q(**{f'{prefix}status__in': OPEN_STATUSES})
+    done_q = Q(**{f'{prefix}status': 'done'})
+    return {
+        'calc_tasks_total': Count(f'{prefix}id'),
+        'calc_tasks_done': Count(f'{prefix}id', filter=done_q),
+        'calc_tasks_open': Count(f'{prefix}id', filter=open_q),
+        'calc_tasks_overdue_snapshot': Count(
+            f'{prefix}id', filter=open_q & Q(**{f'{prefix}due_date__lt': today})
+        ),
+        'calc_points_total': Coalesce(
+            Sum(f'{prefix}estimated_hours'), Value(Decimal('0')), output_field=points
+        ),
+        'calc_points_done': Coalesce(
+            Sum(f'{prefix}estimated_hours', filter=done_q), Value(Decimal('0')), output_field=points
+        ),
+    }
+
+
+def rebuild_counters(queryset, fix=True, today=None):
+    """Recompute counters for a Project or Sprint queryset from the tasks table.
+
+    Returns a list of `(obj, {field: (stored, actual)})` for every row whose
+    maintained counters had drifted. With `fix=True` all counters, including
+    the overdue snapshot, are written back with a single bulk update.
+    """
+    if today is None:
+        today = timezone.now().date()
+
+    rows = list(queryset.order_by().annotate(**_counter_annotations('tasks__', today)))
+    drifted = []
+    for obj in rows:
+        drift = {}
+        for field in COUNTER_FIELDS:
+            actual = getattr(obj, f'calc_{field}')
+            if field in MAINTAINED_FIELDS and getattr(obj, field) != actual:
+                drift[field] = (getattr(obj, field), actual)
+            setattr(obj, field, actual)
+        if drift:
+            drifted.append((obj, drift))
+
+    if fix and rows:
+        queryset.model.objects.bulk_update(rows, COUNTER_FIELDS, batch_size=500)
+    return drifted
@@ -0,0 +1,106 @@
+# core/dashboard_cache.py
+"""Versioned cache for dashboard fragments.
+
+Expensive dashboard blocks are cached with `cached_fragment()`. Each block
+names the scopes it was built from. A scope is `('project', id)`,
+`('employee', id)` or `('global',)`, and the scope's version is part of the
+cache key:
+
+    dash:<fragment>:project5-<version>.global-<version>:<extra parts>
+
+core/signals.py calls `bump_versions_on_commit()` when a Task, Sprint,
+ProjectMember, TimeLog, Project or EmployeeProfile is saved or deleted.
+Bumping a version makes every fragment built from that scope unreachable,
+and the stale entries then age out after `FRAGMENT_TIMEOUT`. Invalidation
+is exact for model saves and deletes. Queryset `update()`/`bulk_create()`
+paths skip the signals, so they must bump the scopes themselves.
+
+Versions are bumped only after the transaction commits. A version read
+before a rebuild is therefore never paired with data from an uncommitted
+write. A version key that is missing (evicted or never set) starts at the
+current time in nanoseconds, so it can never match a key that was used
+before. Cache (Redis) errors are logged, and the fragment is then built
+from the database.
+"""
+import logging
+import time
+
+import redis
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_TIMEOUT = 10 * 60
+GLOBAL = ('global',)
+
+_missing = object()
+
+
+def version_key(scope):
+    return 'dashver:' + ':'.join(str(part) for part in scope)
+
+
+def get_versions(scopes):
+    """Current version of each scope, creating any that are missing"""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        initial = time.time_ns()
+        for key in missing:
+            cache.add(key, initial, timeout=None)
+        # Another process may have created the key first
+        created = cache.get_many(missing)
+        versions.update({key: created.get(key, initial) for key in missing})
+    return [versions[key] for key in keys]
+
+
+def fragment_key(name, scopes, versions, parts=()):
+    scope_part = '.'.join(
+        f"{''.join(str(part) for part in scope)}-{version}"
+        for scope, version in zip(scopes, versions)
+    )
+    return ':'.join(['dash', name, scope_part, *(str(part) for part in parts)])
+
+
+def cached_fragment(name, scopes, build, parts=(), timeout=FRAGMENT_TIMEOUT):
+    """Return `build()` from the cache under the current versions of `scopes`.
+
+    `parts` are extra key components (a date, a sprint id) for values that
+    also depend on things no signal tracks. `build()` must return
+    something picklable, e.g. a list rather than a queryset.
+    """
+    try:
+        key = fragment_key(name, scopes, get_versions(scopes), parts)
+        value = cache.get(key, _missing)
+    except redis.RedisError:
+        logger.exception('Failed to read dashboard fragment %s', name)
+        return build()
+
+    if value is _missing:
+        value = build()
+        try:
+            cache.set(key, value, timeout)
+        except redis.RedisError:
+            logger.exception('Failed to cache dashboard fragment %s', name)
+    return value
+
+
+def bump_versions(scopes):
+    """Invalidate every fragment built from any of `scopes`"""
+    for scope in set(scopes):
+        key = version_key(scope)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # No version yet: nothing was cached under this scope
+                cache.add(key, time.time_ns(), timeout=None)
+        except redis.RedisError:
+            logger.exception('Failed to bump dashboard cache version %s', key)
+
+
+def bump_versions_on_commit(scopes):
+    scopes = set(scopes)
+    transaction.on_commit(lambda: bump_versions(scopes))
@@ -0,0 +1,149 @@
+# core/fanout.py
+"""Bulk delivery of one message/notification to many recipients.
+
+Announcements, meeting invitations, sprint starts and "assign to all"
+tasks used to add recipients and create notifications one row at a time.
+`fan_out()` writes the recipient (MessageReceipt) rows and notifications
+with chunked `bulk_create` inside a single transaction, then publishes
+the real-time events for every recipient in one pipelined Redis call once
+the transaction has committed, along with their new unread counts.
+"""
+import json
+import logging
+import os
+import time
+
+import redis
+from django.db import transaction
+
+from .models import MessageReceipt, Notification
+from .unread_counts import record_unread
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CHUNK_SIZE = 1000
+
+_redis_url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+redis_client = redis.from_url(_redis_url)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _message_event(message):
+    return {
+        'type': 'announcement',
+        'message_id': message.id,
+        'sender_id': message.sender_id,
+        'subject': message.subject,
+        'content': message.content,
+        'timestamp': message.created_at.isoformat(),
+    }
+
+
+def notification_event(notification):
+    return {
+        'type': 'notification',
+        'notification_type': notification['notification_type'],
+        'title': notification['title'],
+        'message': notification['message'],
+        'related_id': notification.get('related_id'),
+        'related_type': notification.get('related_type', ''),
+    }
+
+
+def publish_events(events, raise_errors=False):
+    """Publish `(user_id, payload)` pairs to `user_<id>` channels in one pipeline.
+
+    `recipient_id` defaults to the channel's user unless the payload sets it.
+    `published_at` lets the Redis bridge measure delivery lag.
+    Redis errors are logged and swallowed unless `raise_errors` is set.
+    """
+    if not events:
+        return
+    published_at = time.time()
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id, payload in events:
+            pipe.publish(f'user_{user_id}', json.dumps(
+                {'recipient_id': user_id, **payload, 'published_at': published_at}
+            ))
+        pipe.execute()
+    except redis.RedisError:
+        if raise_errors:
+            raise
+        logger.exception('Failed to publish fan-out events to %d recipients', len(events))
+
+
+def fan_out(recipient_ids, message=None, notification=None, notification_overrides=None,
+            publish=True, chunk_size=FANOUT_CHUNK_SIZE):
+    """Deliver `message` and/or a notification to every user in `recipient_ids`.
+
+    `message` is a Message instance (saved here if it is new); a receipt
+    row is created for each recipient. `notification` is a dict of
+    Notification field values shared by all recipients, and
+    `notification_overrides` optionally maps a user id to the fields that
+    differ for that user (e.g. the `related_id` of their own task).
+    `publish=False` skips the real-time events; the unread counts are still
+    updated. Recipients who already have a receipt for an existing
+    `message` get neither a second event nor a second unread. Returns the number of distinct recipients.
+    """
+    recipient_ids = sorted({int(user_id) for user_id in recipient_ids})
+    notification_overrides = notification_overrides or {}
+    events = []
+
+    with transaction.atomic():
+        received = []
+        if message is not None:
+            if message.pk is None:
+                message.save()
+                existing = set()
+            else:
+                # Users who already have a receipt aren't delivered or counted twice
+                existing = set()
+                for chunk in _chunks(recipient_ids, chunk_size):
+                    existing.update(MessageReceipt.objects.filter(
+                        message=message, user_id__in=chunk
+                    ).values_list('user_id', flat=True))
+            received = [user_id for user_id in recipient_ids if user_id not in existing]
+            for chunk in _chunks(received, chunk_size):
+                MessageReceipt.objects.bulk_create(
+                    [MessageReceipt(message=message, user_id=user_id) for user_id in chunk],
+                    ignore_conflicts=True,
+                )
+            event = _message_event(message)
+            events.extend((user_id, event) for user_id in received)
+
+        if notification is not None:
+            for chunk in _chunks(recipient_ids, chunk_size):
+                rows = [
+                    dict(notification, **notification_overrides.get(user_id, {}))
+                    for user_id in chunk
+                ]
+                Notification.objects.bulk_create([
+                    Notification(user_id=user_id, **fields)
+                    for user_id, fields in zip(chunk, rows)
+                ])
+                events.extend(
+                    (user_id, notification_event(fields)) for user_id, fields in zip(chunk, rows)
+                )
+
+        # The unread counters are bumped even when the events aren't published;
+        # only direct messages count towards the unread message badge
+        added = dict.fromkeys(recipient_ids, 1)
+        direct = message is not None and message.message_type == 'direct'
+        delivered = dict.fromkeys(received, 1)
+
+        def deliver():
+            if publish:
+                publish_events(events)
+            record_unread(
+                notifications=added if notification is not None else None,
+                messages=delivered if direct else None,
+            )
+
+        transaction.on_commit(deliver)
+
+    return len(recipient_ids)
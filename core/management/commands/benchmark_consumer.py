@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from core.models import User
+from project_manager.consumers import MessageConsumer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure direct-message throughput of MessageConsumer in this process "
+        "(one daphne worker's worth) by driving concurrent in-process sockets. "
+        "Benchmark users and their messages are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages', type=int, default=1000,
+            help='Messages to send in total (default: 1000).',
+        )
+        parser.add_argument(
+            '--connections', type=int, default=10,
+            help='Concurrent sender sockets (default: 10).',
+        )
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also run with batched writes disabled (one write per frame).',
+        )
+
+    def handle(self, *args, **options):
+        password = make_password(None)
+        connections = options['connections']
+        # PMs can message anyone, so the senders need no throwaway project
+        User.objects.bulk_create([
+            User(username=f'consumer-bench-{i}', password=password, role='pm')
+            for i in range(connections + 1)
+        ])
+        users = list(User.objects.filter(username__startswith='consumer-bench-').order_by('id'))
+        try:
+            modes = [('batched', True)] + ([('per-frame', False)] if options['compare'] else [])
+            for label, batched in modes:
+                elapsed = self.run_once(users[1:], users[0], options['messages'], batched)
+                self.stdout.write(
+                    f"{label}: {options['messages']} messages over {connections} sockets in "
+                    f"{elapsed * 1000:.0f} ms ({options['messages'] / elapsed:.0f} msg/s)"
+                )
+        finally:
+            User.objects.filter(username__startswith='consumer-bench-').delete()
+
+    def run_once(self, senders, recipient, total, batched):
+        per_socket = max(1, total // len(senders))
+
+        async def drive(sender):
+            communicator = WebsocketCommunicator(MessageConsumer.as_asgi(), '/ws/messages/')
+            communicator.scope['user'] = sender
+            await communicator.connect()
+            await communicator.receive_json_from()  # connection_established
+            await communicator.receive_json_from()  # unread_counts
+            for i in range(per_socket):
+                await communicator.send_json_to(
+                    {'type': 'direct_message', 'recipient_id': recipient.id, 'content': f'bench {i}'}
+                )
+            received = 0
+            while received < per_socket:
+                reply = await communicator.receive_json_from(timeout=30)
+                received += reply['type'] == 'direct_message'
+            await communicator.disconnect()
+
+        async def run():
+            start = time.perf_counter()
+            await asyncio.gather(*(drive(sender) for sender in senders))
+            return time.perf_counter() - start
+
+        rate_limits = (MessageConsumer.frame_rate, MessageConsumer.frame_burst, MessageConsumer.batch_messages)
+        MessageConsumer.frame_rate = MessageConsumer.frame_burst = float('inf')
+        MessageConsumer.batch_messages = batched
+        try:
+            return async_to_sync(run)()
+        finally:
+            MessageConsumer.frame_rate, MessageConsumer.frame_burst, MessageConsumer.batch_messages = rate_limits
@@ -0,0 +1,79 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.fanout import fan_out, publish_events
+from core.models import Message, Notification, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Time fan_out() delivering an announcement with notifications to "
+        "throwaway recipients. All rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1000, 10000],
+            help='Recipient counts to benchmark (default: 1000 10000).',
+        )
+        parser.add_argument(
+            '--publish', action='store_true',
+            help='Also publish the real-time events to Redis.',
+        )
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also time the per-recipient add()/create() loop it replaced.',
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            self.report('fan_out', size, self.run_once(size, options['publish']))
+            if options['compare']:
+                self.report('per-row', size, self.run_once(size, False, per_row=True))
+
+    def report(self, label, size, elapsed):
+        self.stdout.write(
+            f'{label} {size} recipients: {elapsed * 1000:.0f} ms '
+            f'({elapsed / size * 1e6:.1f} us/recipient)'
+        )
+
+    def run_once(self, size, publish, per_row=False):
+        password = make_password(None)
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=f'fanout-bench-{i}', password=password) for i in range(size)
+            ], batch_size=1000)
+            recipient_ids = list(
+                User.objects.filter(username__startswith='fanout-bench-').values_list('id', flat=True)
+            )
+
+            message = Message(
+                sender_id=recipient_ids[0], message_type='announcement',
+                subject='Benchmark', content='Fan-out benchmark',
+            )
+            notification = {
+                'notification_type': 'message',
+                'title': 'Benchmark',
+                'message': 'Fan-out benchmark',
+                'related_type': 'message',
+            }
+
+            start = time.perf_counter()
+            if per_row:
+                message.save()
+                for user_id in recipient_ids:
+                    message.recipients.add(user_id)
+                    Notification.objects.create(user_id=user_id, **notification)
+            else:
+                fan_out(recipient_ids, message=message, notification=notification, publish=False)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        if publish:
+            start = time.perf_counter()
+            publish_events([(user_id, {'type': 'benchmark'}) for user_id in recipient_ids])
+            elapsed += time.perf_counter() - start
+        return elapsed
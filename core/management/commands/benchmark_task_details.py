@@ -0,0 +1,118 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import (
+    Comment, Department, EmployeeProfile, Project, Subtask, Task, TaskFile, TimeLog, User,
+)
+from employee.task_details import build_task_data, with_task_details
+
+
+class Command(BaseCommand):
+    help = (
+        "Time building the My Tasks modal payloads for one employee with "
+        "synthetic tasks (subtasks, files, comments, time logs). All rows are "
+        "rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Task counts to benchmark (default: 10 100 1000).',
+        )
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also time the per-task queries the prefetching replaced.',
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            with transaction.atomic():
+                employee = self.create_tasks(size)
+                tasks = Task.objects.filter(assigned_to=employee)
+                self.report('prefetched', size, *self.measure(
+                    lambda: build_task_data(with_task_details(tasks))
+                ))
+                if options['compare']:
+                    self.report('per-task', size, *self.measure(
+                        lambda: self.build_per_task(tasks)
+                    ))
+                transaction.set_rollback(True)
+
+    def measure(self, build):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            build()
+            elapsed = time.perf_counter() - start
+        return elapsed, len(ctx.captured_queries)
+
+    def report(self, label, size, elapsed, queries):
+        self.stdout.write(
+            f'{label} {size} tasks: {elapsed * 1000:.0f} ms, {queries} queries '
+            f'({elapsed / size * 1000:.2f} ms/task)'
+        )
+
+    def create_tasks(self, size):
+        today = timezone.now().date()
+        user = User.objects.create(username='task-bench', password=make_password(None))
+        department = Department.objects.create(name='Task benchmark')
+        employee = EmployeeProfile.objects.create(
+            user=user, employee_id='TASK-BENCH', department=department,
+            job_position='Developer', hire_date=today,
+        )
+        project = Project.objects.create(
+            name='Task benchmark', department=department, project_manager=user,
+            project_type='web', status='active', start_date=today, due_date=today + timedelta(days=30),
+        )
+        Task.objects.bulk_create([
+            Task(
+                title=f'Task {i}', project=project, assigned_to=employee, status='todo',
+                estimated_hours=Decimal('4.00'), due_date=today + timedelta(days=i % 30),
+            )
+            for i in range(size)
+        ], batch_size=1000)
+        task_ids = list(Task.objects.filter(assigned_to=employee).values_list('id', flat=True))
+
+        Subtask.objects.bulk_create([
+            Subtask(task_id=task_id, title=f'Subtask {n}', is_completed=n == 0)
+            for task_id in task_ids for n in range(3)
+        ], batch_size=1000)
+        TaskFile.objects.bulk_create([
+            TaskFile(task_id=task_id, file=f'task_files/bench-{n}.txt', name=f'bench-{n}.txt', uploaded_by=user)
+            for task_id in task_ids for n in range(2)
+        ], batch_size=1000)
+        Comment.objects.bulk_create([
+            Comment(task_id=task_id, user=user, content=f'Comment {n}')
+            for task_id in task_ids for n in range(2)
+        ], batch_size=1000)
+        TimeLog.objects.bulk_create([
+            TimeLog(task_id=task_id, employee=employee, date=today - timedelta(days=n), hours=Decimal('1.00'))
+            for task_id in task_ids for n in range(8)
+        ], batch_size=1000)
+        return employee
+
+    def build_per_task(self, tasks):
+        """The loop my_tasks used before: several queries for every task"""
+        data = {}
+        for t in tasks.select_related('project__project_manager').prefetch_related('files'):
+            subtasks = t.subtasks.all()
+            data[t.id] = {
+                'subtasks_count': subtasks.count(),
+                'subtasks_completed': subtasks.filter(is_completed=True).count(),
+                'recent_subtasks': list(subtasks.order_by('-created_at')[:5]),
+                'files': [f.name for f in t.files.all()],
+                'attachments': t.files.count(),
+                'comments': [
+                    c.user.get_full_name()
+                    for c in Comment.objects.filter(task=t).select_related('user').order_by('created_at')
+                ],
+                'activity': list(TimeLog.objects.filter(task=t).order_by('-date')[:5]),
+                'assigned_to': t.assigned_to.get_full_name() if t.assigned_to else '',
+            }
+        return data
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.outbox import DEFAULT_BATCH_SIZE, dispatch_batch, purge_processed
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver pending outbox events as notifications and real-time pushes. "
+        "Runs as a long-lived worker unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Events per batch (default: {DEFAULT_BATCH_SIZE}).',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to sleep when the outbox is empty (default: 1).',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain everything that is currently due, then exit.',
+        )
+        parser.add_argument(
+            '--purge-days', type=int, default=7,
+            help='Delete delivered events older than this many days (default: 7).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        try:
+            while True:
+                delivered, failed = dispatch_batch(batch_size)
+                if delivered or failed:
+                    self.stdout.write(f'Delivered {delivered} event(s), {failed} failed')
+                if delivered + failed == batch_size:
+                    continue
+
+                purge_processed(timezone.now() - timedelta(days=options['purge_days']))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Outbox dispatcher stopped'))
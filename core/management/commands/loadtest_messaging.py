@@ -0,0 +1,95 @@
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from project_manager.loadtest import DEFAULT_MIX, MessagingLoadTest, parse_mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Open N authenticated ws/messages/ sockets against the ASGI application "
+        "in this process (one daphne worker) and drive a mix of messages, typing "
+        "indicators and read receipts. Writes a JSON report with connection setup "
+        "latency, delivery p50/p99 and memory per connection. Throwaway users, "
+        "sessions and messages are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=50,
+            help='Concurrent WebSocket clients (default: 50).',
+        )
+        parser.add_argument(
+            '--frames', type=int, default=20,
+            help='Frames each client sends (default: 20).',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=2.0,
+            help='Frames per second per client; 0 sends as fast as possible (default: 2).',
+        )
+        parser.add_argument(
+            '--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+            help='Frame weights as send=N,typing=N,read=N (default: %(default)s).',
+        )
+        parser.add_argument(
+            '--drain-timeout', type=float, default=10.0,
+            help='Seconds to wait for outstanding deliveries (default: 10).',
+        )
+        parser.add_argument('--seed', type=int, help='Random seed for a repeatable frame mix.')
+        parser.add_argument(
+            '--redis-layer', action='store_true',
+            help='Use the configured channel layer instead of an in-memory stand-in.',
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 2:
+            raise CommandError('--clients must be at least 2')
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Imported here: building the ASGI application sets up routing and middleware
+        from project_management.asgi import application
+
+        password = make_password(None)
+        # PMs can message anyone, so the ring needs no throwaway project
+        User.objects.bulk_create([
+            User(username=f'loadtest-{i}', password=password, role='pm')
+            for i in range(options['clients'])
+        ])
+        users = list(User.objects.filter(username__startswith='loadtest-').order_by('id'))
+        previous_layer = None
+        if not options['redis_layer']:
+            previous_layer = channel_layers.set(
+                DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer(capacity=10000)
+            )
+        load_test = MessagingLoadTest(
+            application, users, frames=options['frames'], rate=options['rate'], mix=mix,
+            drain_timeout=options['drain_timeout'], seed=options['seed'],
+        )
+        try:
+            load_test.prepare()
+            report = async_to_sync(load_test.run)()
+        finally:
+            if previous_layer is not None:
+                channel_layers.set(DEFAULT_CHANNEL_LAYER, previous_layer)
+            elif not options['redis_layer']:
+                channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            load_test.end_sessions()
+            User.objects.filter(username__startswith='loadtest-').delete()
+
+        report['config']['channel_layer'] = 'configured' if options['redis_layer'] else 'in-memory'
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.counters import rebuild_counters
+from core.models import Project, Sprint
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized task counters on projects and sprints, "
+        "report any drift, and refresh the overdue snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift without writing; exit with an error if any is found.',
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        total_drift = 0
+
+        for model in (Project, Sprint):
+            drifted = rebuild_counters(model.objects.all(), fix=not check_only)
+            total_drift += len(drifted)
+            for obj, drift in drifted:
+                details = ', '.join(
+                    f'{field}: {stored} -> {actual}' for field, (stored, actual) in drift.items()
+                )
+                self.stdout.write(f'{model.__name__} {obj.pk} drifted ({details})')
+
+        if check_only and total_drift:
+            raise CommandError(f'{total_drift} counter row(s) out of sync')
+
+        verb = 'Found' if check_only else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total_drift} drifted counter row(s)'))
@@ -0,0 +1,45 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from project_manager.redis_listener import RedisBridge
+
+
+class Command(BaseCommand):
+    help = (
+        "Forward real-time events published on the user_* Redis channels to "
+        "the WebSocket groups of connected clients. Runs until interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Maximum events forwarded per batch (default: 100).',
+        )
+        parser.add_argument(
+            '--flush-interval', type=float, default=0.005,
+            help='Seconds to wait for a batch to fill (default: 0.005).',
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60,
+            help='Seconds between throughput/lag reports; 0 disables them (default: 60).',
+        )
+
+    def handle(self, *args, **options):
+        bridge = RedisBridge(
+            batch_size=options['batch_size'], flush_interval=options['flush_interval']
+        )
+        try:
+            asyncio.run(bridge.run(options['stats_interval'], on_stats=self.report))
+        except KeyboardInterrupt:
+            pass
+        self.report(bridge.stats.snapshot())
+        self.stdout.write(self.style.SUCCESS('Redis bridge stopped'))
+
+    def report(self, stats):
+        self.stdout.write(
+            f"forwarded {stats['forwarded']} of {stats['received']} received "
+            f"({stats['per_second']:.1f}/s), {stats['dropped']} dropped, "
+            f"{stats['failed']} failed, avg batch {stats['avg_batch']:.1f}, "
+            f"lag avg {stats['avg_lag_ms']:.1f} ms / max {stats['max_lag_ms']:.1f} ms"
+        )
@@ -0,0 +1,172 @@
+# core/messaging.py
+"""Single write and delivery path for direct messages.
+
+The PM messages API, the employee messages page and the WebSocket consumer
+all send direct messages through `MessagingService.send_direct()`: one
+Message insert, one recipient (MessageReceipt) insert and the conversation
+index update in a single transaction, then one channel-layer `group_send`
+to the recipient's `chat_user_<id>` group once it has committed, carrying
+the recipient's new unread totals. Every path pushes the same
+`direct_message` payload. `send_direct_batch()` does
+the same for a burst of messages from one sender with bulk inserts.
+
+Each path checks `can_message()` before sending: admins, project
+managers and HR can message (and be messaged by) any active user, anyone
+else only people they share a project with.
+"""
+import asyncio
+import logging
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection, transaction
+
+from .conversations import record_direct_message
+from .models import Message, MessageReceipt, Project
+from .outbox import enqueue_notification
+from .project_events import project_membership
+from .unread_counts import update_unread_counts
+
+logger = logging.getLogger(__name__)
+
+# Roles that can message, and be messaged by, any active user
+UNRESTRICTED_ROLES = ('admin', 'pm', 'hr')
+
+AVATAR_COLORS = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron', 'brown-red']
+
+
+def get_user_color(user_id):
+    """Get consistent color for user avatar"""
+    return f"bg-{AVATAR_COLORS[user_id % len(AVATAR_COLORS)]}"
+
+
+def get_initials(user):
+    if user.first_name and user.last_name:
+        return f"{user.first_name[0]}{user.last_name[0]}"
+    return user.username[:2].upper()
+
+
+def can_message(sender, recipient):
+    """Whether `sender` may send direct messages to `recipient`"""
+    if not recipient.is_active:
+        return False
+    if sender.is_superuser or {sender.role, recipient.role} & set(UNRESTRICTED_ROLES):
+        return True
+    # Chained filters join the memberships separately, so both must match
+    return Project.objects.filter(project_membership(sender.id)).filter(
+        project_membership(recipient.id)
+    ).exists()
+
+
+class MessagingService:
+    """Create direct messages and push them to the recipient in real time"""
+
+    def __init__(self, channel_layer=None):
+        self.channel_layer = channel_layer or get_channel_layer()
+
+    @staticmethod
+    def direct_message_payload(message, sender, recipient):
+        return {
+            'type': 'direct_message',
+            'message_id': message.id,
+            'sender_id': sender.id,
+            'sender_name': sender.get_full_name() or sender.username,
+            'recipient_id': recipient.id,
+            'content': message.content,
+            'task_id': message.task_id,
+            'timestamp': message.created_at.isoformat(),
+            'avatar_color': get_user_color(sender.id),
+            'initials': get_initials(sender),
+        }
+
+    def send_direct(self, sender, recipient, content, task=None, notify=False, subject=''):
+        """Store a direct message and deliver it to `recipient` after commit.
+
+        With `notify` the recipient also gets a 'New Message' notification
+        through the outbox. Returns `(message, payload, new_conversation)`;
+        the caller echoes `payload` back to the sender itself.
+        """
+        with transaction.atomic():
+            message = Message.objects.create(
+                sender=sender, message_type='direct', content=content, task=task, subject=subject,
+            )
+            MessageReceipt.objects.create(message=message, user=recipient)
+            _, new_conversation = record_direct_message(message, sender, recipient)
+            if notify:
+                enqueue_notification(
+                    recipient.id,
+                    notification_type='message',
+                    title='New Message',
+                    message=f'You have a new message from {sender.get_full_name()}',
+                    related_id=message.id,
+                    related_type='message'
+                )
+
+            payload = self.direct_message_payload(message, sender, recipient)
+            deliveries = [(recipient.id, payload)]
+            transaction.on_commit(lambda: self.deliver(deliveries))
+        return message, payload, new_conversation
+
+    def send_direct_batch(self, sender, items):
+        """Store `(recipient, content)` messages from `sender` in one transaction.
+
+        Messages and receipts are bulk inserted and each conversation is
+        updated once for the whole batch. Returns the payloads in order.
+        """
+        with transaction.atomic():
+            messages = [
+                Message(sender=sender, message_type='direct', content=content) for _, content in items
+            ]
+            if connection.features.can_return_rows_from_bulk_insert:
+                Message.objects.bulk_create(messages)
+            else:
+                # MySQL cannot hand back the new primary keys from a bulk insert
+                for message in messages:
+                    message.save()
+            MessageReceipt.objects.bulk_create([
+                MessageReceipt(message=message, user=recipient)
+                for message, (recipient, _) in zip(messages, items)
+            ])
+
+            latest = {}
+            added = Counter()
+            for message, (recipient, _) in zip(messages, items):
+                latest[recipient.id] = (recipient, message)
+                added[recipient.id] += 1
+            for recipient_id, (recipient, message) in latest.items():
+                record_direct_message(message, sender, recipient, unread=added[recipient_id])
+
+            deliveries = [
+                (recipient.id, self.direct_message_payload(message, sender, recipient))
+                for message, (recipient, _) in zip(messages, items)
+            ]
+            transaction.on_commit(lambda: self.deliver(deliveries))
+        return [payload for _, payload in deliveries]
+
+    def deliver(self, deliveries):
+        """Bump unread counts, then group_send each `(recipient_id, payload)` (best effort).
+
+        Each event carries the recipient's new unread totals, so delivering
+        a message costs one Redis pipeline and one `group_send` per recipient.
+        """
+        counts = update_unread_counts(messages=Counter(recipient_id for recipient_id, _ in deliveries))
+        if self.channel_layer is None:
+            return
+
+        async def send_all():
+            return await asyncio.gather(*(
+                self.channel_layer.group_send(f'chat_user_{recipient_id}', {
+                    'type': 'chat_message',
+                    'message': payload,
+                    'unread_counts': counts.get(recipient_id),
+                })
+                for recipient_id, payload in deliveries
+            ), return_exceptions=True)
+
+        for (recipient_id, payload), result in zip(deliveries, async_to_sync(send_all)()):
+            if isinstance(result, Exception):
+                logger.error(
+                    'Failed to deliver message %s to user %s: %s',
+                    payload['message_id'], recipient_id, result
+                )
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:00
+
+import datetime
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+OPEN_STATUSES = ('todo', 'in_progress', 'review')
+
+
+def backfill_task_counters(apps, schema_editor):
+    """Compute each project's and sprint's counters from its tasks.
+
+    Uses only the historical models and the logic inlined here, so later
+    changes to core.counters cannot change what this migration does.
+    """
+    today = datetime.date.today()
+    points = DecimalField(max_digits=10, decimal_places=2)
+    open_q = Q(tasks__status__in=OPEN_STATUSES)
+    done_q = Q(tasks__status='done')
+    for model_name in ('Project', 'Sprint'):
+        model = apps.get_model('core', model_name)
+        rows = list(model.objects.order_by().annotate(
+            calc_tasks_total=Count('tasks__id'),
+            calc_tasks_done=Count('tasks__id', filter=done_q),
+            calc_tasks_open=Count('tasks__id', filter=open_q),
+            calc_tasks_overdue_snapshot=Count('tasks__id', filter=open_q & Q(tasks__due_date__lt=today)),
+            calc_points_total=Coalesce(Sum('tasks__estimated_hours'), Value(Decimal('0')), output_field=points),
+            calc_points_done=Coalesce(
+                Sum('tasks__estimated_hours', filter=done_q), Value(Decimal('0')), output_field=points
+            ),
+        ))
+        fields = [
+            'tasks_total', 'tasks_done', 'tasks_open', 'tasks_overdue_snapshot',
+            'points_total', 'points_done',
+        ]
+        for row in rows:
+            for field in fields:
+                setattr(row, field, getattr(row, f'calc_{field}'))
+        model.objects.bulk_update(rows, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='points_done',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='points_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='tasks_done',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='tasks_open',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='tasks_overdue_snapshot',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='tasks_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='points_done',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='points_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='tasks_done',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='tasks_open',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='tasks_overdue_snapshot',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='tasks_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_task_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_conversations(apps, schema_editor):
+    Message = apps.get_model('core', 'Message')
+    Conversation = apps.get_model('core', 'Conversation')
+    ConversationParticipant = apps.get_model('core', 'ConversationParticipant')
+
+    threads = {}
+    rows = Message.recipients.through.objects.filter(
+        message__message_type='direct'
+    ).values_list(
+        'message_id', 'message__sender_id', 'user_id', 'message__created_at', 'message__is_read'
+    ).order_by('message__created_at', 'message_id')
+    for message_id, sender_id, recipient_id, created_at, is_read in rows.iterator():
+        if sender_id == recipient_id:
+            continue
+        key = tuple(sorted((sender_id, recipient_id)))
+        thread = threads.setdefault(key, {'unread': dict.fromkeys(key, 0)})
+        thread['last_message_id'] = message_id
+        thread['last_message_at'] = created_at
+        if not is_read:
+            thread['unread'][recipient_id] += 1
+
+    Conversation.objects.bulk_create([
+        Conversation(
+            user_low_id=low, user_high_id=high,
+            last_message_id=thread['last_message_id'],
+            last_message_at=thread['last_message_at'],
+        )
+        for (low, high), thread in threads.items()
+    ], batch_size=500)
+
+    conversation_ids = {
+        (low, high): pk
+        for pk, low, high in Conversation.objects.values_list('id', 'user_low_id', 'user_high_id')
+    }
+    participants = []
+    for (low, high), thread in threads.items():
+        for user_id, peer_id in ((low, high), (high, low)):
+            participants.append(ConversationParticipant(
+                conversation_id=conversation_ids[(low, high)],
+                user_id=user_id,
+                peer_id=peer_id,
+                unread_count=thread['unread'][user_id],
+                last_message_at=thread['last_message_at'],
+            ))
+    ConversationParticipant.objects.bulk_create(participants, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.message')),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'unique_together': {('user_low', 'user_high')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ConversationParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.IntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='core.conversation')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='core_conver_user_id_5c8221_idx')],
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_conversations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'message_type', '-created_at', '-id'], name='core_messag_sender__17041c_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_read_at(apps, schema_editor):
+    Message = apps.get_model('core', 'Message')
+    MessageReceipt = apps.get_model('core', 'MessageReceipt')
+    MessageReceipt.objects.filter(message__is_read=True).update(
+        read_at=Subquery(
+            Message.objects.filter(pk=OuterRef('message_id')).values('created_at')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_message_thread_index'),
+    ]
+
+    operations = [
+        # The auto-created recipients table already has these columns and the
+        # (message, user) unique constraint; only the model state changes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='MessageReceipt',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='core.message')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_receipts', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'core_message_recipients',
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='message',
+                    name='recipients',
+                    field=models.ManyToManyField(related_name='received_messages', through='core.MessageReceipt', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='messagereceipt',
+                    unique_together={('message', 'user')},
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='messagereceipt',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='messagereceipt',
+            index=models.Index(fields=['user', 'read_at'], name='core_messag_user_id_fc3922_idx'),
+        ),
+        migrations.RunPython(backfill_read_at, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from .counters import apply_task_counter_change, task_counter_state
 
 
 # ==================== USERS MODELS ====================
@@ -178,6 +180,13 @@ class Project(models.Model):
     actual_cost = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, 
                                  related_name='created_projects')
+    # Denormalized task counters, see core/counters.py
+    tasks_total = models.IntegerField(default=0)
+    tasks_done = models.IntegerField(default=0)
+    tasks_open = models.IntegerField(default=0)
+    tasks_overdue_snapshot = models.IntegerField(default=0)
+    points_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    points_done = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -232,6 +241,18 @@ class ProjectFile(models.Model):
 
 
 # ==================== SPRINT MODELS ====================
+class SprintQuerySet(models.QuerySet):
+    def with_task_stats(self):
+        """Annotate task counts and point sums for every sprint in one query"""
+        return self.annotate(
+            total_tasks=Count('tasks'),
+            completed_tasks=Count('tasks', filter=Q(tasks__status='done')),
+            in_progress_tasks=Count('tasks', filter=Q(tasks__status='in_progress')),
+            total_points_sum=Sum('tasks__estimated_hours'),
+            completed_points_sum=Sum('tasks__estimated_hours', filter=Q(tasks__status='done')),
+        )
+
+
 class Sprint(models.Model):
     SPRINT_STATUS = [
         ('planned', 'Planned'),
@@ -246,26 +267,52 @@ class Sprint(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     status = models.CharField(max_length=20, choices=SPRINT_STATUS, default='planned')
+    # Denormalized task counters, see core/counters.py
+    tasks_total = models.IntegerField(default=0)
+    tasks_done = models.IntegerField(default=0)
+    tasks_open = models.IntegerField(default=0)
+    tasks_overdue_snapshot = models.IntegerField(default=0)
+    points_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    points_done = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SprintQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-start_date']
     
     def __str__(self):
         return f"{self.name} - {self.project.name}"
     
+    def point_totals(self):
+        """Return (total, completed) points.
+
+        Reuses `with_task_stats()` annotations or prefetched tasks when present,
+        otherwise reads the denormalized `points_total`/`points_done` columns.
+        """
+        if hasattr(self, 'total_points_sum'):
+            return self.total_points_sum or 0, self.completed_points_sum or 0
+        
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('tasks')
+        if prefetched is not None:
+            total = sum(task.estimated_hours for task in prefetched)
+            completed = sum(task.estimated_hours for task in prefetched if task.status == 'done')
+            return total, completed
+        
+        return self.points_total, self.points_done
+    
     def total_points(self):
-        return sum(task.estimated_hours for task in self.tasks.all())
+        return self.point_totals()[0]
     
     def completed_points(self):
-        return sum(task.estimated_hours for task in self.tasks.filter(status='done'))
+        return self.point_totals()[1]
     
     def progress_percentage(self):
-        total = self.total_points()
+        total, completed = self.point_totals()
         if total == 0:
             return 0
-        return int((self.completed_points() / total) * 100)
+        return int((completed / total) * 100)
     
     def days_remaining(self):
         today = timezone.now().date()
@@ -341,6 +388,37 @@ class Task(models.Model):
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded state so a delete can adjust project/sprint counters
+        if not instance.get_deferred_fields() & {'project_id', 'sprint_id', 'status', 'estimated_hours'}:
+            instance._counter_state = task_counter_state(instance)
+        # And the assignee, so a reassignment invalidates both dashboards
+        instance._loaded_assigned_to_id = instance.__dict__.get('assigned_to_id')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'project', 'project_id', 'sprint', 'sprint_id', 'status', 'estimated_hours'} & set(update_fields):
+            return super().save(*args, **kwargs)
+        
+        with transaction.atomic():
+            # Lock the row and diff against what is stored now, not what this
+            # instance loaded: a concurrent save may have changed it since
+            old_state = None
+            if self.pk and not self._state.adding:
+                old = Task.objects.select_for_update().filter(pk=self.pk).order_by().only(
+                    'project_id', 'sprint_id', 'status', 'estimated_hours'
+                ).first()
+                old_state = task_counter_state(old) if old else None
+            # post_save receivers read the previous state from here
+            self._counter_state = old_state
+            super().save(*args, **kwargs)
+            new_state = task_counter_state(self)
+            apply_task_counter_change(old_state, new_state)
+            self._counter_state = new_state
+    
     def is_overdue(self):
         today = timezone.now().date()
         return self.status != 'done' and today > self.due_date
@@ -402,7 +480,8 @@ class Message(models.Model):
     ]
     
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
-    recipients = models.ManyToManyField(User, related_name='received_messages')
+    recipients = models.ManyToManyField(User, related_name='received_messages',
+                                        through='MessageReceipt')
     message_type = models.CharField(max_length=20, choices=MESSAGE_TYPE_CHOICES)
     subject = models.CharField(max_length=200, blank=True)
     content = models.TextField()
@@ -415,6 +494,10 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset scan for conversation history (see core/conversations.py)
+            models.Index(fields=['sender', 'message_type', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender}"
@@ -436,6 +519,71 @@ class Message(models.Model):
         return colors[color_index]
 
 
+class MessageReceipt(models.Model):
+    """Per-recipient read state for a message (the `recipients` through table).
+
+    `read_at` is null until the recipient reads the message, so a user's
+    unread count is an index-only count on (user, read_at).
+    """
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_receipts')
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'core_message_recipients'
+        unique_together = ['message', 'user']
+        indexes = [
+            models.Index(fields=['user', 'read_at']),
+        ]
+    
+    def __str__(self):
+        return f"Receipt for message {self.message_id} to {self.user_id}"
+
+
+class Conversation(models.Model):
+    """Direct-message thread between two users, keyed by the unordered pair.
+
+    `user_low`/`user_high` hold the smaller/larger user id so each pair maps
+    to exactly one row. Maintained by core/conversations.py on every send.
+    """
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, 
+                                   null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['user_low', 'user_high']
+        ordering = ['-last_message_at']
+    
+    def __str__(self):
+        return f"Conversation {self.user_low_id}-{self.user_high_id}"
+
+
+class ConversationParticipant(models.Model):
+    """One user's side of a conversation: their peer and unread count.
+
+    `last_message_at` is copied from the conversation so the inbox is a
+    single index scan on (user, last_message_at).
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    unread_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['conversation', 'user']
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['user', '-last_message_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.peer_id} ({self.unread_count} unread)"
+
+
 class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -476,6 +624,37 @@ class Notification(models.Model):
         ]
 
 
+class OutboxEvent(models.Model):
+    """Side effect recorded in the same transaction as a domain change.
+
+    Rows are drained by the `dispatch_outbox` management command (see
+    core/outbox.py), which turns them into Notification rows and real-time
+    pushes. A row stays pending until dispatch commits, so delivery is
+    at-least-once.
+    """
+    EVENT_TYPE_CHOICES = [
+        ('notification', 'Notification'),
+        ('push', 'Real-time Push'),
+    ]
+    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    payload = models.JSONField()
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['processed_at', 'available_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_event_type_display()} #{self.pk}"
+
+
 class StandupUpdate(models.Model):
     employee = models.ForeignKey(EmployeeProfile, on_delete=models.CASCADE, 
                                related_name='standup_updates')
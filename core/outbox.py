@@ -0,0 +1,141 @@
+# core/outbox.py
+"""Transactional outbox for notifications and real-time pushes.
+
+Request handlers call `enqueue_notification()` / `enqueue_push()` inside
+the same transaction as their domain change, which costs a single INSERT
+and rolls back with it. The `dispatch_outbox` management command drains
+pending rows with `dispatch_batch()`: each batch becomes one bulk insert of
+Notification rows, marked processed in the same transaction, and one
+pipelined Redis publish. Anything that fails is retried with exponential
+backoff, so delivery is at-least-once.
+
+The real-time push for a notification is best effort: it is published
+after the Notification rows have committed, so a Redis outage delays the
+badge update but can never roll back or drop the notification itself.
+`push` events have no database side, so their publish must succeed and a
+Redis error sends them round the retry loop.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .fanout import FANOUT_CHUNK_SIZE, notification_event, publish_events
+from .models import Notification, OutboxEvent
+from .unread_counts import record_unread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 5
+
+
+def _user_ids(recipients):
+    if isinstance(recipients, (list, tuple, set, frozenset)):
+        return sorted({getattr(user, 'id', user) for user in recipients})
+    return [getattr(recipients, 'id', recipients)]
+
+
+def enqueue_notification(recipients, **fields):
+    """Queue a Notification with `fields` for a user, user id, or collection of them"""
+    return OutboxEvent.objects.create(
+        event_type='notification',
+        payload={'recipient_ids': _user_ids(recipients), 'notification': fields},
+    )
+
+
+def enqueue_push(recipients, data):
+    """Queue a real-time `data` payload for the recipients' `user_<id>` channels"""
+    return OutboxEvent.objects.create(
+        event_type='push',
+        payload={'recipient_ids': _user_ids(recipients), 'data': data},
+    )
+
+
+def pending_events(now=None):
+    """Rows that are due for (re)delivery, oldest first"""
+    return OutboxEvent.objects.filter(
+        processed_at__isnull=True,
+        available_at__lte=now or timezone.now(),
+        attempts__lt=MAX_ATTEMPTS,
+    ).order_by('id')
+
+
+def _deliver(events):
+    notifications = []
+    notification_pushes = []
+    pushes = []
+    for event in events:
+        recipient_ids = event.payload['recipient_ids']
+        if event.event_type == 'notification':
+            fields = event.payload['notification']
+            notifications.extend(Notification(user_id=user_id, **fields) for user_id in recipient_ids)
+            notification_pushes.extend((user_id, notification_event(fields)) for user_id in recipient_ids)
+        elif event.event_type == 'push':
+            pushes.extend((user_id, event.payload['data']) for user_id in recipient_ids)
+        else:
+            raise ValueError(f'Unknown outbox event type: {event.event_type}')
+
+    Notification.objects.bulk_create(notifications, batch_size=FANOUT_CHUNK_SIZE)
+    publish_events(pushes, raise_errors=True)
+    if notifications:
+        added = Counter(notification.user_id for notification in notifications)
+
+        def push_notifications():
+            # Best effort: errors are logged, the rows are already committed
+            publish_events(notification_pushes)
+            record_unread(notifications=added)
+
+        transaction.on_commit(push_notifications)
+
+
+def _record_failure(event, error, now):
+    event.attempts += 1
+    event.last_error = f'{type(error).__name__}: {error}'
+    event.available_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (event.attempts - 1))
+    event.save(update_fields=['attempts', 'last_error', 'available_at'])
+    if event.attempts >= MAX_ATTEMPTS:
+        logger.error('Outbox event %s gave up after %d attempts: %s', event.pk, event.attempts, error)
+
+
+def dispatch_batch(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """Deliver up to `batch_size` pending events; returns `(delivered, failed)`.
+
+    The whole batch is delivered with one bulk insert and one publish. If
+    that fails, events are retried one by one so a single bad row cannot
+    hold back the rest; failures are rescheduled with backoff.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        events = list(pending_events(now).select_for_update(skip_locked=True)[:batch_size])
+        if not events:
+            return 0, 0
+
+        try:
+            with transaction.atomic():
+                _deliver(events)
+            delivered, failed = events, []
+        except Exception:
+            delivered, failed = [], []
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        _deliver([event])
+                    delivered.append(event)
+                except Exception as e:
+                    _record_failure(event, e, now)
+                    failed.append(event)
+
+        OutboxEvent.objects.filter(id__in=[event.id for event in delivered]).update(
+            processed_at=now
+        )
+    return len(delivered), len(failed)
+
+
+def purge_processed(older_than):
+    """Delete delivered rows processed before `older_than`"""
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=older_than).delete()
+    return deleted
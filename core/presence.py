@@ -0,0 +1,129 @@
+# core/presence.py
+"""Online presence backed by a Redis sorted set.
+
+`presence:last_seen` scores each connected user id with the time it was
+last seen, refreshed by `MessageConsumer` on connect and on every client
+heartbeat. `presence:connections` counts open sockets per user so a user
+with several tabs only goes offline when the last one closes. A user is
+online while their score is newer than `ONLINE_TIMEOUT_SECONDS`;
+`get_presence()` answers that for any number of users with one ZMSCORE.
+
+Sockets that die without a clean disconnect are removed by
+`sweep_stale()`, which heartbeats run at most once per timeout window
+across all processes. The consumer broadcasts changes to the
+`user_status` group as `user_status` events. Redis errors are logged and
+treated as "offline".
+"""
+import logging
+import os
+import time
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+_redis_url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+redis_client = redis.from_url(_redis_url)
+
+LAST_SEEN_KEY = 'presence:last_seen'
+CONNECTIONS_KEY = 'presence:connections'
+SWEEP_LOCK_KEY = 'presence:sweep_lock'
+PRESENCE_GROUP = 'user_status'
+HEARTBEAT_SECONDS = 30
+ONLINE_TIMEOUT_SECONDS = 90
+
+
+def _is_fresh(score, now):
+    return score is not None and score >= now - ONLINE_TIMEOUT_SECONDS
+
+
+def touch(user_id, connected=False, now=None):
+    """Refresh `user_id`'s last-seen time; returns True if they just came online.
+
+    `connected` also counts a newly opened socket.
+    """
+    now = now or time.time()
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zscore(LAST_SEEN_KEY, user_id)
+        pipe.zadd(LAST_SEEN_KEY, {user_id: now})
+        if connected:
+            pipe.hincrby(CONNECTIONS_KEY, user_id, 1)
+        previous = pipe.execute()[0]
+    except redis.RedisError:
+        logger.exception('Failed to update presence for user %s', user_id)
+        return False
+    return not _is_fresh(previous, now)
+
+
+def disconnect(user_id):
+    """Count a closed socket; returns True if it was the user's last one"""
+    try:
+        if redis_client.hincrby(CONNECTIONS_KEY, user_id, -1) > 0:
+            return False
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hdel(CONNECTIONS_KEY, user_id)
+        pipe.zrem(LAST_SEEN_KEY, user_id)
+        pipe.execute()
+    except redis.RedisError:
+        logger.exception('Failed to update presence for user %s', user_id)
+        return False
+    return True
+
+
+def get_presence(user_ids, now=None):
+    """`{user_id: {'is_online': bool, 'last_seen': timestamp or None}}` in one ZMSCORE"""
+    user_ids = [int(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+    now = now or time.time()
+    try:
+        scores = redis_client.zmscore(LAST_SEEN_KEY, user_ids)
+    except redis.RedisError:
+        logger.exception('Failed to read presence for %d users', len(user_ids))
+        scores = [None] * len(user_ids)
+    return {
+        user_id: {'is_online': _is_fresh(score, now), 'last_seen': score}
+        for user_id, score in zip(user_ids, scores)
+    }
+
+
+def is_online(user_id):
+    return get_presence([user_id])[int(user_id)]['is_online']
+
+
+def sweep_stale(now=None, force=False):
+    """Drop users not seen within the timeout; returns their ids.
+
+    Unless `force` is set this only runs if no other process has swept in
+    the last timeout window.
+    """
+    now = now or time.time()
+    cutoff = now - ONLINE_TIMEOUT_SECONDS
+    try:
+        if not force and not redis_client.set(SWEEP_LOCK_KEY, 1, nx=True, ex=ONLINE_TIMEOUT_SECONDS):
+            return []
+        # Read and remove in one MULTI so a concurrent heartbeat is not lost
+        pipe = redis_client.pipeline()
+        pipe.zrangebyscore(LAST_SEEN_KEY, '-inf', f'({cutoff}')
+        pipe.zremrangebyscore(LAST_SEEN_KEY, '-inf', f'({cutoff}')
+        stale = [int(user_id) for user_id in pipe.execute()[0]]
+        if stale:
+            redis_client.hdel(CONNECTIONS_KEY, *stale)
+    except redis.RedisError:
+        logger.exception('Failed to sweep stale presence entries')
+        return []
+    return stale
+
+
+def presence_event(user_id, online, now=None):
+    """Channel-layer event announcing a presence change to the `user_status` group"""
+    return {
+        'type': 'user_status_update',
+        'message': {
+            'type': 'user_status',
+            'user_id': user_id,
+            'is_online': online,
+            'last_seen': now or time.time(),
+        },
+    }
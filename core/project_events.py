@@ -0,0 +1,63 @@
+# core/project_events.py
+"""Project-scoped real-time events.
+
+Every `MessageConsumer` joins a `project_<id>` group for each project the
+user manages or is an active member of. An event about a project (a task
+changing status, a sprint starting) is then one `group_send` to that group
+instead of one send per member. Clients get it as a `project_update`
+message. Memberships are read when the socket connects, so people added to
+a project get its events after they reconnect.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Project
+
+logger = logging.getLogger(__name__)
+
+
+def project_group(project_id):
+    return f'project_{project_id}'
+
+
+def project_membership(user_id):
+    """Q matching the projects `user_id` manages or is an active member of"""
+    return (
+        Q(project_manager_id=user_id)
+        | Q(members__employee__user_id=user_id, members__is_active=True)
+    )
+
+
+def user_project_ids(user_id):
+    """Ids of projects `user_id` manages or is an active member of"""
+    return list(
+        Project.objects.filter(project_membership(user_id)).values_list('id', flat=True).distinct()
+    )
+
+
+def project_event(project_id, event_type, **data):
+    """Channel-layer event for everyone connected to `project_id`"""
+    return {
+        'type': 'project_update',
+        'message': {'type': event_type, 'project_id': project_id, **data},
+    }
+
+
+def broadcast_project_event(project_id, event_type, **data):
+    """Send a project event once the current transaction commits (best effort)"""
+    event = project_event(project_id, event_type, **data)
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(project_group(project_id), event)
+        except Exception:
+            logger.exception('Failed to send %s to project %s', event_type, project_id)
+
+    transaction.on_commit(send)
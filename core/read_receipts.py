@@ -0,0 +1,109 @@
+# core/read_receipts.py
+"""Read receipts for direct messages.
+
+Read state lives per recipient on MessageReceipt.read_at. All read paths
+(HTTP endpoints and the WebSocket consumer) go through `mark_read_upto()`,
+which marks a whole range of a peer's messages read in bulk and adjusts
+the conversation and cached unread counters. The sender is then told
+with a single aggregated `message_read` event rather than one event per
+message.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .conversations import decrement_unread, mark_conversation_read
+from .models import Message, MessageReceipt
+from .unread_counts import record_unread
+
+logger = logging.getLogger(__name__)
+
+
+def mark_read_upto(reader, peer, upto_id=None, message_type='direct'):
+    """Mark unread messages from `peer` to `reader` with id <= `upto_id` read.
+
+    `peer` may be a user or a user id. With `upto_id=None` every unread
+    message from the peer is marked. Pass `message_type=None` to include
+    all message types. Only the reader's MessageReceipt rows change;
+    `Message.is_read` is kept in step for direct messages, which have a
+    single recipient. Returns the number of receipts updated.
+    """
+    receipts = MessageReceipt.objects.filter(
+        user=reader, read_at__isnull=True, message__sender=peer
+    )
+    if message_type is not None:
+        receipts = receipts.filter(message__message_type=message_type)
+    if upto_id is not None:
+        receipts = receipts.filter(message_id__lte=upto_id)
+
+    if message_type in (None, 'direct'):
+        direct = Message.objects.filter(
+            sender=peer, message_type='direct', is_read=False,
+            receipts__user=reader, receipts__read_at__isnull=True
+        )
+        if upto_id is not None:
+            direct = direct.filter(id__lte=upto_id)
+        direct.update(is_read=True)
+    if message_type is None:
+        # Only direct messages count towards the cached unread total
+        direct_read = receipts.filter(message__message_type='direct').count()
+    updated = receipts.update(read_at=timezone.now())
+    if message_type is not None:
+        direct_read = updated if message_type == 'direct' else 0
+
+    if upto_id is None:
+        mark_conversation_read(reader, peer)
+    else:
+        decrement_unread(reader, peer, updated)
+    if direct_read:
+        reader_id = reader.id
+        transaction.on_commit(lambda: record_unread(messages={reader_id: -direct_read}))
+    return updated
+
+
+def count_unread(user):
+    """Unread messages of every type for `user`, counted on the receipt index"""
+    return MessageReceipt.objects.filter(user=user, read_at__isnull=True).count()
+
+
+def mark_page_read(reader, peer, messages):
+    """Mark everything from `peer` up to the newest message on the page read"""
+    if not messages:
+        return 0
+    peer_id = getattr(peer, 'id', peer)
+    updated = mark_read_upto(reader, peer_id, max(m.id for m in messages))
+    if updated:
+        for message in messages:
+            if message.sender_id == peer_id:
+                message.is_read = True
+    return updated
+
+
+def read_receipt_event(reader_id, upto_id, count):
+    """Channel-layer event telling a sender their messages were read"""
+    return {
+        'type': 'chat_receipt',
+        'message': {
+            'type': 'message_read',
+            'reader_id': reader_id,
+            'upto_message_id': upto_id,
+            'count': count,
+        },
+    }
+
+
+def publish_read_receipt(reader, sender, upto_id, count):
+    """Send one aggregated receipt to `sender`'s WebSocket group (best effort)"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not count:
+        return
+    sender_id = getattr(sender, 'id', sender)
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f'chat_user_{sender_id}', read_receipt_event(reader.id, upto_id, count)
+        )
+    except Exception:
+        logger.exception('Failed to publish read receipt to user %s', sender_id)
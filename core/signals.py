@@ -0,0 +1,110 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import apply_task_counter_change, task_counter_state
+from .dashboard_cache import GLOBAL, bump_versions_on_commit
+from .fanout import notification_event
+from .models import (
+    Comment, EmployeeProfile, Message, Notification, Project, ProjectMember, Sprint, Subtask, Task,
+    TaskFile, TimeLog,
+)
+from .unread_counts import record_unread
+
+
+@receiver(post_delete, sender=Task)
+def remove_task_from_counters(sender, instance, **kwargs):
+    """Take a deleted task out of its project and sprint counters.
+
+    Runs inside the delete transaction for both Task.delete() and queryset
+    deletes.
+    """
+    state = getattr(instance, '_counter_state', None) or task_counter_state(instance)
+    apply_task_counter_change(state, None)
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, **kwargs):
+    """Count a new notification and push it to the user once committed.
+
+    Bulk paths (fan_out, the outbox dispatcher) skip this signal and call
+    `record_unread()` themselves.
+    """
+    if not created or instance.is_read:
+        return
+    user_id = instance.user_id
+    event = notification_event({
+        'notification_type': instance.notification_type,
+        'title': instance.title,
+        'message': instance.message,
+        'related_id': instance.related_id,
+        'related_type': instance.related_type,
+    })
+    transaction.on_commit(
+        lambda: record_unread(notifications={user_id: 1}, notification=event)
+    )
+
+
+@receiver(m2m_changed, sender=Message.recipients.through)
+def count_new_recipients(sender, instance, action, reverse, pk_set, **kwargs):
+    """Count a direct message as unread for recipients added with add()/set()"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # user.received_messages.add(*messages)
+        direct = Message.objects.filter(pk__in=pk_set, message_type='direct').count()
+        if not direct:
+            return
+        changes = {instance.pk: direct}
+    elif instance.message_type == 'direct':
+        changes = dict.fromkeys(pk_set, 1)
+    else:
+        return
+    transaction.on_commit(lambda: record_unread(messages=changes))
+
+
+@receiver([post_save, post_delete], sender=Task)
+def invalidate_task_dashboards(sender, instance, **kwargs):
+    """Bump the dashboard cache for the task's project(s) and assignee(s), old and new"""
+    scopes = {GLOBAL, ('project', instance.project_id)}
+    old_state = getattr(instance, '_counter_state', None)
+    if old_state is not None:
+        scopes.add(('project', old_state['project_id']))
+    for employee_id in (instance.assigned_to_id, getattr(instance, '_loaded_assigned_to_id', None)):
+        if employee_id is not None:
+            scopes.add(('employee', employee_id))
+    instance._loaded_assigned_to_id = instance.assigned_to_id
+    bump_versions_on_commit(scopes)
+
+
+@receiver([post_save, post_delete], sender=Sprint)
+@receiver([post_save, post_delete], sender=Project)
+def invalidate_project_dashboards(sender, instance, **kwargs):
+    project_id = instance.pk if sender is Project else instance.project_id
+    bump_versions_on_commit({GLOBAL, ('project', project_id)})
+
+
+@receiver([post_save, post_delete], sender=ProjectMember)
+def invalidate_member_dashboards(sender, instance, **kwargs):
+    bump_versions_on_commit({GLOBAL, ('project', instance.project_id), ('employee', instance.employee_id)})
+
+
+@receiver([post_save, post_delete], sender=TimeLog)
+@receiver([post_save, post_delete], sender=EmployeeProfile)
+def invalidate_employee_dashboards(sender, instance, **kwargs):
+    employee_id = instance.pk if sender is EmployeeProfile else instance.employee_id
+    bump_versions_on_commit({GLOBAL, ('employee', employee_id)})
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Subtask)
+@receiver([post_save, post_delete], sender=TaskFile)
+@receiver([post_save, post_delete], sender=TimeLog)
+def touch_task(sender, instance, **kwargs):
+    """Move the task's `updated_at` so the task_detail ETag changes.
+
+    A queryset update, so Task signals (and their cache bumps) don't fire.
+    """
+    Task.objects.filter(pk=instance.task_id).update(updated_at=timezone.now())
@@ -0,0 +1,200 @@
+# core/test_utils.py
+"""Fixtures and fakes shared by the apps' test suites.
+
+`ProjectFixturesMixin` sets up a project manager, an active project with
+an active sprint, and helpers to staff it, fill it with tasks and log in
+as one of its developers. `FakeRedis` stands in for the Redis clients of
+core.presence and core.unread_counts (see `use_fake_redis()`), and
+`FakePubSub` replays messages into the Redis bridge.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.utils import timezone
+
+from .models import (
+    Comment, Department, EmployeeProfile, Project, ProjectMember, Sprint, Subtask, Task, TaskFile,
+    TimeLog, User,
+)
+
+PASSWORD = 'password123'
+
+
+class ProjectFixturesMixin:
+    """A PM with an active project and sprint; the client is logged in as the PM"""
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+        self.pm = User.objects.create_user(
+            username='pm', password=PASSWORD, role='pm', first_name='Pat', last_name='Manager'
+        )
+        self.department = Department.objects.create(name='Engineering')
+        self.project = Project.objects.create(
+            name='Apollo',
+            description='Test project',
+            department=self.department,
+            project_manager=self.pm,
+            project_type='web',
+            status='active',
+            start_date=self.today - timedelta(days=30),
+            due_date=self.today + timedelta(days=30),
+        )
+        self.sprint = self.add_sprint('Sprint 1')
+        self.client.force_login(self.pm)
+
+    def add_sprint(self, name):
+        return Sprint.objects.create(
+            project=self.project, name=name, status='active',
+            start_date=self.today - timedelta(days=3), end_date=self.today + timedelta(days=11),
+        )
+
+    def add_employee(self, username, member=True, **user_fields):
+        """An employee profile for a new developer, by default a member of the project"""
+        user = User.objects.create_user(username=username, password=PASSWORD, **user_fields)
+        employee = EmployeeProfile.objects.create(
+            user=user,
+            employee_id=username.upper(),
+            department=self.department,
+            job_position='Developer',
+            hire_date=self.today - timedelta(days=365),
+        )
+        if member:
+            ProjectMember.objects.create(project=self.project, employee=employee, role='dev')
+        return employee
+
+    def add_members(self, count):
+        offset = ProjectMember.objects.filter(project=self.project).count()
+        return [
+            self.add_employee(f'dev{i}', first_name='Dev', last_name=f'{i}')
+            for i in range(offset, offset + count)
+        ]
+
+    def add_task(self, status='todo', sprint=None, assigned_to=None, due_in=7, hours='4.00', **fields):
+        return Task.objects.create(
+            title=f'Task {status}',
+            description='',
+            project=self.project,
+            sprint=sprint,
+            assigned_to=assigned_to,
+            status=status,
+            estimated_hours=Decimal(hours),
+            due_date=self.today + timedelta(days=due_in),
+            **fields
+        )
+
+    def log_in_developer(self, member=False):
+        """Create `self.employee` (`self.user`) and log the client in as them"""
+        self.employee = self.add_employee('dev', member=member, first_name='Dana', last_name='Dev')
+        self.user = self.employee.user
+        self.client.force_login(self.user)
+
+    def add_assigned_task(self, subtasks=0, completed=0, time_logs=0):
+        """A task due today for `self.employee`, with a file, a comment and the given activity"""
+        task = self.add_task(assigned_to=self.employee, due_in=0, progress=10)
+        for i in range(subtasks):
+            Subtask.objects.create(task=task, title=f'Subtask {i}', is_completed=i < completed)
+        for i in range(time_logs):
+            TimeLog.objects.create(
+                task=task, employee=self.employee, date=self.today - timedelta(days=i), hours=1
+            )
+        TaskFile.objects.create(task=task, file='task_files/spec.txt', name='spec.txt', uploaded_by=self.user)
+        Comment.objects.create(task=task, user=self.user, content='Looks good')
+        return task
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.calls.append((method, args, kwargs))
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+class FakeRedis:
+    """Just enough of a Redis client (hashes, sorted sets, pipelines) for the tests"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+        self.strings = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v).encode() for k, v in mapping.items()})
+        return len(mapping)
+
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[str(field)] = str(int(fields.get(str(field), 0)) + amount).encode()
+        return int(fields[str(field)])
+
+    def hdel(self, key, *fields):
+        return sum(self.hashes.get(key, {}).pop(str(field), None) is not None for field in fields)
+
+    def expire(self, key, seconds):
+        return key in self.hashes
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def zadd(self, key, mapping):
+        members = self.zsets.setdefault(key, {})
+        added = sum(str(member) not in members for member in mapping)
+        members.update({str(member): float(score) for member, score in mapping.items()})
+        return added
+
+    def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(str(member))
+
+    def zmscore(self, key, members):
+        return [self.zscore(key, member) for member in members]
+
+    def zrem(self, key, *members):
+        return sum(self.zsets.get(key, {}).pop(str(member), None) is not None for member in members)
+
+    def _below(self, key, bound):
+        cutoff = float(bound.lstrip('('))
+        return [m for m, score in self.zsets.get(key, {}).items() if score < cutoff]
+
+    def zrangebyscore(self, key, low, high):
+        return [member.encode() for member in self._below(key, high)]
+
+    def zremrangebyscore(self, key, low, high):
+        return self.zrem(key, *self._below(key, high))
+
+
+def use_fake_redis(test, *modules):
+    """Point the `redis_client` of each module at one FakeRedis for the duration of `test`"""
+    fake = FakeRedis()
+    for module in modules:
+        patcher = mock.patch(f'{module}.redis_client', fake)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return fake
+
+
+class FakePubSub:
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
@@ -1,3 +1,1013 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .channel_layers import (
+    InstrumentedInMemoryChannelLayer, InstrumentedRedisChannelLayer, add_group_send_hook,
+    remove_group_send_hook,
+)
+from . import dashboard_cache
+from .conversations import (
+    conversation_exists, decrement_unread, decode_cursor, get_inbox,
+    get_message_page, get_page_size, get_unread_total, mark_conversation_read,
+    record_direct_message
+)
+from .fanout import fan_out
+from . import presence
+from .messaging import MessagingService, can_message
+from .outbox import MAX_ATTEMPTS, dispatch_batch, enqueue_notification, enqueue_push
+from .read_receipts import count_unread, mark_page_read, mark_read_upto
+from .test_utils import FakePipeline, ProjectFixturesMixin, use_fake_redis
+from .unread_counts import get_unread_counts, unread_key, update_unread_counts
+from . import workload
+from .models import (
+    User, Project, ProjectMember, Sprint, Task, TimeLog,
+    Message, MessageReceipt, Conversation, ConversationParticipant, Notification,
+    OutboxEvent
+)
+
+
+class SprintStatsTests(ProjectFixturesMixin, TestCase):
+
+    def test_with_task_stats_annotates_all_sprints_in_one_query(self):
+        other = self.add_sprint('Sprint 2')
+        self.add_task('todo', sprint=self.sprint, hours='3.00')
+        self.add_task('in_progress', sprint=self.sprint, hours='2.00')
+        self.add_task('done', sprint=self.sprint, hours='5.00')
+        self.add_task('done', sprint=other, hours='1.00')
+
+        with self.assertNumQueries(1):
+            sprints = {s.id: s for s in Sprint.objects.with_task_stats()}
+
+        sprint = sprints[self.sprint.id]
+        self.assertEqual(sprint.total_tasks, 3)
+        self.assertEqual(sprint.completed_tasks, 1)
+        self.assertEqual(sprint.in_progress_tasks, 1)
+        self.assertEqual(sprint.total_points_sum, Decimal('10.00'))
+        self.assertEqual(sprint.completed_points_sum, Decimal('5.00'))
+        self.assertEqual(sprints[other.id].total_tasks, 1)
+
+    def test_point_methods_reuse_annotations(self):
+        self.add_task('done', sprint=self.sprint, hours='4.00')
+        self.add_task('todo', sprint=self.sprint, hours='4.00')
+        sprint = Sprint.objects.with_task_stats().get(id=self.sprint.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(sprint.total_points(), Decimal('8.00'))
+            self.assertEqual(sprint.completed_points(), Decimal('4.00'))
+            self.assertEqual(sprint.progress_percentage(), 50)
+
+    def test_point_methods_reuse_prefetched_tasks(self):
+        self.add_task('done', sprint=self.sprint, hours='1.00')
+        self.add_task('review', sprint=self.sprint, hours='3.00')
+        sprint = Sprint.objects.prefetch_related('tasks').get(id=self.sprint.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(sprint.point_totals(), (Decimal('4.00'), Decimal('1.00')))
+
+    def test_point_totals_read_counter_columns(self):
+        self.add_task('done', sprint=self.sprint, hours='2.00')
+        sprint = Sprint.objects.get(id=self.sprint.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(sprint.progress_percentage(), 100)
+
+    def test_empty_sprint(self):
+        self.assertEqual(self.sprint.point_totals(), (0, 0))
+        self.assertEqual(self.sprint.progress_percentage(), 0)
+
+
+class TaskCounterTests(ProjectFixturesMixin, TestCase):
+
+    def assertCounters(self, obj, total, done, open_, points_total, points_done):
+        obj.refresh_from_db()
+        self.assertEqual(
+            (obj.tasks_total, obj.tasks_done, obj.tasks_open, obj.points_total, obj.points_done),
+            (total, done, open_, Decimal(points_total), Decimal(points_done))
+        )
+
+    def test_create_increments_project_and_sprint(self):
+        self.add_task('todo', sprint=self.sprint, hours='3.00')
+        self.add_task('done', hours='2.00')
+
+        self.assertCounters(self.project, 2, 1, 1, '5.00', '2.00')
+        self.assertCounters(self.sprint, 1, 0, 1, '3.00', '0')
+
+    def test_status_change_and_estimate_change(self):
+        task = self.add_task('todo', sprint=self.sprint, hours='3.00')
+        task = Task.objects.get(id=task.id)
+        task.status = 'done'
+        task.estimated_hours = '4.50'
+        task.save()
+
+        self.assertCounters(self.project, 1, 1, 0, '4.50', '4.50')
+        self.assertCounters(self.sprint, 1, 1, 0, '4.50', '4.50')
+
+    def test_stale_instances_diff_against_the_stored_row(self):
+        task = self.add_task('todo', sprint=self.sprint, hours='3.00')
+        first, second = Task.objects.get(id=task.id), Task.objects.get(id=task.id)
+        first.status = 'done'
+        first.save()
+        second.status = 'in_progress'
+        second.save()
+
+        self.assertCounters(self.project, 1, 0, 1, '3.00', '0')
+        self.assertCounters(self.sprint, 1, 0, 1, '3.00', '0')
+
+    def test_unrelated_field_change_skips_counter_updates(self):
+        task = Task.objects.get(id=self.add_task('todo', sprint=self.sprint, hours='1.00').id)
+        task.title = 'Renamed'
+
+        with self.assertNumQueries(4):  # savepoint, locked SELECT, UPDATE task, release
+            task.save()
+
+    def test_move_between_sprints_and_projects(self):
+        other_sprint = self.add_sprint('Sprint 2')
+        other_project = Project.objects.create(
+            name='Other', description='', department=self.project.department,
+            project_type='web', start_date=self.today, due_date=self.today,
+        )
+        task = self.add_task('in_progress', sprint=self.sprint, hours='2.00')
+
+        task.sprint = other_sprint
+        task.save()
+        self.assertCounters(self.sprint, 0, 0, 0, '0', '0')
+        self.assertCounters(other_sprint, 1, 0, 1, '2.00', '0')
+
+        task.project = other_project
+        task.sprint = None
+        task.save()
+        self.assertCounters(self.project, 0, 0, 0, '0', '0')
+        self.assertCounters(other_sprint, 0, 0, 0, '0', '0')
+        self.assertCounters(other_project, 1, 0, 1, '2.00', '0')
+
+    def test_delete_and_queryset_delete(self):
+        first = self.add_task('done', sprint=self.sprint, hours='1.00')
+        self.add_task('todo', sprint=self.sprint, hours='2.00')
+        self.add_task('todo', sprint=self.sprint, hours='3.00')
+
+        first.delete()
+        self.assertCounters(self.sprint, 2, 0, 2, '5.00', '0')
+
+        Task.objects.filter(status='todo').delete()
+        self.assertCounters(self.project, 0, 0, 0, '0', '0')
+        self.assertCounters(self.sprint, 0, 0, 0, '0', '0')
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        self.add_task('todo', sprint=self.sprint, hours='2.00')
+        overdue = self.add_task('review', sprint=self.sprint, hours='1.00')
+        Task.objects.filter(pk=overdue.pk).update(due_date=self.today - timedelta(days=1))
+        Project.objects.filter(pk=self.project.pk).update(tasks_total=10)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_task_counters', '--check', stdout=StringIO())
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.tasks_total, 10)
+
+        out = StringIO()
+        call_command('rebuild_task_counters', stdout=out)
+        self.assertIn(f'Project {self.project.pk} drifted', out.getvalue())
+        self.assertCounters(self.project, 2, 0, 2, '3.00', '0')
+        self.assertEqual(self.project.tasks_overdue_snapshot, 1)
+        self.sprint.refresh_from_db()
+        self.assertEqual(self.sprint.tasks_overdue_snapshot, 1)
+
+        call_command('rebuild_task_counters', '--check', stdout=StringIO())
+
+
+class ConversationIndexTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.carol = User.objects.create_user(username='carol', password='password123')
+
+    def send(self, sender, recipient, content='Hi', record=True):
+        message = Message.objects.create(sender=sender, message_type='direct', content=content)
+        message.recipients.add(recipient)
+        if record:
+            record_direct_message(message, sender, recipient)
+        return message
+
+    def participant(self, user, peer):
+        return ConversationParticipant.objects.get(user=user, peer=peer)
+
+    def test_record_creates_one_conversation_per_pair(self):
+        self.send(self.alice, self.bob)
+        self.send(self.bob, self.alice, 'Reply')
+        self.send(self.bob, self.alice, 'Again')
+
+        self.assertEqual(Conversation.objects.count(), 1)
+        self.assertEqual(self.participant(self.alice, self.bob).unread_count, 2)
+        self.assertEqual(self.participant(self.bob, self.alice).unread_count, 1)
+        self.assertEqual(Conversation.objects.get().last_message.content, 'Again')
+        self.assertTrue(conversation_exists(self.bob, self.alice))
+        self.assertFalse(conversation_exists(self.alice, self.carol))
+
+    def test_inbox_is_ordered_and_read_in_one_query(self):
+        self.send(self.bob, self.alice, 'Old')
+        self.send(self.carol, self.alice, 'New')
+
+        with self.assertNumQueries(1):
+            inbox = [(p.peer.username, p.conversation.last_message.content) for p in get_inbox(self.alice)]
+
+        self.assertEqual(inbox, [('carol', 'New'), ('bob', 'Old')])
+
+    def test_read_helpers(self):
+        for _ in range(3):
+            self.send(self.bob, self.alice)
+        self.send(self.carol, self.alice)
+        self.assertEqual(get_unread_total(self.alice), 4)
+
+        decrement_unread(self.alice, self.bob, 5)
+        self.assertEqual(self.participant(self.alice, self.bob).unread_count, 0)
+
+        mark_conversation_read(self.alice, self.carol)
+        self.assertEqual(get_unread_total(self.alice), 0)
+
+    def test_messages_to_self_are_not_indexed(self):
+        message = Message.objects.create(sender=self.alice, message_type='direct', content='Note')
+        self.assertEqual(record_direct_message(message, self.alice, self.alice), (None, False))
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_backfill_migration(self):
+        self.send(self.alice, self.bob, 'First', record=False)
+        read = self.send(self.bob, self.alice, 'Read', record=False)
+        Message.objects.filter(pk=read.pk).update(is_read=True)
+        self.send(self.alice, self.bob, 'Latest', record=False)
+        self.send(self.carol, self.alice, 'Hello', record=False)
+
+        migration = import_module('core.migrations.0003_conversations')
+        migration.backfill_conversations(apps, None)
+
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertEqual(self.participant(self.bob, self.alice).unread_count, 2)
+        self.assertEqual(self.participant(self.alice, self.bob).unread_count, 0)
+        self.assertEqual(self.participant(self.alice, self.carol).unread_count, 1)
+        self.assertEqual(
+            [p.conversation.last_message.content for p in get_inbox(self.alice)],
+            ['Hello', 'Latest']
+        )
+
+
+class MessageHistoryPaginationTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.messages = []
+        for i in range(7):
+            sender, recipient = (self.bob, self.alice) if i % 2 else (self.alice, self.bob)
+            message = Message.objects.create(sender=sender, message_type='direct', content=f'm{i}')
+            message.recipients.add(recipient)
+            record_direct_message(message, sender, recipient)
+            self.messages.append(message)
+        # Identical timestamps exercise the id tie-breaker
+        Message.objects.filter(
+            pk__in=[m.pk for m in self.messages[2:5]]
+        ).update(created_at=self.messages[3].created_at)
+
+    def contents(self, page):
+        return [m.content for m in page]
+
+    def test_walks_back_from_newest_page(self):
+        page, cursor = get_message_page(self.alice, self.bob, limit=3)
+        self.assertEqual(self.contents(page), ['m4', 'm5', 'm6'])
+
+        page, cursor = get_message_page(self.alice, self.bob, before=cursor, limit=3)
+        self.assertEqual(self.contents(page), ['m1', 'm2', 'm3'])
+
+        page, cursor = get_message_page(self.alice, self.bob, before=cursor, limit=3)
+        self.assertEqual(self.contents(page), ['m0'])
+        self.assertIsNone(cursor)
+
+    def test_walks_forward_with_after(self):
+        _, cursor = get_message_page(self.bob, self.alice, limit=5)
+        self.assertEqual(decode_cursor(cursor)[1], self.messages[2].id)
+
+        page, cursor = get_message_page(self.bob, self.alice, after=cursor, limit=2)
+        self.assertEqual(self.contents(page), ['m3', 'm4'])
+        page, cursor = get_message_page(self.bob, self.alice, after=cursor, limit=2)
+        self.assertEqual(self.contents(page), ['m5', 'm6'])
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor_and_page_size(self):
+        with self.assertRaises(ValueError):
+            get_message_page(self.alice, self.bob, before='not-a-cursor')
+        self.assertEqual(get_page_size('500'), 100)
+        self.assertEqual(get_page_size('abc'), 50)
+        self.assertEqual(get_page_size('0'), 1)
+
+    def test_mark_page_read_marks_range_in_single_update(self):
+        page, _ = get_message_page(self.alice, self.bob, limit=4)
+        self.assertEqual(get_unread_total(self.alice), 3)
+
+        with self.assertNumQueries(3):  # UPDATE messages, receipts and unread count
+            self.assertEqual(mark_page_read(self.alice, self.bob, page), 3)
+
+        self.assertTrue(all(m.is_read for m in page if m.sender_id == self.bob.id))
+        self.assertTrue(Message.objects.get(content='m1').is_read)
+        self.assertEqual(get_unread_total(self.alice), 0)
+
+    def test_mark_read_upto(self):
+        self.assertEqual(mark_read_upto(self.alice, self.bob, self.messages[3].id), 2)
+        self.assertEqual(get_unread_total(self.alice), 1)
+        self.assertFalse(Message.objects.get(content='m5').is_read)
+        self.assertEqual(mark_read_upto(self.alice, self.bob, self.messages[3].id), 0)
+
+        self.assertEqual(mark_read_upto(self.alice, self.bob.id), 1)
+        self.assertEqual(get_unread_total(self.alice), 0)
+        self.assertEqual(mark_read_upto(self.bob, self.alice), 4)
+
+
+class MessageReceiptTests(TestCase):
+
+    def setUp(self):
+        self.pm = User.objects.create_user(username='pm', password='password123', role='pm')
+        self.readers = [
+            User.objects.create_user(username=f'dev{i}', password='password123') for i in range(3)
+        ]
+        self.announcement = Message.objects.create(
+            sender=self.pm, message_type='announcement', subject='Standup', content='10am'
+        )
+        self.announcement.recipients.set(self.readers)
+
+    def test_read_state_is_per_recipient(self):
+        first, second, _ = self.readers
+
+        self.assertEqual(mark_read_upto(first, self.pm, message_type=None), 1)
+
+        self.assertEqual(count_unread(first), 0)
+        self.assertEqual(count_unread(second), 1)
+        self.assertIsNotNone(MessageReceipt.objects.get(user=first).read_at)
+        self.announcement.refresh_from_db()
+        self.assertFalse(self.announcement.is_read)
+
+    def test_direct_messages_keep_message_flag_in_step(self):
+        reader = self.readers[0]
+        message = Message.objects.create(sender=self.pm, message_type='direct', content='Hi')
+        message.recipients.add(reader)
+        record_direct_message(message, self.pm, reader)
+
+        self.assertEqual(mark_read_upto(reader, self.pm), 1)
+
+        message.refresh_from_db()
+        self.assertTrue(message.is_read)
+        self.assertEqual(count_unread(reader), 1)  # the announcement
+
+    def test_unread_count_is_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(count_unread(self.readers[2]), 1)
+
+
+class FanOutTests(TestCase):
+
+    def setUp(self):
+        self.sender = User.objects.create_user(username='sender', password='password123')
+
+    def add_users(self, count, offset=0):
+        return [
+            User.objects.create_user(username=f'user{offset + i}', password='password123').id
+            for i in range(count)
+        ]
+
+    def deliver(self, recipient_ids, **kwargs):
+        message = Message(sender=self.sender, message_type='announcement', subject='S', content='C')
+        fan_out(recipient_ids, message=message, notification={
+            'notification_type': 'message', 'title': 'T', 'message': 'M', 'related_type': 'message',
+        }, chunk_size=4, **kwargs)
+        return message
+
+    def delivery_query_count(self, recipient_ids):
+        with CaptureQueriesContext(connection) as ctx:
+            message = self.deliver(recipient_ids, publish=False)
+        return message, len(ctx.captured_queries)
+
+    def test_writes_are_bulk_and_chunked(self):
+        small = self.add_users(3)
+        _, baseline = self.delivery_query_count(small)
+
+        large = small + self.add_users(5, offset=3)
+        message, query_count = self.delivery_query_count(large)
+
+        # One more chunk each for receipts and notifications, nothing per row
+        self.assertEqual(query_count, baseline + 2)
+        self.assertEqual(set(message.recipients.values_list('id', flat=True)), set(large))
+        self.assertEqual(Notification.objects.filter(user_id__in=large).count(), 3 + 8)
+
+    def test_events_published_in_one_pipeline_after_commit(self):
+        recipients = self.add_users(3)
+
+        with mock.patch('core.fanout.redis_client') as redis_client, \
+                mock.patch('core.fanout.record_unread') as record_unread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.deliver(recipients + recipients[:1])
+                redis_client.pipeline.assert_not_called()
+
+        added = dict.fromkeys(recipients, 1)
+        record_unread.assert_called_once_with(notifications=added, messages=None)
+
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.assert_called_once_with()
+        self.assertEqual(pipe.publish.call_count, 6)  # message + notification per recipient
+        channel, payload = pipe.publish.call_args_list[0].args
+        self.assertEqual(channel, f'user_{recipients[0]}')
+        self.assertEqual(json.loads(payload)['recipient_id'], recipients[0])
+
+    def test_unpublished_fan_out_still_counts_unread(self):
+        recipients = self.add_users(2)
+
+        with mock.patch('core.fanout.redis_client') as redis_client, \
+                mock.patch('core.fanout.record_unread') as record_unread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.deliver(recipients, publish=False)
+
+        redis_client.pipeline.assert_not_called()
+        added = dict.fromkeys(recipients, 1)
+        record_unread.assert_called_once_with(notifications=added, messages=None)
+
+    def test_existing_receipts_are_not_counted_again(self):
+        first, second = self.add_users(2)
+        message = Message.objects.create(sender=self.sender, message_type='direct', content='C')
+        MessageReceipt.objects.create(message=message, user_id=first)
+
+        with mock.patch('core.fanout.redis_client') as redis_client, \
+                mock.patch('core.fanout.record_unread') as record_unread:
+            with self.captureOnCommitCallbacks(execute=True):
+                fan_out([first, second], message=message)
+
+        record_unread.assert_called_once_with(notifications=None, messages={second: 1})
+        pipe = redis_client.pipeline.return_value
+        self.assertEqual(pipe.publish.call_count, 1)
+        self.assertEqual(MessageReceipt.objects.filter(message=message).count(), 2)
+
+    def test_notification_overrides(self):
+        first, second = self.add_users(2)
+
+        fan_out([first, second], notification={
+            'notification_type': 'task_assigned', 'title': 'T', 'message': 'M', 'related_type': 'task',
+        }, notification_overrides={first: {'related_id': 10}, second: {'related_id': 20}}, publish=False)
+
+        self.assertEqual(
+            dict(Notification.objects.values_list('user_id', 'related_id')),
+            {first: 10, second: 20}
+        )
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='password123') for i in range(3)
+        ]
+
+    def enqueue(self, recipients, title='Hello'):
+        return enqueue_notification(
+            recipients, notification_type='message', title=title, message='M',
+            related_id=1, related_type='message',
+        )
+
+    def test_enqueue_is_a_single_insert(self):
+        with self.assertNumQueries(1):
+            self.enqueue(self.users)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(OutboxEvent.objects.get().payload['recipient_ids'], [u.id for u in self.users])
+
+    @mock.patch('core.fanout.redis_client')
+    def test_dispatch_batches_inserts_and_pushes(self, redis_client):
+        self.enqueue(self.users[0])
+        self.enqueue(self.users[1:], title='Team')
+        enqueue_push([self.users[2].id], {'type': 'direct_message', 'recipient_id': 99})
+
+        with mock.patch('core.outbox.record_unread'), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(dispatch_batch(), (3, 0))
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(Notification.objects.filter(title='Team').count(), 2)
+        pipe = redis_client.pipeline.return_value
+        # One pipeline for the push events, one for the notifications after commit
+        self.assertEqual(pipe.execute.call_count, 2)
+        self.assertEqual(pipe.publish.call_count, 4)
+        channel, payload = pipe.publish.call_args_list[0].args
+        self.assertEqual(channel, f'user_{self.users[2].id}')
+        self.assertEqual(json.loads(payload)['recipient_id'], 99)
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(dispatch_batch(), (0, 0))
+
+    @mock.patch('core.fanout.redis_client')
+    def test_failed_push_is_retried_with_backoff(self, redis_client):
+        redis_client.pipeline.return_value.execute.side_effect = redis.ConnectionError('down')
+        event = enqueue_push([self.users[0].id], {'type': 'direct_message'})
+        now = timezone.now()
+
+        self.assertEqual(dispatch_batch(now=now), (0, 1))
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('ConnectionError', event.last_error)
+        self.assertGreater(event.available_at, now)
+        self.assertIsNone(event.processed_at)
+
+        redis_client.pipeline.return_value.execute.side_effect = None
+        self.assertEqual(dispatch_batch(now=now), (0, 0))  # not due yet
+        self.assertEqual(dispatch_batch(now=event.available_at), (1, 0))
+
+    @mock.patch('core.fanout.redis_client')
+    def test_redis_outage_does_not_lose_notifications(self, redis_client):
+        redis_client.pipeline.return_value.execute.side_effect = redis.ConnectionError('down')
+        event = self.enqueue(self.users[0])
+        enqueue_push([self.users[1].id], {'type': 'direct_message'})
+
+        with mock.patch('core.outbox.record_unread'), self.assertLogs('core.fanout', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(dispatch_batch(), (1, 1))
+
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(Notification.objects.get().user, self.users[0])
+
+    @mock.patch('core.fanout.redis_client')
+    def test_bad_event_does_not_block_the_batch(self, redis_client):
+        self.enqueue(self.users[0])
+        bad = OutboxEvent.objects.create(event_type='unknown', payload={'recipient_ids': [1]})
+        self.enqueue(self.users[1])
+
+        self.assertEqual(dispatch_batch(), (2, 1))
+        self.assertEqual(Notification.objects.count(), 2)
+
+        OutboxEvent.objects.filter(pk=bad.pk).update(attempts=MAX_ATTEMPTS)
+        self.assertEqual(dispatch_batch(now=timezone.now() + timedelta(days=1)), (0, 0))
+
+    @mock.patch('core.fanout.redis_client')
+    def test_dispatch_command_drains_outbox(self, redis_client):
+        for user in self.users:
+            self.enqueue(user)
+
+        out = StringIO()
+        call_command('dispatch_outbox', '--once', '--batch-size', '2', stdout=out)
+
+        self.assertIn('Delivered 2 event(s), 0 failed', out.getvalue())
+        self.assertIn('Delivered 1 event(s), 0 failed', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class UnreadCountTests(TestCase):
+
+    def setUp(self):
+        self.redis = use_fake_redis(self, 'core.unread_counts')
+        self.sender = User.objects.create_user(username='sender', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+
+    def notify(self, user, title='T'):
+        return Notification.objects.create(
+            user=user, notification_type='message', title=title, message='M', related_type='message'
+        )
+
+    def send(self, content='hi'):
+        message = Message.objects.create(sender=self.sender, message_type='direct', content=content)
+        message.recipients.add(self.reader)
+        return message
+
+    @async_to_sync
+    async def listen(self, user):
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'chat_user_{user.id}', channel)
+        return channel
+
+    @async_to_sync
+    async def receive(self, channel):
+        return await get_channel_layer().receive(channel)
+
+    def test_miss_is_seeded_from_db_then_served_from_redis(self):
+        self.notify(self.reader)
+        self.send()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(get_unread_counts(self.reader), {'notifications': 1, 'messages': 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_counts(self.reader), {'notifications': 1, 'messages': 1})
+
+    def test_new_notification_is_counted_and_pushed_on_commit(self):
+        get_unread_counts(self.reader)
+        channel = self.listen(self.reader)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notify(self.reader, title='Deploy')
+            self.assertEqual(get_unread_counts(self.reader)['notifications'], 0)
+
+        event = self.receive(channel)
+        self.assertEqual(event['type'], 'unread_update')
+        self.assertEqual(event['message']['type'], 'unread_counts')
+        self.assertEqual(event['message']['notifications'], 1)
+        self.assertEqual(event['message']['notification']['title'], 'Deploy')
+
+    def test_messages_counted_on_add_and_decremented_on_read(self):
+        get_unread_counts(self.reader)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.send()
+            self.send()
+        self.assertEqual(get_unread_counts(self.reader)['messages'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_read_upto(self.reader, self.sender, first.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_counts(self.reader)['messages'], 1)
+
+    def test_fan_out_updates_every_recipient(self):
+        others = [
+            User.objects.create_user(username=f'user{i}', password='password123') for i in range(3)
+        ]
+        get_unread_counts(others[0])
+
+        with mock.patch('core.fanout.redis_client'), self.captureOnCommitCallbacks(execute=True):
+            fan_out([user.id for user in others], message=Message(
+                sender=self.sender, message_type='announcement', subject='S', content='C'
+            ), notification={'notification_type': 'message', 'title': 'T', 'message': 'M'})
+
+        # The announcement is surfaced as a notification, not a direct message
+        for user in others:
+            self.assertEqual(get_unread_counts(user), {'notifications': 1, 'messages': 0})
+
+    def test_only_direct_messages_are_counted(self):
+        get_unread_counts(self.reader)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send()
+            announcement = Message.objects.create(
+                sender=self.sender, message_type='announcement', subject='S', content='C'
+            )
+            announcement.recipients.add(self.reader)
+        self.assertEqual(get_unread_counts(self.reader)['messages'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_read_upto(self.reader, self.sender, announcement.id, message_type='announcement')
+        self.assertEqual(get_unread_counts(self.reader)['messages'], 1)
+
+    def test_update_reads_totals_in_the_increment_pipeline(self):
+        get_unread_counts(self.reader)
+
+        with mock.patch.object(FakePipeline, 'execute', autospec=True,
+                               side_effect=FakePipeline.execute) as execute, self.assertNumQueries(0):
+            counts = update_unread_counts(messages={self.reader.id: 2})
+
+        self.assertEqual(counts, {self.reader.id: {'notifications': 0, 'messages': 2}})
+        execute.assert_called_once()
+
+    def test_increment_after_expiry_is_reseeded(self):
+        self.notify(self.reader)
+        self.send()
+        # The hash expired, then increments recreated it without the marker
+        self.redis.hincrby(unread_key(self.reader.id), 'notifications', 5)
+        self.redis.hincrby(unread_key(self.reader.id), 'messages', 5)
+
+        self.assertEqual(get_unread_counts(self.reader), {'notifications': 1, 'messages': 1})
+
+    def test_falls_back_to_db_when_redis_is_down(self):
+        self.notify(self.reader)
+        with mock.patch.object(FakePipeline, 'execute', side_effect=redis.ConnectionError):
+            with self.assertLogs('core.unread_counts', 'ERROR'):
+                self.assertEqual(get_unread_counts(self.reader), {'notifications': 1, 'messages': 0})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+@mock.patch('core.messaging.update_unread_counts')
+class MessagingServiceTests(TestCase):
+
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username='sender', password='password123', first_name='Sam', last_name='Lee'
+        )
+        self.recipient = User.objects.create_user(username='recipient', password='password123')
+
+    @async_to_sync
+    async def listen(self, user):
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'chat_user_{user.id}', channel)
+        return channel
+
+    @async_to_sync
+    async def pending(self, channel):
+        events = []
+        while True:
+            try:
+                events.append(await asyncio.wait_for(get_channel_layer().receive(channel), 0.05))
+            except asyncio.TimeoutError:
+                return events
+
+    def test_send_direct_writes_once_and_delivers_once(self, update_unread_counts):
+        counts = {'notifications': 0, 'messages': 2}
+        update_unread_counts.return_value = {self.recipient.id: counts}
+        channel = self.listen(self.recipient)
+        service = MessagingService()
+        service.send_direct(self.sender, self.recipient, 'warm up')
+        self.pending(channel)
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            message, payload, new_conversation = service.send_direct(self.sender, self.recipient, 'hi')
+            self.assertEqual(self.pending(channel), [])
+
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)  # message + recipient receipt
+        self.assertFalse(new_conversation)
+        self.assertEqual(list(message.recipients.all()), [self.recipient])
+        self.assertEqual(Conversation.objects.get().last_message, message)
+
+        # The new unread totals ride along with the message
+        self.assertEqual(self.pending(channel), [
+            {'type': 'chat_message', 'message': payload, 'unread_counts': counts}
+        ])
+        self.assertEqual(payload['type'], 'direct_message')
+        self.assertEqual(payload['initials'], 'SL')
+        update_unread_counts.assert_called_with(messages={self.recipient.id: 1})
+
+    def test_notify_queues_notification_in_same_transaction(self, update_unread_counts):
+        message, _, new_conversation = MessagingService().send_direct(
+            self.sender, self.recipient, 'hi', notify=True
+        )
+
+        self.assertTrue(new_conversation)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.payload['recipient_ids'], [self.recipient.id])
+        self.assertEqual(event.payload['notification']['related_id'], message.id)
+
+
+class CanMessageTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member, self.teammate = self.add_members(2)
+        self.outsider = self.add_employee('outsider', member=False)
+
+    def test_members_of_a_shared_project(self):
+        self.assertTrue(can_message(self.member.user, self.teammate.user))
+        self.assertTrue(can_message(self.member.user, self.project.project_manager))
+        self.assertFalse(can_message(self.member.user, self.outsider.user))
+
+    def test_inactive_members_are_outside_the_project(self):
+        ProjectMember.objects.filter(employee=self.teammate).update(is_active=False)
+
+        self.assertFalse(can_message(self.member.user, self.teammate.user))
+
+    def test_unrestricted_roles_and_inactive_recipients(self):
+        hr = User.objects.create_user(username='hr', password='password123', role='hr')
+        self.assertTrue(can_message(hr, self.outsider.user))
+        self.assertTrue(can_message(self.outsider.user, hr))
+
+        hr.is_active = False
+        self.assertFalse(can_message(self.outsider.user, hr))
+
+
+class PresenceTests(TestCase):
+
+    def setUp(self):
+        self.redis = use_fake_redis(self, 'core.presence')
+        self.now = 1_000_000.0
+
+    def test_connect_heartbeat_and_last_disconnect(self):
+        self.assertTrue(presence.touch(1, connected=True, now=self.now))
+        self.assertFalse(presence.touch(1, connected=True, now=self.now + 1))  # second tab
+        self.assertFalse(presence.touch(1, now=self.now + 30))  # heartbeat
+
+        self.assertFalse(presence.disconnect(1))
+        self.assertTrue(presence.get_presence([1], now=self.now + 31)[1]['is_online'])
+        self.assertTrue(presence.disconnect(1))
+        self.assertFalse(presence.get_presence([1], now=self.now + 32)[1]['is_online'])
+
+    def test_get_presence_is_one_zmscore(self):
+        presence.touch(1, connected=True, now=self.now)
+        presence.touch(2, connected=True, now=self.now - presence.ONLINE_TIMEOUT_SECONDS - 1)
+
+        with mock.patch.object(self.redis, 'zmscore', wraps=self.redis.zmscore) as zmscore:
+            statuses = presence.get_presence([1, 2, 3], now=self.now)
+
+        zmscore.assert_called_once_with(presence.LAST_SEEN_KEY, [1, 2, 3])
+        self.assertEqual(
+            {user_id: status['is_online'] for user_id, status in statuses.items()},
+            {1: True, 2: False, 3: False}
+        )
+        self.assertEqual(statuses[1]['last_seen'], self.now)
+
+    def test_sweep_removes_stale_users_once_per_window(self):
+        presence.touch(1, connected=True, now=self.now)
+        presence.touch(2, connected=True, now=self.now - presence.ONLINE_TIMEOUT_SECONDS - 1)
+
+        self.assertEqual(presence.sweep_stale(now=self.now), [2])
+        self.assertEqual(presence.sweep_stale(now=self.now), [])  # another process holds the lock
+        self.assertIsNone(self.redis.zscore(presence.LAST_SEEN_KEY, 2))
+        self.assertNotIn('2', self.redis.hashes[presence.CONNECTIONS_KEY])
+        # A swept user coming back is announced again
+        self.assertTrue(presence.touch(2, now=self.now))
+
+    def test_redis_down_reports_offline(self):
+        with mock.patch.object(self.redis, 'zmscore', side_effect=redis.ConnectionError):
+            with self.assertLogs('core.presence', 'ERROR'):
+                self.assertFalse(presence.is_online(1))
+
+
+class ChannelLayerMetricsTests(TestCase):
+
+    def setUp(self):
+        self.reports = []
+        self.hook = lambda group, fanout, seconds: self.reports.append((group, fanout, seconds))
+
+    def with_hook(self):
+        add_group_send_hook(self.hook)
+        self.addCleanup(remove_group_send_hook, self.hook)
+
+    @async_to_sync
+    async def test_in_memory_layer_reports_fanout_and_latency(self):
+        layer = InstrumentedInMemoryChannelLayer()
+        await layer.group_add('project_1', 'a')
+        await layer.group_add('project_1', 'b')
+        await layer.group_send('project_1', {'type': 'project_update'})
+        self.assertEqual(self.reports, [])  # nothing is measured without hooks
+
+        self.with_hook()
+        await layer.group_send('project_1', {'type': 'project_update'})
+        await layer.group_send('empty', {'type': 'project_update'})
+
+        self.assertEqual(
+            [(group, fanout) for group, fanout, _ in self.reports], [('project_1', 2), ('empty', 0)]
+        )
+        self.assertGreaterEqual(self.reports[0][2], 0)
+        self.assertEqual((await layer.receive('a'))['type'], 'project_update')
+
+    @async_to_sync
+    async def test_redis_layer_reports_group_members(self):
+        layer = InstrumentedRedisChannelLayer(hosts=['redis://127.0.0.1:6379/0', 'redis://127.0.0.1:6380/0'])
+
+        async def group_send(self, group, message):
+            self._map_channel_keys_to_connection(['specific.a!1', 'specific.b!2', 'specific.c!3'], message)
+
+        self.with_hook()
+        with mock.patch('channels_redis.core.RedisChannelLayer.group_send', group_send):
+            await layer.group_send('project_1', {'type': 'project_update'})
+
+        self.assertEqual([(group, fanout) for group, fanout, _ in self.reports], [('project_1', 3)])
+
+    @async_to_sync
+    async def test_failing_hook_does_not_break_sends(self):
+        layer = InstrumentedInMemoryChannelLayer()
+        await layer.group_add('project_1', 'a')
+        broken = mock.Mock(side_effect=ValueError)
+        add_group_send_hook(broken)
+        self.addCleanup(remove_group_send_hook, broken)
+
+        with self.assertLogs('core.channel_layers', 'ERROR'):
+            await layer.group_send('project_1', {'type': 'project_update'})
+        self.assertEqual((await layer.receive('a'))['type'], 'project_update')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardCacheTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.employees = [self.add_employee(f'dev{i}', member=False) for i in range(2)]
+
+    def fragment(self, scope, value='built'):
+        build = mock.Mock(return_value=value)
+        return dashboard_cache.cached_fragment('test', [scope], build, parts=[self.today]), build
+
+    def assert_invalidated(self, scope, write):
+        self.fragment(scope)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        _, build = self.fragment(scope)
+        build.assert_called_once_with()
+
+    def test_fragment_is_built_once_per_version(self):
+        scope = ('project', self.project.id)
+        self.assertEqual(self.fragment(scope)[0], 'built')
+        value, build = self.fragment(scope, value='rebuilt')
+        self.assertEqual(value, 'built')
+        build.assert_not_called()
+
+        dashboard_cache.bump_versions([scope])
+        value, build = self.fragment(scope, value='rebuilt')
+        self.assertEqual(value, 'rebuilt')
+        # Other scopes are untouched
+        self.fragment(('project', 0))
+        dashboard_cache.bump_versions([scope])
+        self.fragment(('project', 0))[1].assert_not_called()
+
+    def test_versions_are_bumped_after_commit_only(self):
+        scope = ('project', self.project.id)
+        self.fragment(scope)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.add_task('todo', sprint=self.sprint, hours='1.00')
+            self.fragment(scope)[1].assert_not_called()
+        for callback in callbacks:
+            callback()
+        self.fragment(scope)[1].assert_called_once_with()
+
+    def test_task_reassignment_invalidates_both_assignees(self):
+        task = Task.objects.create(
+            title='Task', project=self.project, assigned_to=self.employees[0],
+            estimated_hours=Decimal('1.00'), due_date=self.today,
+        )
+        task = Task.objects.get(pk=task.pk)
+        for employee in self.employees:
+            self.fragment(('employee', employee.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.assigned_to = self.employees[1]
+            task.save()
+
+        for employee in self.employees:
+            self.fragment(('employee', employee.id))[1].assert_called_once_with()
+
+    def test_writes_invalidate_their_scopes(self):
+        project_scope = ('project', self.project.id)
+        employee = self.employees[0]
+        task = self.add_task('todo', sprint=self.sprint, hours='1.00')
+
+        self.assert_invalidated(project_scope, lambda: self.add_sprint('Sprint 2'))
+        self.assert_invalidated(
+            ('employee', employee.id),
+            lambda: ProjectMember.objects.create(project=self.project, employee=employee, role='dev'),
+        )
+        self.assert_invalidated(
+            ('employee', employee.id),
+            lambda: TimeLog.objects.create(task=task, employee=employee, date=self.today, hours=2),
+        )
+        self.assert_invalidated(dashboard_cache.GLOBAL, task.delete)
+
+    def test_cache_errors_fall_back_to_building(self):
+        with mock.patch.object(dashboard_cache.cache, 'get_many', side_effect=redis.ConnectionError):
+            with self.assertLogs('core.dashboard_cache', 'ERROR'):
+                value, build = self.fragment(('project', self.project.id))
+        self.assertEqual(value, 'built')
+        build.assert_called_once_with()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class WorkloadSummaryTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.day = date(2026, 3, 11)  # a Wednesday; the week starts on March 9th
+        self.employee, other = [self.add_employee(f'dev{i}', member=False) for i in range(2)]
+        self.sprint_task = self.add_task('in_progress', sprint=self.sprint, hours='20.00')
+        self.sprint_task.assigned_to = self.employee
+        self.sprint_task.save()
+        self.other_task = self.add_task('todo', hours='1.00')
+        for task, day, hours in [
+            (self.sprint_task, self.day, '2.00'),
+            (self.other_task, date(2026, 3, 9), '3.00'),
+            (self.sprint_task, date(2026, 3, 2), '4.00'),
+            (self.sprint_task, date(2026, 2, 27), '5.00'),
+        ]:
+            TimeLog.objects.create(task=task, employee=self.employee, date=day, hours=Decimal(hours))
+        TimeLog.objects.create(task=self.sprint_task, employee=other, date=self.day, hours=Decimal('7.00'))
+
+    def test_all_periods_in_one_time_log_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            summary = workload.WorkloadSummary.compute(self.employee, self.sprint, self.day)
+        time_log_queries = [q for q in ctx.captured_queries if 'core_timelog' in q['sql']]
+        self.assertEqual(len(time_log_queries), 1)
+        self.assertEqual(len(ctx.captured_queries), 2)  # plus the sprint estimate
+
+        self.assertEqual(summary.today, Decimal('2.00'))
+        self.assertEqual(summary.week, Decimal('5.00'))
+        self.assertEqual(summary.month, Decimal('9.00'))
+        self.assertEqual(summary.sprint_hours, {'current': Decimal('11.00'), 'total': Decimal('20.00'), 'percentage': 55})
+        self.assertEqual(summary.weekly_hours['percentage'], 12)
+        self.assertEqual(summary.workload_status, 'Light')
+
+    def test_without_sprint(self):
+        with self.assertNumQueries(1):
+            summary = workload.WorkloadSummary.compute(self.employee, today=self.day)
+        self.assertEqual(summary.sprint_hours, {'current': 0, 'total': 0, 'percentage': 0})
+
+    def test_cached_per_employee_and_day(self):
+        summary = workload.get_workload_summary(self.employee, self.sprint, self.day)
+        with self.assertNumQueries(0):
+            cached = workload.get_workload_summary(self.employee, self.sprint, self.day)
+        self.assertEqual(cached.week, summary.week)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeLog.objects.create(task=self.other_task, employee=self.employee, date=self.day, hours=1)
+        self.assertEqual(workload.get_workload_summary(self.employee, self.sprint, self.day).today, Decimal('3.00'))
@@ -0,0 +1,107 @@
+# core/time_logging.py
+"""Single write path for logging time against tasks.
+
+`log_time_entries()` inserts the TimeLog rows and adds their hours to each
+task's `actual_hours` with an `F()` expression in one transaction. The
+database does the addition, so concurrent logs against the same task
+can't overwrite each other, and the arithmetic stays in Decimal. The same
+transaction then sums the employee's hours for today and for each logged
+date, so callers get those totals without further queries. `log_time_entry()`
+is the single-entry form used by the timer and the manual form.
+
+Both use `bulk_create()` and queryset `update()`, so no model signals
+fire. The task's `updated_at` is set in the same UPDATE, which changes the
+task_detail ETag. The dashboard cache scopes are bumped here once the
+transaction commits.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .dashboard_cache import GLOBAL, bump_versions_on_commit
+from .models import Task, TimeLog
+
+MAX_ENTRY_HOURS = Decimal('24')
+MAX_TIMESHEET_ENTRIES = 100
+
+
+def parse_hours(value):
+    """`value` as Decimal hours with two places; ValueError if it isn't 0 < hours <= 24"""
+    try:
+        hours = Decimal(str(value).strip()).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f'Invalid hours: {value!r}')
+    if not Decimal('0') < hours <= MAX_ENTRY_HOURS:
+        raise ValueError(f'Hours must be more than 0 and at most {MAX_ENTRY_HOURS}')
+    return hours
+
+
+def parse_date(value, default=None):
+    """A `YYYY-MM-DD` string (or a date) as a date; `default` when empty"""
+    if not value:
+        return default or timezone.now().date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid date: {value!r}')
+
+
+def log_time_entries(employee, entries, today=None):
+    """Log `entries` for `employee` and add their hours to the tasks.
+
+    `entries` are dicts with `task`, `date`, `hours` (a Decimal, see
+    `parse_hours()`) and optionally `description`. Returns
+    `(time_logs, totals)` where `totals` maps today and every logged date to
+    the employee's total hours for that day.
+    """
+    today = today or timezone.now().date()
+    added = defaultdict(Decimal)
+    for entry in entries:
+        added[entry['task'].id] += entry['hours']
+
+    with transaction.atomic():
+        time_logs = TimeLog.objects.bulk_create([
+            TimeLog(
+                task=entry['task'],
+                employee=employee,
+                date=entry['date'],
+                hours=entry['hours'],
+                description=entry.get('description', ''),
+            )
+            for entry in entries
+        ])
+
+        now = timezone.now()
+        for task_id, hours in added.items():
+            Task.objects.filter(pk=task_id).update(actual_hours=F('actual_hours') + hours, updated_at=now)
+
+        dates = {today, *(entry['date'] for entry in entries)}
+        totals = dict.fromkeys(dates, Decimal('0'))
+        totals.update(
+            TimeLog.objects.filter(employee=employee, date__in=dates)
+            .order_by().values_list('date').annotate(total=Sum('hours'))
+        )
+
+        scopes = {GLOBAL, ('employee', employee.id)}
+        scopes.update(('project', entry['task'].project_id) for entry in entries)
+        bump_versions_on_commit(scopes)
+
+    return time_logs, totals
+
+
+def log_time_entry(employee, task, hours, date=None, description='', today=None):
+    """Log one entry; returns `(time_log, today's total hours)`"""
+    today = today or timezone.now().date()
+    time_logs, totals = log_time_entries(employee, [{
+        'task': task,
+        'date': date or today,
+        'hours': hours,
+        'description': description,
+    }], today=today)
+    return time_logs[0], totals[today]
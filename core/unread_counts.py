@@ -0,0 +1,179 @@
+# core/unread_counts.py
+"""Per-user unread counters cached in Redis and pushed over the WebSocket.
+
+Each user has a hash `unread:<id>` with `notifications` and `messages`
+fields, so badges and reconnecting clients read their counts in O(1)
+instead of running COUNT queries. `messages` counts unread direct
+messages only, matching `get_unread_total()` in core.conversations;
+announcements and other broadcasts are surfaced as notifications.
+Writers call `record_unread()` with per-user deltas once their
+transaction has committed; it bumps the hashes and reads the new totals
+back in one pipeline, then sends them to every affected user's
+`chat_user_<id>` group as an `unread_counts` message. Direct messages
+carry the recipient's totals in their own `chat_message` event instead
+(see `MessagingService.deliver()` in core.messaging).
+
+The hash is only a cache: a hash without the `seeded` marker (missing,
+or recreated by an increment after it expired) is re-seeded from the
+database on the next read, and keys expire after `UNREAD_TTL_SECONDS` so
+any drift is bounded. Redis errors are logged and fall back to the
+database counts.
+"""
+import asyncio
+import logging
+import os
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import Count
+
+from .models import MessageReceipt, Notification
+
+logger = logging.getLogger(__name__)
+
+_redis_url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+redis_client = redis.from_url(_redis_url)
+
+UNREAD_FIELDS = ('notifications', 'messages')
+UNREAD_TTL_SECONDS = 60 * 60
+SEEDED_FIELD = 'seeded'
+
+
+def unread_key(user_id):
+    return f'unread:{user_id}'
+
+
+def _counts_from_db(user_ids):
+    counts = {user_id: dict.fromkeys(UNREAD_FIELDS, 0) for user_id in user_ids}
+    notifications = (
+        Notification.objects.filter(user_id__in=user_ids, is_read=False)
+        .values('user_id').annotate(total=Count('id'))
+    )
+    for row in notifications:
+        counts[row['user_id']]['notifications'] = row['total']
+    messages = (
+        MessageReceipt.objects.filter(
+            user_id__in=user_ids, read_at__isnull=True, message__message_type='direct'
+        )
+        .values('user_id').annotate(total=Count('id'))
+    )
+    for row in messages:
+        counts[row['user_id']]['messages'] = row['total']
+    return counts
+
+
+def _parse(cached):
+    fields = {key.decode() if isinstance(key, bytes) else key: value for key, value in cached.items()}
+    if SEEDED_FIELD not in fields:
+        return None
+    return {field: max(0, int(fields.get(field, 0))) for field in UNREAD_FIELDS}
+
+
+def get_unread_counts_many(user_ids):
+    """`{user_id: {'notifications': n, 'messages': m}}` for every user id.
+
+    Cached hashes are fetched in one pipeline; misses are counted with two
+    grouped queries and written back.
+    """
+    user_ids = sorted({int(user_id) for user_id in user_ids})
+    if not user_ids:
+        return {}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(unread_key(user_id))
+        cached = dict(zip(user_ids, (_parse(row) for row in pipe.execute())))
+    except redis.RedisError:
+        logger.exception('Failed to read unread counts for %d users', len(user_ids))
+        return _counts_from_db(user_ids)
+
+    return _seed_missing(cached)
+
+
+def _seed_missing(cached):
+    """Fill in the users whose cached counts were missing from the database"""
+    missing = [user_id for user_id, counts in cached.items() if counts is None]
+    if missing:
+        seeded = _counts_from_db(missing)
+        cached.update(seeded)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id, counts in seeded.items():
+                pipe.hset(unread_key(user_id), mapping={**counts, SEEDED_FIELD: 1})
+                pipe.expire(unread_key(user_id), UNREAD_TTL_SECONDS)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception('Failed to cache unread counts for %d users', len(missing))
+    return cached
+
+
+def get_unread_counts(user):
+    """`{'notifications': n, 'messages': m}` for a user or user id"""
+    user_id = getattr(user, 'id', user)
+    return get_unread_counts_many([user_id])[int(user_id)]
+
+
+def unread_counts_event(counts, notification=None):
+    """Channel-layer event carrying a user's current unread totals"""
+    message = {'type': 'unread_counts', **counts}
+    if notification is not None:
+        message['notification'] = notification
+    return {'type': 'unread_update', 'message': message}
+
+
+def push_unread_counts(counts, notification=None):
+    """Send each user's totals from `{user_id: counts}` to their WebSocket group"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not counts:
+        return
+
+    async def send_all():
+        await asyncio.gather(*(
+            channel_layer.group_send(
+                f'chat_user_{user_id}', unread_counts_event(user_counts, notification)
+            )
+            for user_id, user_counts in counts.items()
+        ))
+
+    try:
+        async_to_sync(send_all)()
+    except Exception:
+        logger.exception('Failed to push unread counts to %d users', len(counts))
+
+
+def update_unread_counts(notifications=None, messages=None):
+    """Apply `{user_id: delta}` changes to the cached counts and return the totals.
+
+    The increments and the reads of the new totals share one pipeline;
+    hashes that turn out not to be seeded are counted from the database.
+    Returns `{user_id: counts}` for every affected user.
+    """
+    deltas = {'notifications': notifications or {}, 'messages': messages or {}}
+    user_ids = sorted({int(user_id) for changes in deltas.values() for user_id in changes})
+    if not user_ids:
+        return {}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for field, changes in deltas.items():
+            for user_id, delta in changes.items():
+                if delta:
+                    pipe.hincrby(unread_key(user_id), field, delta)
+        for user_id in user_ids:
+            pipe.expire(unread_key(user_id), UNREAD_TTL_SECONDS)
+        for user_id in user_ids:
+            pipe.hgetall(unread_key(user_id))
+        rows = pipe.execute()[-len(user_ids):]
+    except redis.RedisError:
+        logger.exception('Failed to update unread counts for %d users', len(user_ids))
+        return _counts_from_db(user_ids)
+    return _seed_missing(dict(zip(user_ids, (_parse(row) for row in rows))))
+
+
+def record_unread(notifications=None, messages=None, notification=None):
+    """Apply `{user_id: delta}` changes to the cached counts and push the totals.
+
+    Call after the rows have been committed. `notification` is an optional
+    payload (see `notification_event()` in core.fanout) sent along with the counts.
+    """
+    push_unread_counts(update_unread_counts(notifications, messages), notification)
@@ -0,0 +1,123 @@
+# core/workload.py
+"""Hours an employee has logged, for the dashboards and My Tasks.
+
+`WorkloadSummary` sums today's, this week's (Monday to Sunday), this
+month's and the current sprint's hours in one conditional-aggregate query
+over `TimeLog`, plus one `Task` query for the sprint's estimated hours when
+there is a sprint. `get_workload_summary()` caches the summary per employee,
+sprint and day under the employee's dashboard cache scope, so it is rebuilt
+when the employee's tasks or time logs change (see core/dashboard_cache.py).
+"""
+import operator
+from datetime import timedelta
+from decimal import Decimal
+from functools import reduce
+
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dashboard_cache import cached_fragment
+from .models import Task, TimeLog
+
+WEEKLY_STANDARD_HOURS = 40
+MONTHLY_STANDARD_HOURS = 160  # 40 hours/week * 4 weeks
+
+
+def _percentage(current, total):
+    return min(int((current / total) * 100), 100) if total > 0 else 0
+
+
+def _hours_sum(condition):
+    return Coalesce(
+        Sum('hours', filter=condition), Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class WorkloadSummary:
+    """Logged hours for one employee on one day, with the sprint's estimate"""
+
+    def __init__(self, today, week, month, sprint, sprint_estimated):
+        self.today = today
+        self.week = week
+        self.month = month
+        self.sprint = sprint
+        self.sprint_estimated = sprint_estimated
+
+    @classmethod
+    def compute(cls, employee, sprint=None, today=None):
+        today = today or timezone.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        week_end = week_start + timedelta(days=6)
+        month_start = today.replace(day=1)
+
+        periods = {
+            'today': Q(date=today),
+            'week': Q(date__range=[week_start, week_end]),
+            'month': Q(date__gte=month_start),
+        }
+        if sprint:
+            periods['sprint'] = Q(task__sprint=sprint)
+        # Only scan the rows that count towards some period
+        rows = TimeLog.objects.filter(employee=employee).filter(reduce(operator.or_, periods.values()))
+        totals = rows.aggregate(**{name: _hours_sum(q) for name, q in periods.items()})
+
+        sprint_estimated = 0
+        if sprint:
+            sprint_estimated = Task.objects.filter(
+                assigned_to=employee, sprint=sprint
+            ).aggregate(total=Sum('estimated_hours'))['total'] or 0
+
+        return cls(
+            today=totals['today'],
+            week=totals['week'],
+            month=totals['month'],
+            sprint=totals.get('sprint', 0),
+            sprint_estimated=sprint_estimated,
+        )
+
+    @property
+    def weekly_hours(self):
+        return {
+            'current': self.week,
+            'total': WEEKLY_STANDARD_HOURS,
+            'percentage': _percentage(self.week, WEEKLY_STANDARD_HOURS),
+        }
+
+    @property
+    def sprint_hours(self):
+        return {
+            'current': self.sprint,
+            'total': self.sprint_estimated,
+            'percentage': _percentage(self.sprint, self.sprint_estimated),
+        }
+
+    @property
+    def monthly_hours(self):
+        return {
+            'current': self.month,
+            'total': MONTHLY_STANDARD_HOURS,
+            'percentage': _percentage(self.month, MONTHLY_STANDARD_HOURS),
+        }
+
+    @property
+    def workload_status(self):
+        percentage = self.weekly_hours['percentage']
+        if percentage >= 90:
+            return "Overloaded"
+        if percentage >= 70:
+            return "Heavy"
+        if percentage >= 40:
+            return "Manageable"
+        return "Light"
+
+
+def get_workload_summary(employee, sprint=None, today=None):
+    """`WorkloadSummary.compute()`, cached until the employee's tasks or time logs change"""
+    today = today or timezone.now().date()
+    return cached_fragment(
+        'workload', [('employee', employee.id)],
+        lambda: WorkloadSummary.compute(employee, sprint, today),
+        parts=[sprint.id if sprint else 0, today],
+    )
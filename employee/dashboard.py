@@ -0,0 +1,177 @@
+# employee/dashboard.py
+"""Context for the developer dashboard.
+
+`build_developer_dashboard_context()` backs both `employee:dashboard` and
+`admins:dashboards`. The expensive parts are cached through
+core/dashboard_cache.py:
+
+- `dev_summary` (employee scope, per day): task counts from one annotated
+  query, upcoming deadlines and the ids of the employee's projects.
+- `dev_team` (employee scope plus each of those projects): the active
+  sprint with its progress, and the project managers and team members
+  offered as message recipients.
+- the workload summary (see core/workload.py).
+
+Today's task list, recent messages, the standup and unread counts are read
+on every request.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.dashboard_cache import cached_fragment
+from core.models import Message, Project, Sprint, StandupUpdate, Task, User
+from core.unread_counts import get_unread_counts
+from core.workload import get_workload_summary
+
+ACTIVE_STATUSES = ['todo', 'in_progress']
+
+
+def get_task_counts(employee, today):
+    """Dashboard task counts for `employee` in one aggregate query"""
+    active = Q(status__in=ACTIVE_STATUSES)
+    due_today = Q(due_date=today)
+    return Task.objects.filter(assigned_to=employee).aggregate(
+        today_tasks_count=Count('id', filter=active & due_today),
+        in_progress_tasks_count=Count('id', filter=due_today & Q(status='in_progress')),
+        pending_tasks_count=Count('id', filter=active & ~due_today),
+        due_this_week_count=Count(
+            'id', filter=active & Q(due_date__range=[today, today + timedelta(days=7)])
+        ),
+    )
+
+
+def get_upcoming_deadlines(employee, today=None):
+    """Get upcoming deadlines"""
+    today = today or timezone.now().date()
+    deadlines = []
+
+    # Task deadlines
+    tasks = Task.objects.filter(
+        assigned_to=employee,
+        due_date__gt=today,
+        status__in=ACTIVE_STATUSES
+    ).order_by('due_date')[:5]
+
+    for task in tasks:
+        days_remaining = (task.due_date - today).days
+        if days_remaining <= 3:
+            color = 'red'
+        elif days_remaining <= 7:
+            color = 'orange'
+        else:
+            color = 'blue'
+
+        deadlines.append({
+            'title': task.title,
+            'date': task.due_date,
+            'days_remaining': days_remaining,
+            'color': color
+        })
+
+    return deadlines
+
+
+def get_project_ids(employee):
+    """Projects the employee is a member of or has tasks in"""
+    return list(
+        Project.objects.filter(
+            Q(members__employee=employee) | Q(tasks__assigned_to=employee)
+        ).values_list('id', flat=True).distinct()
+    )
+
+
+def _contacts(users):
+    return [{'id': u.id, 'name': u.get_full_name() or u.username} for u in users]
+
+
+def get_team(employee, project_ids):
+    """Active sprint and message recipients for the employee's projects"""
+    current_sprint = Sprint.objects.filter(
+        project__members__employee=employee,
+        status='active'
+    ).first()
+
+    sprint_progress = current_sprint.progress_percentage() if current_sprint else 0
+
+    users = User.objects.only('id', 'username', 'first_name', 'last_name')
+    project_managers = users.filter(managed_projects__in=project_ids).distinct()
+    team_members = users.filter(
+        employee_profile__project_memberships__project__in=project_ids
+    ).exclude(id=employee.user_id).distinct()
+
+    return {
+        'current_sprint': current_sprint,
+        'sprint_progress': sprint_progress,
+        'project_managers': _contacts(project_managers),
+        'team_members': _contacts(team_members),
+    }
+
+
+def build_developer_dashboard_context(user, employee, today=None):
+    """Template context for employee/dashboard.html"""
+    today = today or timezone.now().date()
+    employee_scope = ('employee', employee.id)
+
+    summary = cached_fragment(
+        'dev_summary', [employee_scope],
+        lambda: {
+            **get_task_counts(employee, today),
+            'upcoming_deadlines': get_upcoming_deadlines(employee, today),
+            'project_ids': get_project_ids(employee),
+        },
+        parts=[today],
+    )
+    project_ids = summary['project_ids']
+    team = cached_fragment(
+        'dev_team', [employee_scope, *(('project', project_id) for project_id in project_ids)],
+        lambda: get_team(employee, project_ids),
+    )
+
+    workload = get_workload_summary(employee, team['current_sprint'], today)
+    weekly_hours = workload.weekly_hours
+
+    # Today's tasks, with the counts the task cards show
+    today_tasks = Task.objects.filter(
+        assigned_to=employee,
+        due_date=today,
+        status__in=ACTIVE_STATUSES
+    ).select_related('project').annotate(
+        attachments_count=Count('files', distinct=True),
+        comments_count=Count('comments', distinct=True),
+    )
+
+    # Recent messages
+    recent_messages = Message.objects.filter(
+        Q(recipients=user) | Q(sender=user)
+    ).distinct().select_related('sender', 'task')[:3]
+
+    # Today's standup (if exists)
+    standup = StandupUpdate.objects.filter(
+        employee=employee,
+        date=today
+    ).first()
+
+    unread = get_unread_counts(user)
+    return {
+        'employee': employee,
+        'today_tasks': today_tasks,
+        'today_tasks_count': summary['today_tasks_count'],
+        'in_progress_tasks_count': summary['in_progress_tasks_count'],
+        'pending_tasks_count': summary['pending_tasks_count'],
+        'due_this_week_count': summary['due_this_week_count'],
+        'sprint_progress': team['sprint_progress'],
+        'workload_percentage': weekly_hours['percentage'],
+        'workload_status': workload.workload_status,
+        'weekly_hours': weekly_hours,
+        'sprint_hours': workload.sprint_hours,
+        'monthly_hours': workload.monthly_hours,
+        'upcoming_deadlines': summary['upcoming_deadlines'],
+        'recent_messages': recent_messages,
+        'standup': standup,
+        'unread_notifications': unread['notifications'],
+        'unread_messages': unread['messages'],
+        'project_managers': team['project_managers'],
+        'team_members': team['team_members'],
+    }
@@ -0,0 +1,124 @@
+# employee/task_details.py
+"""Task payloads for the "My Tasks" page.
+
+The list page ships only summaries (`serialize_task_summary()`): status,
+progress, hours and counts, which `with_task_summary()` loads in a single
+query however many tasks there are. The modal fetches the full detail for
+one task from the `task_detail` endpoint. `with_task_details()`
+additionally prefetches files, comments (with their authors), the latest
+subtasks and the latest time logs, so `build_task_data()` serializes any
+number of tasks with a fixed number of queries.
+"""
+from django.db.models import Count, Prefetch, Q
+
+from core.models import Comment, Subtask, TimeLog
+
+ACTIVITY_LIMIT = 5
+
+
+def with_task_summary(tasks):
+    """Annotate everything `serialize_task_summary()` reads"""
+    return tasks.select_related(
+        'project__project_manager', 'assigned_to__user'
+    ).annotate(
+        # distinct: the subtask and file joins multiply each other's rows
+        subtasks_count=Count('subtasks', distinct=True),
+        subtasks_completed=Count('subtasks', filter=Q(subtasks__is_completed=True), distinct=True),
+        attachments_count=Count('files', distinct=True),
+    )
+
+
+def with_task_details(tasks):
+    """Annotate and prefetch everything `serialize_task_detail()` reads"""
+    return with_task_summary(tasks).prefetch_related(
+        'files',
+        Prefetch('comments', queryset=Comment.objects.select_related('user').order_by('created_at')),
+        Prefetch(
+            'subtasks',
+            queryset=Subtask.objects.order_by('-created_at')[:ACTIVITY_LIMIT],
+            to_attr='recent_subtasks',
+        ),
+        Prefetch(
+            'time_logs',
+            queryset=TimeLog.objects.order_by('-date')[:ACTIVITY_LIMIT],
+            to_attr='recent_time_logs',
+        ),
+    )
+
+
+def serialize_task_summary(task):
+    """List-page data for a task from `with_task_summary()`.
+
+    Also sets `task.progress` from the subtasks when it has any, which the
+    task cards show.
+    """
+    if task.subtasks_count:
+        task.progress = int((task.subtasks_completed / task.subtasks_count) * 100)
+    return {
+        'id': task.id,
+        'title': task.title,
+        'project': task.project.name if task.project else '',
+        'type': task.task_type,
+        'priority': task.priority,
+        'status': task.status,
+        'progress': int(task.progress or 0),
+        'hours_estimated': float(task.estimated_hours) if task.estimated_hours else 0,
+        'hours_actual': float(task.actual_hours) if task.actual_hours else 0,
+        'due_date': str(task.due_date) if task.due_date else '',
+        'attachments': task.attachments_count,
+        'subtasks_count': task.subtasks_count,
+        'subtasks_completed': task.subtasks_completed,
+    }
+
+
+def serialize_task_detail(task):
+    """Full modal data for a task from `with_task_details()`"""
+    project = task.project
+    project_manager = project.project_manager if project else None
+
+    attachments_list = [{
+        'id': f.id,
+        'name': f.name or f.file.name.split('/')[-1],
+        'size': '',
+        'type': 'file',
+        'url': f.file.url if f.file else '',
+    } for f in task.files.all()]
+
+    comments_list = [{
+        'id': c.id,
+        'author': c.user.get_full_name(),
+        'content': c.content,
+        'created_at': c.created_at.strftime('%b %d, %Y %H:%M') if c.created_at else '',
+    } for c in task.comments.all()]
+
+    # Simple activity feed: latest time logs, then latest subtasks
+    activity_list = [{
+        'type': 'timelog',
+        'date': tl.date.strftime('%b %d, %Y') if tl.date else '',
+        'hours': float(tl.hours) if tl.hours else 0,
+        'note': tl.description,
+    } for tl in task.recent_time_logs]
+    activity_list += [{
+        'type': 'subtask',
+        'id': st.id,
+        'title': st.title,
+        'is_completed': st.is_completed,
+        'created_at': st.created_at.strftime('%b %d, %Y') if st.created_at else '',
+    } for st in task.recent_subtasks]
+
+    return {
+        **serialize_task_summary(task),
+        'projectManager': project_manager.get_full_name() if project_manager else '',
+        'description': task.description or '',
+        'projectDescription': project.description if project else '',
+        'attachments_list': attachments_list,
+        'comments': comments_list,
+        'activity': activity_list,
+        'created': task.created_at.strftime('%b %d, %Y') if task.created_at else '',
+        'assigned_to': task.assigned_to.get_full_name() if task.assigned_to else '',
+    }
+
+
+def build_task_data(tasks):
+    """`{task_id: payload}` for a queryset from `with_task_details()`"""
+    return {task.id: serialize_task_detail(task) for task in tasks}
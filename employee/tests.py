@@ -1,3 +1,304 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.test_utils import ProjectFixturesMixin
+from core.time_logging import log_time_entry
+from core.models import Comment, Message, Task, TimeLog, User
+
+
+class MyTasksTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in_developer()
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('employee:my_tasks'))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.context['task_data_json']), len(ctx.captured_queries)
+
+    def test_query_count_independent_of_task_count(self):
+        for _ in range(2):
+            self.add_assigned_task(subtasks=2, time_logs=2)
+        _, baseline = self.get()
+
+        for _ in range(5):
+            self.add_assigned_task(subtasks=3, completed=1, time_logs=7)
+
+        task_data, queries = self.get()
+        self.assertEqual(len(task_data), 7)
+        self.assertEqual(queries, baseline)
+
+    def test_page_ships_summaries_only(self):
+        task = self.add_assigned_task(subtasks=4, completed=1, time_logs=7)
+        plain = self.add_assigned_task()
+
+        task_data, _ = self.get()
+        payload = task_data[str(task.id)]
+        self.assertEqual(payload['subtasks_count'], 4)
+        self.assertEqual(payload['subtasks_completed'], 1)
+        self.assertEqual(payload['progress'], 25)
+        self.assertEqual(payload['attachments'], 1)
+        self.assertNotIn('comments', payload)
+        self.assertNotIn('activity', payload)
+        self.assertEqual(task_data[str(plain.id)]['progress'], 10)
+
+
+class TaskDetailTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in_developer()
+
+    def get_detail(self, task, **headers):
+        return self.client.get(
+            reverse('employee:task_detail', args=[task.id]), HTTP_ACCEPT='application/json', **headers
+        )
+
+    def test_payload(self):
+        task = self.add_assigned_task(subtasks=4, completed=1, time_logs=7)
+
+        response = self.get_detail(task)
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload['progress'], 25)
+        self.assertEqual(payload['projectManager'], 'Pat Manager')
+        self.assertEqual(payload['assigned_to'], 'Dana Dev')
+        self.assertEqual(payload['attachments_list'][0]['name'], 'spec.txt')
+        self.assertEqual([c['content'] for c in payload['comments']], ['Looks good'])
+        activity = [entry['type'] for entry in payload['activity']]
+        self.assertEqual(activity, ['timelog'] * 5 + ['subtask'] * 4)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_unchanged_task_is_not_modified(self):
+        task = self.add_assigned_task()
+        etag = self.get_detail(task)['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get_detail(task, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        task_queries = [q for q in ctx.captured_queries if 'core_task' in q['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_child_rows(self):
+        task = self.add_assigned_task()
+        etag = self.get_detail(task)['ETag']
+
+        Comment.objects.create(task=task, user=self.user, content='One more thing')
+        response = self.get_detail(task, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['comments']), 2)
+
+    def test_other_users_task(self):
+        other = User.objects.create_user(username='other', password='password123')
+        task = self.add_assigned_task()
+        self.client.force_login(other)
+        self.assertEqual(self.get_detail(task).status_code, 404)
+
+    def test_page_request_redirects_to_task_list(self):
+        task = self.add_assigned_task()
+        response = self.client.get(reverse('employee:task_detail', args=[task.id]))
+        self.assertRedirects(response, f'http://testserver/employee/tasks/?open={task.id}', fetch_redirect_response=False)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DeveloperDashboardTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        patcher = mock.patch(
+            'employee.dashboard.get_unread_counts', return_value={'notifications': 0, 'messages': 0}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.log_in_developer(member=True)
+
+    def add_dated_task(self, status, due_in=0, hours='2.00'):
+        return self.add_task(
+            status, sprint=self.sprint, assigned_to=self.employee, due_in=due_in, hours=hours
+        )
+
+    def add_teammate(self, username):
+        return self.add_employee(username, first_name=username.title()).user
+
+    def get_dashboard(self, url_name='employee:dashboard'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return response.context, ctx.captured_queries
+
+    def test_counts(self):
+        self.add_dated_task('todo')
+        self.add_dated_task('in_progress')
+        self.add_dated_task('done', hours='6.00')
+        self.add_dated_task('todo', due_in=3)
+        self.add_dated_task('in_progress', due_in=10)
+        self.add_assigned_task()
+
+        context, _ = self.get_dashboard()
+        self.assertEqual(context['today_tasks_count'], 3)
+        self.assertEqual(context['in_progress_tasks_count'], 1)
+        self.assertEqual(context['pending_tasks_count'], 2)
+        self.assertEqual(context['due_this_week_count'], 4)
+        self.assertEqual(context['sprint_progress'], 42)  # 6 of 14 hours done
+        self.assertEqual(len(context['upcoming_deadlines']), 2)
+        self.assertEqual(len(context['today_tasks']), 3)
+        self.assertEqual({t.attachments_count for t in context['today_tasks']}, {0, 1})
+
+    def test_contacts(self):
+        self.add_teammate('alex')
+        context, _ = self.get_dashboard()
+        self.assertEqual(context['project_managers'], [{'id': self.project.project_manager_id, 'name': 'Pat Manager'}])
+        self.assertEqual([u['name'] for u in context['team_members']], ['Alex'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_teammate('blair')
+        context, _ = self.get_dashboard()
+        self.assertEqual(sorted(u['name'] for u in context['team_members']), ['Alex', 'Blair'])
+
+    def test_cached_sections_skip_the_database(self):
+        self.add_dated_task('todo')
+        self.add_teammate('alex')
+        _, cold = self.get_dashboard()
+        context, warm = self.get_dashboard()
+        self.assertLess(len(warm), len(cold))
+        for table in ('core_sprint', 'core_timelog', 'core_projectmember'):
+            self.assertFalse([q for q in warm if table in q['sql']], table)
+        self.assertEqual(context['today_tasks_count'], 1)
+
+    def test_admin_route_uses_the_same_context(self):
+        self.add_dated_task('todo')
+        context, _ = self.get_dashboard()
+        admin_context, _ = self.get_dashboard('admins:dashboards')
+        for key in ('today_tasks_count', 'pending_tasks_count', 'sprint_progress', 'team_members', 'weekly_hours'):
+            self.assertEqual(admin_context[key], context[key])
+
+
+class TimeLoggingTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in_developer()
+        self.task = self.add_assigned_task()
+        self.other_task = self.add_assigned_task()
+
+    def post_bulk(self, entries):
+        return self.client.post(
+            reverse('employee:log_time_bulk'), json.dumps({'entries': entries}), content_type='application/json'
+        )
+
+    def test_stale_task_instances_do_not_lose_hours(self):
+        stale = Task.objects.get(pk=self.task.pk)
+        log_time_entry(self.employee, stale, Decimal('1.25'))
+        _, today_total = log_time_entry(self.employee, stale, Decimal('2.50'))
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.actual_hours, Decimal('3.75'))
+        self.assertEqual(today_total, Decimal('3.75'))
+
+    def test_timer_and_manual_logging(self):
+        response = self.client.post(reverse('employee:log_time_timer'), {'task': self.task.id, 'hours': '1.5'})
+        self.assertEqual(response.json()['today_total'], '1.50')
+
+        yesterday = self.today - timedelta(days=1)
+        response = self.client.post(reverse('employee:log_time_manual'), {
+            'task': self.task.id, 'hours': '2', 'date': yesterday.isoformat(), 'description': 'Review',
+        })
+        self.assertEqual(response.json()['today_total'], '1.50')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.actual_hours, Decimal('3.50'))
+
+        response = self.client.post(reverse('employee:log_time_timer'), {'task': self.task.id, 'hours': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_task_log_time_route(self):
+        response = self.client.post(reverse('employee:log_time', args=[self.task.id]), {'hours': '0.5'})
+        self.assertRedirects(response, reverse('employee:task_detail', args=[self.task.id]), fetch_redirect_response=False)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.actual_hours, Decimal('0.50'))
+
+    def test_bulk_timesheet(self):
+        week = [self.today - timedelta(days=i) for i in range(5)]
+        entries = [
+            {'task': task.id, 'date': day.isoformat(), 'hours': '2'}
+            for day in week for task in (self.task, self.other_task)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_bulk(entries)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['logged'], 10)
+        self.assertEqual(data['today_total'], '4.00')
+        self.assertEqual(data['daily_totals'], {day.isoformat(): '4.00' for day in week})
+        self.assertEqual(TimeLog.objects.filter(employee=self.employee).count(), 10)
+        for task in (self.task, self.other_task):
+            task.refresh_from_db()
+            self.assertEqual(task.actual_hours, Decimal('10.00'))
+
+        # One insert, one update per task and one totals query, whatever the entry count
+        writes = [q for q in ctx.captured_queries if 'core_timelog' in q['sql'] or 'UPDATE "core_task"' in q['sql']]
+        self.assertEqual(len(writes), 4)
+
+    def test_bulk_timesheet_is_all_or_nothing(self):
+        foreign = Task.objects.create(
+            title='Foreign', project=self.project, estimated_hours=Decimal('1.00'), due_date=self.today,
+        )
+        for bad in [
+            {'task': foreign.id, 'hours': '1'},
+            {'task': self.task.id, 'hours': '25'},
+            {'task': self.task.id, 'hours': '1', 'date': 'yesterday'},
+        ]:
+            response = self.post_bulk([{'task': self.task.id, 'hours': '1'}, bad])
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json()['error'].startswith('Entry 1'))
+        self.assertEqual(self.post_bulk([]).status_code, 400)
+        self.assertFalse(TimeLog.objects.exists())
+
+
+class DirectMessageTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in_developer(member=True)
+
+    def send(self, recipient):
+        return self.client.post(
+            reverse('employee:send_direct_message'), {'recipient': recipient.id, 'content': 'Hi'}
+        )
+
+    def test_recipient_must_share_a_project(self):
+        response = self.send(self.project.project_manager)
+        self.assertTrue(response.json()['success'])
+
+        outsider = User.objects.create_user(username='outsider', password='password123')
+        response = self.send(outsider)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Message.objects.filter(recipients=outsider).exists())
+
+    def test_send_form_drops_recipients_outside_projects(self):
+        outsider = User.objects.create_user(username='outsider', password='password123')
+        pm = self.project.project_manager
+
+        with mock.patch('core.messaging.MessagingService.deliver') as deliver, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('employee:send_message'), {
+                'recipients': [pm.id, outsider.id], 'subject': 'Standup', 'content': 'Running late',
+            })
+
+        self.assertRedirects(response, reverse('employee:messages'), fetch_redirect_response=False)
+        message = Message.objects.get()
+        self.assertEqual((message.message_type, message.subject), ('direct', 'Standup'))
+        self.assertEqual(list(message.recipients.all()), [pm])
+        deliver.assert_called_once()
@@ -17,12 +17,13 @@ urlpatterns = [
     path('tasks/<int:task_id>/comments/add/', views.add_comment, name='add_comment'),
     path('tasks/<int:task_id>/subtasks/create/', views.create_subtask, name='create_subtask'),
     path('subtasks/<int:subtask_id>/update/', views.update_subtask, name='update_subtask'),
-    path('tasks/<int:task_id>/log-time/', views.log_time, name='log_time'),
+    path('tasks/<int:task_id>/log-time/', views.log_task_time, name='log_time'),
     
     # Time tracking
     path('time-tracking/', views.time_tracking, name='time_tracking'),
     path('time-tracking/log/', views.log_time, name='log_time_timer'),
     path('time-tracking/log/manual/', views.log_time_manual, name='log_time_manual'),
+    path('time-tracking/log/bulk/', views.log_time_bulk, name='log_time_bulk'),
     
     # Sprint views
     path('sprint/', views.current_sprint, name='current_sprint'),
@@ -2,7 +2,10 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Q, Count, Sum, Avg
 from datetime import datetime, timedelta
 from core.models import (
@@ -11,6 +14,19 @@ from core.models import (
 )
 from core.models import Comment
 from core.models import Subtask
+from core.conversations import get_inbox, get_message_page, get_page_size
+from core.messaging import MessagingService, can_message
+from core.presence import get_presence
+from core.project_events import broadcast_project_event
+from core.outbox import enqueue_notification
+from core.read_receipts import mark_read_upto, publish_read_receipt
+from core.unread_counts import get_unread_counts, record_unread
+from core.time_logging import (
+    MAX_TIMESHEET_ENTRIES, log_time_entries, log_time_entry, parse_date, parse_hours,
+)
+from core.workload import get_workload_summary
+from .dashboard import build_developer_dashboard_context
+from .task_details import serialize_task_detail, serialize_task_summary, with_task_details, with_task_summary
 import json
 def get_user_websocket_url(request):
     """Get WebSocket URL for the current user"""
@@ -23,124 +39,8 @@ def get_user_websocket_url(request):
 @login_required
 def developer_dashboard(request):
     """Developer dashboard view"""
-    # Get employee profile
     employee = get_object_or_404(EmployeeProfile, user=request.user)
-    
-    # Today's date
-    today = timezone.now().date()
-    
-    # Today's tasks
-    today_tasks = Task.objects.filter(
-        assigned_to=employee,
-        due_date=today,
-        status__in=['todo', 'in_progress']
-    ).select_related('project').prefetch_related('files')
-    
-    # Pending tasks
-    pending_tasks = Task.objects.filter(
-        assigned_to=employee,
-        status__in=['todo', 'in_progress']
-    ).exclude(due_date=today)
-    
-    # Due this week
-    week_end = today + timedelta(days=7)
-    due_this_week = Task.objects.filter(
-        assigned_to=employee,
-        due_date__range=[today, week_end],
-        status__in=['todo', 'in_progress']
-    ).count()
-    
-    # Get current sprint
-    current_sprint = Sprint.objects.filter(
-        project__members__employee=employee,
-        status='active'
-    ).first()
-    
-    # Calculate sprint progress
-    sprint_progress = 0
-    if current_sprint:
-        total_points = current_sprint.total_points()
-        completed_points = current_sprint.completed_points()
-        if total_points > 0:
-            sprint_progress = int((completed_points / total_points) * 100)
-    
-    # Workload calculation
-    weekly_hours = calculate_weekly_hours(employee)
-    sprint_hours = calculate_sprint_hours(employee, current_sprint)
-    monthly_hours = calculate_monthly_hours(employee)
-    
-    # Determine workload status
-    total_hours = weekly_hours.get('percentage', 0)
-    if total_hours >= 90:
-        workload_status = "Overloaded"
-    elif total_hours >= 70:
-        workload_status = "Heavy"
-    elif total_hours >= 40:
-        workload_status = "Manageable"
-    else:
-        workload_status = "Light"
-    
-    # Upcoming deadlines
-    upcoming_deadlines = get_upcoming_deadlines(employee)
-    
-    # Recent messages
-    recent_messages = Message.objects.filter(
-        Q(recipients=request.user) | Q(sender=request.user)
-    ).distinct().select_related('sender', 'task')[:3]
-    
-    # Today's standup (if exists)
-    standup = StandupUpdate.objects.filter(
-        employee=employee,
-        date=today
-    ).first()
-    
-    # Prepare context
-    context = {
-        'employee': employee,
-        'today_tasks': today_tasks,
-        'today_tasks_count': today_tasks.count(),
-        'in_progress_tasks_count': today_tasks.filter(status='in_progress').count(),
-        'pending_tasks_count': pending_tasks.count(),
-        'due_this_week_count': due_this_week,
-        'sprint_progress': sprint_progress,
-        'workload_percentage': weekly_hours.get('percentage', 0),
-        'workload_status': workload_status,
-        'weekly_hours': weekly_hours,
-        'sprint_hours': sprint_hours,
-        'monthly_hours': monthly_hours,
-        'upcoming_deadlines': upcoming_deadlines,
-        'recent_messages': recent_messages,
-        'standup': standup,
-        'unread_notifications': Notification.objects.filter(
-            user=request.user, 
-            is_read=False
-        ).count(),
-        'unread_messages': Message.objects.filter(
-            recipients=request.user,
-            is_read=False
-        ).count(),
-    }
-    # Determine project managers and team members for quick messaging
-    try:
-        projects = Project.objects.filter(
-            Q(members__employee=employee) | Q(tasks__assigned_to=employee)
-        ).distinct()
-
-        pm_user_ids = [p.project_manager.id for p in projects if p.project_manager]
-        project_managers = User.objects.filter(id__in=pm_user_ids).distinct()
-
-        team_members_qs = Project.objects.filter(id__in=projects.values_list('id', flat=True))
-        team_members = User.objects.filter(
-            employee_profile__project_memberships__project__in=projects
-        ).exclude(id=request.user.id).distinct()
-
-        # serialize minimal info for template
-        context['project_managers'] = [{'id': u.id, 'name': u.get_full_name() or u.username} for u in project_managers]
-        context['team_members'] = [{'id': u.id, 'name': u.get_full_name() or u.username} for u in team_members]
-    except Exception:
-        context['project_managers'] = []
-        context['team_members'] = []
-    
+    context = build_developer_dashboard_context(request.user, employee)
     return render(request, 'employee/dashboard.html', context)
 
 @login_required
@@ -150,26 +50,27 @@ def submit_standup(request):
         employee = get_object_or_404(EmployeeProfile, user=request.user)
         today = timezone.now().date()
         
-        standup, created = StandupUpdate.objects.update_or_create(
-            employee=employee,
-            date=today,
-            defaults={
-                'yesterday_work': request.POST.get('yesterday_work'),
-                'today_plan': request.POST.get('today_plan'),
-                'blockers': request.POST.get('blockers', ''),
-            }
-        )
-        
-        # Create notification for project manager
-        if employee.department and employee.department.manager:
-            Notification.objects.create(
-                user=employee.department.manager,
-                notification_type='standup',
-                title=f'Standup Update from {employee.get_full_name()}',
-                message=f'{employee.get_full_name()} submitted their daily standup.',
-                related_id=employee.id,
-                related_type='employeeprofile'
+        with transaction.atomic():
+            standup, created = StandupUpdate.objects.update_or_create(
+                employee=employee,
+                date=today,
+                defaults={
+                    'yesterday_work': request.POST.get('yesterday_work'),
+                    'today_plan': request.POST.get('today_plan'),
+                    'blockers': request.POST.get('blockers', ''),
+                }
             )
+            
+            # Queue notification for project manager
+            if employee.department and employee.department.manager_id:
+                enqueue_notification(
+                    employee.department.manager_id,
+                    notification_type='standup',
+                    title=f'Standup Update from {employee.get_full_name()}',
+                    message=f'{employee.get_full_name()} submitted their daily standup.',
+                    related_id=employee.id,
+                    related_type='employeeprofile'
+                )
         
         return redirect('employee:dashboard')
     
@@ -191,18 +92,23 @@ def update_task_status(request, task_id):
                 task.start_date = timezone.now().date()
                 task.progress = 50
             
-            task.save()
-
-            # Create notification for task creator
-            if task.created_by:
-                Notification.objects.create(
-                    user=task.created_by,
-                    notification_type='task_updated',
-                    title=f'Task {task.get_status_display()}',
-                    message=f'{request.user.get_full_name()} changed task "{task.title}" to {task.get_status_display()}.',
-                    related_id=task.id,
-                    related_type='task'
+            with transaction.atomic():
+                task.save()
+                broadcast_project_event(
+                    task.project_id, 'task_status',
+                    task_id=task.id, status=task.status, progress=task.progress
                 )
+
+                # Queue notification for task creator
+                if task.created_by_id:
+                    enqueue_notification(
+                        task.created_by_id,
+                        notification_type='task_updated',
+                        title=f'Task {task.get_status_display()}',
+                        message=f'{request.user.get_full_name()} changed task "{task.title}" to {task.get_status_display()}.',
+                        related_id=task.id,
+                        related_type='task'
+                    )
             # Save any uploaded files (screenshots) attached during submission
             try:
                 uploaded_files = []
@@ -226,104 +132,12 @@ def task_detail_modal(request, task_id):
     task = get_object_or_404(Task, id=task_id, assigned_to__user=request.user)
     return render(request, 'partials/task_modal.html', {'task': task})
 
-# Helper functions
-def calculate_weekly_hours(employee):
-    """Calculate weekly hours"""
-    today = timezone.now().date()
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-    
-    time_logs = TimeLog.objects.filter(
-        employee=employee,
-        date__range=[week_start, week_end]
-    )
-    
-    total_hours = time_logs.aggregate(total=Sum('hours'))['total'] or 0
-    standard_hours = 40
-    
-    return {
-        'current': total_hours,
-        'total': standard_hours,
-        'percentage': min(int((total_hours / standard_hours) * 100), 100) if standard_hours > 0 else 0
-    }
-
-def calculate_sprint_hours(employee, sprint):
-    """Calculate sprint hours"""
-    if not sprint:
-        return {'current': 0, 'total': 0, 'percentage': 0}
-    
-    time_logs = TimeLog.objects.filter(
-        employee=employee,
-        task__sprint=sprint
-    )
-    
-    total_hours = time_logs.aggregate(total=Sum('hours'))['total'] or 0
-    estimated_hours = Task.objects.filter(
-        assigned_to=employee,
-        sprint=sprint
-    ).aggregate(total=Sum('estimated_hours'))['total'] or 0
-    
-    return {
-        'current': total_hours,
-        'total': estimated_hours,
-        'percentage': min(int((total_hours / estimated_hours) * 100), 100) if estimated_hours > 0 else 0
-    }
-
-def calculate_monthly_hours(employee):
-    """Calculate monthly hours"""
-    today = timezone.now().date()
-    month_start = today.replace(day=1)
-    
-    time_logs = TimeLog.objects.filter(
-        employee=employee,
-        date__gte=month_start
-    )
-    
-    total_hours = time_logs.aggregate(total=Sum('hours'))['total'] or 0
-    standard_hours = 160  # 40 hours/week * 4 weeks
-    
-    return {
-        'current': total_hours,
-        'total': standard_hours,
-        'percentage': min(int((total_hours / standard_hours) * 100), 100) if standard_hours > 0 else 0
-    }
-
-def get_upcoming_deadlines(employee):
-    """Get upcoming deadlines"""
-    today = timezone.now().date()
-    deadlines = []
-    
-    # Task deadlines
-    tasks = Task.objects.filter(
-        assigned_to=employee,
-        due_date__gt=today,
-        status__in=['todo', 'in_progress']
-    ).order_by('due_date')[:5]
-    
-    for task in tasks:
-        days_remaining = (task.due_date - today).days
-        if days_remaining <= 3:
-            color = 'red'
-        elif days_remaining <= 7:
-            color = 'orange'
-        else:
-            color = 'blue'
-        
-        deadlines.append({
-            'title': task.title,
-            'date': task.due_date,
-            'days_remaining': days_remaining,
-            'color': color
-        })
-    
-    return deadlines
-
 # Other views for navigation
 @login_required
 def my_tasks(request):
     """My tasks view"""
     employee = get_object_or_404(EmployeeProfile, user=request.user)
-    tasks = Task.objects.filter(assigned_to=employee).select_related('project', 'project__project_manager').prefetch_related('files')
+    tasks = Task.objects.filter(assigned_to=employee)
 
     # Dates for filtering
     today = timezone.now().date()
@@ -341,12 +155,13 @@ def my_tasks(request):
     status_counts = {item['status']: item['count'] for item in status_qs}
 
     # Time logged today
-    time_logged_today = TimeLog.objects.filter(employee=employee, date=today).aggregate(total=Sum('hours'))['total'] or 0
+    workload = get_workload_summary(employee, today=today)
+    time_logged_today = workload.today
 
-    # Time distribution this week by project
-    week_start = today
-    time_logs_week = TimeLog.objects.filter(employee=employee, date__range=[week_start, week_end])
-    total_hours_this_week = time_logs_week.aggregate(total=Sum('hours'))['total'] or 0
+    # Time distribution this (Monday to Sunday) week by project
+    week_start = today - timedelta(days=today.weekday())
+    time_logs_week = TimeLog.objects.filter(employee=employee, date__range=[week_start, week_start + timedelta(days=6)])
+    total_hours_this_week = workload.week
     # Aggregate by project name
     proj_hours = (
         time_logs_week.values('task__project__name')
@@ -366,112 +181,15 @@ def my_tasks(request):
     # Workflow steps for template
     workflow_steps = ['todo', 'in_progress', 'review', 'done']
 
-    # Build a JS-friendly data structure for the front-end modal and interactions
-    task_data = {}
-    for t in tasks:
-        # compute subtask counts and adjust progress if subtasks exist
-        try:
-            subtasks_qs = t.subtasks.all()
-            subt_count = subtasks_qs.count()
-            subt_completed = subtasks_qs.filter(is_completed=True).count()
-            t.subtasks_count = subt_count
-            t.subtasks_completed = subt_completed
-            if subt_count > 0:
-                # derive progress from subtasks
-                t.progress = int((subt_completed / subt_count) * 100)
-        except Exception:
-            t.subtasks_count = 0
-            t.subtasks_completed = 0
-            t.progress = int(t.progress or 0)
-
-        project = t.project
-        project_manager = project.project_manager if project else None
-
-        attachments_list = []
-        for f in t.files.all():
-            attachments_list.append({
-                'id': f.id,
-                'name': getattr(f, 'name', '') or getattr(f, 'file', '').split('/')[-1],
-                'size': '',
-                'type': 'file'
-                , 'url': getattr(f, 'file', None).url if getattr(f, 'file', None) else ''
-            })
-
-        # Serialize comments for modal
-        comments_list = []
-        for c in Comment.objects.filter(task=t).select_related('user').order_by('created_at'):
-            comments_list.append({
-                'id': c.id,
-                'author': c.user.get_full_name() if getattr(c, 'user', None) else str(c.user) if getattr(c, 'user', None) else 'Unknown',
-                'content': c.content,
-                'created_at': c.created_at.strftime('%b %d, %Y %H:%M') if getattr(c, 'created_at', None) else ''
-            })
-
-        # Build simple activity feed (time logs + subtasks)
-        activity_list = []
-        for tl in TimeLog.objects.filter(task=t).order_by('-date')[:5]:
-            activity_list.append({
-                'type': 'timelog',
-                'date': tl.date.strftime('%b %d, %Y') if getattr(tl, 'date', None) else '',
-                'hours': float(tl.hours) if getattr(tl, 'hours', None) else 0,
-                'note': getattr(tl, 'description', '')
-            })
-        try:
-            subtasks_qs = t.subtasks.all() if hasattr(t, 'subtasks') else []
-            subtasks_count = subtasks_qs.count() if hasattr(subtasks_qs, 'count') else 0
-            subtasks_completed = subtasks_qs.filter(is_completed=True).count() if hasattr(subtasks_qs, 'filter') else 0
-            for st in (subtasks_qs.order_by('-created_at')[:5] if hasattr(subtasks_qs, 'order_by') else []):
-                activity_list.append({
-                    'type': 'subtask',
-                    'id': st.id,
-                    'title': st.title,
-                    'is_completed': getattr(st, 'is_completed', False),
-                    'created_at': st.created_at.strftime('%b %d, %Y') if getattr(st, 'created_at', None) else ''
-                })
-        except Exception:
-            subtasks_count = 0
-            subtasks_completed = 0
-            pass
-
-        # compute subtask-inferred progress if subtasks exist
-        try:
-            if subtasks_count > 0:
-                sub_progress = int((subtasks_completed / subtasks_count) * 100)
-            else:
-                sub_progress = int(t.progress or 0)
-        except Exception:
-            sub_progress = int(t.progress or 0)
-        except Exception:
-            pass
-
-        task_data[t.id] = {
-            'id': t.id,
-            'title': t.title,
-            'project': project.name if project else '',
-            'projectManager': project_manager.get_full_name() if project_manager else '',
-            'type': t.task_type,
-            'priority': t.priority,
-            'status': t.status,
-            'progress': sub_progress,
-            'description': t.description or '',
-            'projectDescription': project.description if project else '',
-            'hours_estimated': float(t.estimated_hours) if t.estimated_hours else 0,
-            'hours_actual': float(t.actual_hours) if t.actual_hours else 0,
-            'due_date': str(t.due_date) if t.due_date else '',
-            'attachments': t.files.count(),
-            'attachments_list': attachments_list,
-            'comments': comments_list,
-            'activity': activity_list,
-            'subtasks_count': subtasks_count,
-            'subtasks_completed': subtasks_completed,
-            'created': t.created_at.strftime('%b %d, %Y') if t.created_at else '',
-            'assigned_to': t.assigned_to.get_full_name() if t.assigned_to else ''
-        }
+    # Summaries for the task cards and interactions, in one query however
+    # many tasks there are; the modal loads the full detail from task_detail
+    task_list = with_task_summary(tasks)
+    task_data = {task.id: serialize_task_summary(task) for task in task_list}
 
     task_data_json = json.dumps(task_data)
 
     return render(request, 'employee/my-tasks.html', {
-        'tasks': tasks,
+        'tasks': task_list,
         'task_data_json': task_data_json,
         'current_date': today,
         'week_end': week_end,
@@ -549,26 +267,34 @@ from core.models import (
 
 @login_required
 def task_detail(request, task_id):
-    """View task details"""
-    employee = get_object_or_404(EmployeeProfile, user=request.user)
-    task = get_object_or_404(Task, id=task_id, assigned_to=employee)
-    
-    # Get subtasks
-    subtasks = Subtask.objects.filter(task=task).order_by('created_at')
-    
-    # Get comments
-    comments = Comment.objects.filter(task=task).order_by('created_at')
-    
-    # Get time logs
-    time_logs = TimeLog.objects.filter(task=task).order_by('-date')
-    
-    context = {
-        'task': task,
-        'subtasks': subtasks,
-        'comments': comments,
-        'time_logs': time_logs,
-    }
-    
+    """Task details: JSON for the My Tasks modal, otherwise the tasks page.
+
+    The JSON carries an ETag and Last-Modified from `Task.updated_at`
+    (core/signals.py touches it when comments, subtasks, files or time logs
+    change), so a client revalidating an unchanged task gets a 304 after a
+    single query.
+    """
+    tasks = Task.objects.filter(id=task_id, assigned_to__user=request.user)
+    wants_json = (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        or 'application/json' in request.headers.get('accept', '')
+    )
+    if wants_json:
+        updated_at = tasks.values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return JsonResponse({'success': False, 'error': 'Task not found'}, status=404)
+        etag = quote_etag(f'task-{task_id}-{updated_at.timestamp()}')
+        last_modified = int(updated_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            task = with_task_details(tasks).get()
+            response = JsonResponse(serialize_task_detail(task))
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    get_object_or_404(tasks)
     # If a dedicated template isn't available, redirect back to tasks list
     # and let the client open the modal for this task using the `open` query param.
     return redirect(f"{request.build_absolute_uri('/employee/tasks/').rstrip('/')}/?open={task_id}")
@@ -598,21 +324,19 @@ def add_comment(request, task_id):
     if not content:
         return JsonResponse({'error': 'Empty comment'}, status=400)
 
-    comment = Comment.objects.create(task=task, user=request.user, content=content)
+    with transaction.atomic():
+        comment = Comment.objects.create(task=task, user=request.user, content=content)
 
-    # Notify task creator (best-effort)
-    try:
-        if task.created_by:
-            Notification.objects.create(
-                user=task.created_by,
+        # Queue notification for task creator
+        if task.created_by_id:
+            enqueue_notification(
+                task.created_by_id,
                 notification_type='comment',
                 title=f'New comment on "{task.title}"',
                 message=f'{request.user.get_full_name()}: {content[:140]}',
                 related_id=comment.id,
                 related_type='comment'
             )
-    except Exception:
-        pass
 
     return JsonResponse({
         'id': comment.id,
@@ -722,30 +446,20 @@ def update_subtask(request, subtask_id):
     })
 
 @login_required
-def log_time(request, task_id):
+def log_task_time(request, task_id):
     """Log time for a task"""
     if request.method == 'POST':
         employee = get_object_or_404(EmployeeProfile, user=request.user)
         task = get_object_or_404(Task, id=task_id, assigned_to=employee)
         
-        hours = request.POST.get('hours')
-        description = request.POST.get('description', '')
-        date = request.POST.get('date', timezone.now().date())
+        try:
+            hours = parse_hours(request.POST.get('hours'))
+            date = parse_date(request.POST.get('date'))
+        except ValueError:
+            hours = None
         
         if hours:
-            TimeLog.objects.create(
-                task=task,
-                employee=employee,
-                date=date,
-                hours=hours,
-                description=description
-            )
-            
-            # Update task actual hours
-            total_hours = TimeLog.objects.filter(task=task).aggregate(total=Sum('hours'))['total'] or 0
-            task.actual_hours = total_hours
-            task.save()
-            
+            log_time_entry(employee, task, hours, date, request.POST.get('description', ''))
             return redirect('employee:task_detail', task_id=task_id)
     
     return redirect('employee:dashboard')
@@ -783,27 +497,20 @@ def send_message(request):
         recipient_ids = request.POST.getlist('recipients')
         
         if content and recipient_ids:
-            message = Message.objects.create(
-                sender=request.user,
-                message_type='direct',
-                content=content,
-                subject=request.POST.get('subject', '')
-            )
-            
-            # Add recipients
-            recipients = User.objects.filter(id__in=recipient_ids)
-            message.recipients.set(recipients)
+            # Recipients the user may not message are dropped
+            recipients = [
+                recipient for recipient in User.objects.filter(id__in=recipient_ids)
+                if can_message(request.user, recipient)
+            ]
             
-            # Create notifications for recipients
-            for recipient in recipients:
-                Notification.objects.create(
-                    user=recipient,
-                    notification_type='message',
-                    title='New Message',
-                    message=f'You have a new message from {request.user.get_full_name()}',
-                    related_id=message.id,
-                    related_type='message'
-                )
+            # One direct message per recipient, pushed in real time once committed
+            service = MessagingService()
+            with transaction.atomic():
+                for recipient in recipients:
+                    service.send_direct(
+                        request.user, recipient, content,
+                        subject=request.POST.get('subject', ''), notify=True
+                    )
             
             return redirect('employee:messages')
     
@@ -817,7 +524,10 @@ def notifications_view(request):
     ).order_by('-created_at')
     
     # Mark as read when viewing
-    notifications.filter(is_read=False).update(is_read=True)
+    marked = notifications.filter(is_read=False).update(is_read=True)
+    if marked:
+        user_id = request.user.id
+        transaction.on_commit(lambda: record_unread(notifications={user_id: -marked}))
     
     context = {
         'notifications': notifications,
@@ -851,13 +561,14 @@ def time_tracking(request):
     # Get current active task (if any)
     current_task = available_tasks.first() if available_tasks.exists() else None
     
+    unread = get_unread_counts(request.user)
     context = {
         'today_time_logs': today_time_logs,
         'today_total_hours': today_total,
         'available_tasks': available_tasks,
         'current_task': current_task,
-        'unread_notifications': Notification.objects.filter(user=request.user, is_read=False).count(),
-        'unread_messages': Message.objects.filter(recipients=request.user, is_read=False).count(),
+        'unread_notifications': unread['notifications'],
+        'unread_messages': unread['messages'],
     }
     
     return render(request, 'employee/time_tracking.html', context)
@@ -871,29 +582,16 @@ def log_time(request):
         today = timezone.now().date()
         
         task_id = request.POST.get('task')
-        hours = request.POST.get('hours')
         description = request.POST.get('description', '')
         
         task = get_object_or_404(Task, id=task_id, assigned_to=employee)
+        try:
+            hours = parse_hours(request.POST.get('hours'))
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         
-        # Create time log
-        TimeLog.objects.create(
-            task=task,
-            employee=employee,
-            date=today,
-            hours=hours,
-            description=description
-        )
-        
-        # Update task's actual hours
-        task.actual_hours = (task.actual_hours or 0) + float(hours)
-        task.save()
-        
-        # Calculate new today's total
-        today_total = TimeLog.objects.filter(
-            employee=employee,
-            date=today
-        ).aggregate(total=Sum('hours'))['total'] or 0
+        # Create the time log and add its hours to the task
+        _, today_total = log_time_entry(employee, task, hours, today, description, today=today)
         
         return JsonResponse({
             'success': True,
@@ -910,45 +608,83 @@ def log_time_manual(request):
         employee = get_object_or_404(EmployeeProfile, user=request.user)
         
         task_id = request.POST.get('task')
-        date_str = request.POST.get('date')
-        hours = request.POST.get('hours')
         description = request.POST.get('description', '')
         
         task = get_object_or_404(Task, id=task_id, assigned_to=employee)
-        date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else timezone.now().date()
-        
-        # Create time log
-        TimeLog.objects.create(
-            task=task,
-            employee=employee,
-            date=date,
-            hours=hours,
-            description=description
-        )
+        try:
+            hours = parse_hours(request.POST.get('hours'))
+            date = parse_date(request.POST.get('date'))
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         
-        # Update task's actual hours
-        task.actual_hours = (task.actual_hours or 0) + float(hours)
-        task.save()
-        
-        # Calculate today's total
-        today = timezone.now().date()
-        today_total = TimeLog.objects.filter(
-            employee=employee,
-            date=today
-        ).aggregate(total=Sum('hours'))['total'] or 0
+        # Create the time log and add its hours to the task
+        _, today_total = log_time_entry(employee, task, hours, date, description)
         
         return JsonResponse({
             'success': True,
             'today_total': round(today_total, 2),
             'task_title': task.title,
             'date': date.strftime('%b %d, %Y'),
-            'hours': hours,
+            'hours': str(hours),
             'description': description
         })
     
     return JsonResponse({'success': False}, status=400)
 
 
+@login_required
+def log_time_bulk(request):
+    """Log a timesheet (e.g. a week of entries) in one request.
+
+    Expects a JSON POST: {"entries": [{"task": id, "date": "YYYY-MM-DD",
+    "hours": "2.5", "description": "..."}, ...]}. Either every entry is
+    logged or none is.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    employee = get_object_or_404(EmployeeProfile, user=request.user)
+
+    try:
+        raw_entries = json.loads(request.body.decode('utf-8')).get('entries')
+    except (ValueError, AttributeError):
+        raw_entries = None
+    if not isinstance(raw_entries, list) or not raw_entries:
+        return JsonResponse({'success': False, 'error': 'No entries'}, status=400)
+    if len(raw_entries) > MAX_TIMESHEET_ENTRIES:
+        return JsonResponse(
+            {'success': False, 'error': f'At most {MAX_TIMESHEET_ENTRIES} entries per request'}, status=400
+        )
+
+    task_ids = {str(raw.get('task')) for raw in raw_entries if isinstance(raw, dict)}
+    tasks = {
+        str(task.id): task
+        for task in Task.objects.filter(id__in=[i for i in task_ids if i.isdigit()], assigned_to=employee)
+    }
+    entries = []
+    for index, raw in enumerate(raw_entries):
+        if not isinstance(raw, dict) or str(raw.get('task')) not in tasks:
+            return JsonResponse({'success': False, 'error': f'Entry {index}: unknown task'}, status=400)
+        try:
+            entries.append({
+                'task': tasks[str(raw['task'])],
+                'date': parse_date(raw.get('date')),
+                'hours': parse_hours(raw.get('hours')),
+                'description': str(raw.get('description') or ''),
+            })
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': f'Entry {index}: {e}'}, status=400)
+
+    today = timezone.now().date()
+    time_logs, totals = log_time_entries(employee, entries, today=today)
+
+    return JsonResponse({
+        'success': True,
+        'logged': len(time_logs),
+        'today_total': round(totals[today], 2),
+        'daily_totals': {day.isoformat(): round(total, 2) for day, total in sorted(totals.items())},
+    })
+
+
 @login_required
 def messages_view(request):
     """Messages view"""
@@ -965,68 +701,44 @@ def messages_view(request):
         status__in=['todo', 'in_progress']
     ).order_by('-due_date')
     
-    # Get conversations (users who have sent or received messages from current user)
-    # Get sent messages
-    sent_messages = Message.objects.filter(sender=request.user).values_list('recipients', flat=True)
-    
-    # Get received messages
-    received_messages = Message.objects.filter(recipients=request.user).values_list('sender', flat=True)
-    
-    # Combine and get unique user IDs
-    conversation_user_ids = set(list(sent_messages) + list(received_messages))
-    
-    # Get conversation details
+    # Get conversations from the conversation index, most recent first
+    colors = ['bg-golden-orange', 'bg-dark-cyan', 'bg-rusty-spice', 'bg-pearl-aqua', 'bg-dark-teal']
     conversations = []
-    for user_id in conversation_user_ids:
-        try:
-            user = User.objects.get(id=user_id)
-            
-            # Get last message between these users
-            last_message = Message.objects.filter(
-                Q(sender=request.user, recipients=user) |
-                Q(sender=user, recipients=request.user)
-            ).order_by('-created_at').first()
-            
-            # Count unread messages from this user
-            unread_count = Message.objects.filter(
-                sender=user,
-                recipients=request.user,
-                is_read=False
-            ).count()
-            
-            # Get color for avatar based on user ID
-            colors = ['bg-golden-orange', 'bg-dark-cyan', 'bg-rusty-spice', 'bg-pearl-aqua', 'bg-dark-teal']
-            color_index = user.id % len(colors)
-            
-            conversations.append({
-                'id': f"conv_{request.user.id}_{user.id}",
-                'other_user': user,
-                'name': user.get_full_name() or user.username,
-                'initials': get_user_initials(user),
-                'color': colors[color_index],
-                'last_message': last_message.content if last_message else 'Start a conversation',
-                'last_message_time': last_message.created_at if last_message else timezone.now(),
-                'task_tag': f"#task-{last_message.task.id}" if last_message and last_message.task else None,
-                'tag_color': 'bg-dark-teal bg-opacity-10 text-dark-teal' if last_message else '',
-                'unread': unread_count > 0,
-                'active': False  # Will be set based on current view
-            })
-        except User.DoesNotExist:
-            continue
+    for participant in get_inbox(request.user):
+        user = participant.peer
+        last_message = participant.conversation.last_message
+        
+        conversations.append({
+            'id': f"conv_{request.user.id}_{user.id}",
+            'other_user': user,
+            'name': user.get_full_name() or user.username,
+            'initials': get_user_initials(user),
+            'color': colors[user.id % len(colors)],
+            'last_message': last_message.content if last_message else 'Start a conversation',
+            'last_message_time': participant.last_message_at,
+            'task_tag': f"#task-{last_message.task_id}" if last_message and last_message.task_id else None,
+            'tag_color': 'bg-dark-teal bg-opacity-10 text-dark-teal' if last_message else '',
+            'unread': participant.unread_count > 0,
+            'is_online': False,
+            'active': False  # Will be set based on current view
+        })
     
-    # Sort conversations by last message time
-    conversations.sort(key=lambda x: x['last_message_time'], reverse=True)
+    # Online status for every peer in one ZMSCORE
+    statuses = get_presence(conv['other_user'].id for conv in conversations)
+    for conv in conversations:
+        conv['is_online'] = statuses[conv['other_user'].id]['is_online']
     
     # Mark first conversation as active if there are any
     if conversations:
         conversations[0]['active'] = True
     
+    unread = get_unread_counts(request.user)
     context = {
         'available_users': available_users,
         'user_tasks': user_tasks,
         'conversations': conversations,
-        'unread_notifications': Notification.objects.filter(user=request.user, is_read=False).count(),
-        'unread_messages': Message.objects.filter(recipients=request.user, is_read=False).count(),
+        'unread_notifications': unread['notifications'],
+        'unread_messages': unread['messages'],
     }
     # Also provide project managers and team members for the "no conversations" quick form
     try:
@@ -1061,7 +773,7 @@ def get_user_initials(user):
 
 @login_required
 def get_conversation(request):
-    """Get conversation messages"""
+    """Get a page of conversation messages (see core.conversations.get_message_page)"""
     user_id = request.GET.get('user_id')
     conversation_id = request.GET.get('conversation_id')
     
@@ -1071,11 +783,17 @@ def get_conversation(request):
     try:
         other_user = User.objects.get(id=user_id)
         
-        # Get messages between users
-        messages = Message.objects.filter(
-            Q(sender=request.user, recipients=other_user) |
-            Q(sender=other_user, recipients=request.user)
-        ).order_by('created_at')
+        # Get one keyset page of messages between users (all message types)
+        try:
+            messages, next_cursor = get_message_page(
+                request.user, other_user,
+                before=request.GET.get('before'),
+                after=request.GET.get('after'),
+                limit=get_page_size(request.GET.get('limit')),
+                message_type=None,
+            )
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)})
         
         # Get user info
         user_info = {
@@ -1097,14 +815,15 @@ def get_conversation(request):
                 'sender_initials': get_user_initials(message.sender),
                 'created_at': message.created_at.isoformat(),
                 'is_sent': message.sender.id == request.user.id,
-                'task_tag': f"#task-{message.task.id}" if message.task else None,
+                'task_tag': f"#task-{message.task_id}" if message.task_id else None,
                 'is_read': message.is_read,
             })
         
         return JsonResponse({
             'success': True,
             'user': user_info,
-            'messages': formatted_messages
+            'messages': formatted_messages,
+            'next_cursor': next_cursor,
         })
         
     except User.DoesNotExist:
@@ -1130,34 +849,16 @@ def send_direct_message(request):
         
         try:
             recipient = User.objects.get(id=recipient_id)
+            if not can_message(request.user, recipient):
+                return JsonResponse({'success': False, 'error': 'You cannot message this user'}, status=403)
             
-            # Create message
-            message = Message.objects.create(
-                sender=request.user,
-                message_type='direct',
-                content=content,
-            )
-            
-            # Add recipient
-            message.recipients.add(recipient)
-            
-            # Add task if specified
+            # Attach task if specified
+            task = None
             if task_id:
-                try:
-                    task = Task.objects.get(id=task_id, assigned_to__user=request.user)
-                    message.task = task
-                    message.save()
-                except Task.DoesNotExist:
-                    pass
+                task = Task.objects.filter(id=task_id, assigned_to__user=request.user).first()
             
-            # Create notification for recipient
-            Notification.objects.create(
-                user=recipient,
-                notification_type='message',
-                title='New Message',
-                message=f'You have a new message from {request.user.get_full_name()}',
-                related_id=message.id,
-                related_type='message'
+            message, _, new_conversation = MessagingService().send_direct(
+                request.user, recipient, content, task=task, notify=True
             )
             
             # Format response
@@ -1172,10 +873,7 @@ def send_direct_message(request):
                 'success': True,
                 'message': formatted_message,
                 'recipient_id': recipient.id,
-                'new_conversation': not Message.objects.filter(
-                    Q(sender=request.user, recipients=recipient) |
-                    Q(sender=recipient, recipients=request.user)
-                ).exclude(id=message.id).exists()
+                'new_conversation': new_conversation
             })
             
         except User.DoesNotExist:
@@ -1207,8 +905,8 @@ def get_new_messages(request):
             # Get new messages
             query = Message.objects.filter(
                 sender=other_user,
-                recipients=request.user,
-                is_read=False
+                receipts__user=request.user,
+                receipts__read_at__isnull=True
             )
             
             if last_checked:
@@ -1264,11 +962,8 @@ def mark_messages_read(request):
                     other_user = User.objects.get(id=other_user_id)
                     
                     # Mark messages as read
-                    Message.objects.filter(
-                        sender=other_user,
-                        recipients=request.user,
-                        is_read=False
-                    ).update(is_read=True)
+                    read_count = mark_read_upto(request.user, other_user, message_type=None)
+                    publish_read_receipt(request.user, other_user, None, read_count)
                     
                     return JsonResponse({'success': True})
                     
@@ -1286,7 +981,7 @@ def mark_messages_read(request):
 def get_unread_count(request):
     """Return the unread messages count for the current user (JSON)."""
     try:
-        count = Message.objects.filter(recipients=request.user, is_read=False).count()
+        count = get_unread_counts(request.user)['messages']
         return JsonResponse({'success': True, 'unread_count': count})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
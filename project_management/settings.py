@@ -127,14 +127,48 @@ WSGI_APPLICATION = 'project_management.wsgi.application'
 
 ASGI_APPLICATION = 'project_management.asgi.application'
 
+# Channel layer. CHANNEL_REDIS_URLS (comma-separated) shards channels and
+# groups across several Redis hosts; it defaults to REDIS_URL. Each channel
+# buffers up to CHANNEL_LAYER_CAPACITY messages for CHANNEL_LAYER_EXPIRY
+# seconds; group sends to a full channel drop the message for that channel
+# (see core/channel_layers.py for the backpressure notes). Group memberships
+# expire after CHANNEL_LAYER_GROUP_EXPIRY seconds.
+CHANNEL_REDIS_URLS = [
+    url.strip()
+    for url in os.environ.get('CHANNEL_REDIS_URLS', os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')).split(',')
+    if url.strip()
+]
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'core.channel_layers.InstrumentedRedisChannelLayer',
         'CONFIG': {
-            "hosts": [os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')],
+            "hosts": CHANNEL_REDIS_URLS,
+            "capacity": int(os.environ.get('CHANNEL_LAYER_CAPACITY', '100')),
+            "expiry": int(os.environ.get('CHANNEL_LAYER_EXPIRY', '60')),
+            "group_expiry": int(os.environ.get('CHANNEL_LAYER_GROUP_EXPIRY', '86400')),
         },
     },
 }
+
+# Callables run as hook(group, fanout, seconds) after every group_send,
+# e.g. core.channel_layers.log_group_send (comma-separated dotted paths)
+CHANNEL_LAYER_METRICS_HOOKS = [
+    path.strip() for path in os.environ.get('CHANNEL_LAYER_METRICS_HOOKS', '').split(',') if path.strip()
+]
+
+# Shared cache (dashboard fragments, see core/dashboard_cache.py) on the same
+# Redis as everything else. Keys are prefixed so they cannot clash with the
+# presence/unread/channel-layer keys.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        'KEY_PREFIX': 'cache',
+        'TIMEOUT': 300,
+    },
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
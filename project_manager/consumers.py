@@ -1,13 +1,71 @@
 # pm/consumers.py - Simplified version
+import asyncio
 import json
 import logging
+import time
+from collections import Counter
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
+
+from core import presence
+from core.messaging import MessagingService, can_message
+from core.models import Message
+from core.project_events import project_group, user_project_ids
+from core.read_receipts import mark_read_upto, read_receipt_event
+from core.unread_counts import get_unread_counts
 
 logger = logging.getLogger(__name__)
 
+
+class TokenBucket:
+    """Allow `rate` events per second on average, with bursts up to `capacity`"""
+    
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+    
+    def consume(self, tokens=1):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
 class MessageConsumer(AsyncWebsocketConsumer):
+    # Read receipts arriving within this many seconds are written together
+    receipt_coalesce_seconds = 0.25
+    # A sender who goes quiet this long is reported as having stopped typing
+    typing_timeout_seconds = 5
+    # Inbound frames allowed per connection: sustained rate and burst size
+    frame_rate = 10
+    frame_burst = 30
+    # Messages arriving within this many seconds are written as one batch
+    message_batch_seconds = 0.01
+    batch_messages = True
+    # Re-join groups this often; must stay below the layer's group_expiry
+    group_refresh_seconds = 60 * 60
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_receipts = {}
+        self.receipt_flush_task = None
+        self.typing_timers = {}
+        self.rate_limiter = TokenBucket(self.frame_rate, self.frame_burst)
+        self.dropped_frames = Counter()
+        self.recipients = {}
+        self.outgoing_messages = []
+        self.message_flush_task = None
+        self.project_groups = []
+        self.groups_joined_at = None
+    
     async def connect(self):
         self.user = self.scope.get('user')
         
@@ -19,11 +77,9 @@ class MessageConsumer(AsyncWebsocketConsumer):
         self.room_name = f'user_{self.user.id}'
         self.room_group_name = f'chat_{self.room_name}'
         
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Join room group, the presence broadcast group and one group per project
+        self.project_groups = [project_group(project_id) for project_id in await self.get_project_ids()]
+        await self.join_groups()
         
         await self.accept()
         logger.info(f'WebSocket connected for user {self.user.id}')
@@ -33,13 +89,37 @@ class MessageConsumer(AsyncWebsocketConsumer):
             'type': 'connection_established',
             'message': 'Connected successfully'
         }))
+        
+        # Current badge counts, so clients never need to poll for them
+        counts = await self.get_unread_counts()
+        await self.send(text_data=json.dumps({'type': 'unread_counts', **counts}))
+        
+        if await sync_to_async(presence.touch)(self.user.id, connected=True):
+            await self.broadcast_presence(True)
     
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Write any receipts still waiting for the coalescing window
+        if self.receipt_flush_task is not None:
+            self.receipt_flush_task.cancel()
+        await self.flush_receipts()
+        
+        # Finish writing messages that are already queued; flush_messages logs its own errors
+        if self.message_flush_task is not None:
+            await self.message_flush_task
+        
+        # Nobody keeps typing once the socket is gone
+        for recipient_id in list(self.typing_timers):
+            await self.stop_typing(recipient_id)
+        if self.dropped_frames:
+            logger.info(f'Rate limiter dropped frames for user {self.user.id}: {dict(self.dropped_frames)}')
+        
+        if await sync_to_async(presence.disconnect)(self.user.id):
+            await self.broadcast_presence(False)
+        
+        # Leave the room, presence and project groups
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(group, self.channel_name) for group in self.joined_groups()
+        ))
         logger.info(f'WebSocket disconnected for user {self.user.id}')
     
     async def receive(self, text_data):
@@ -47,58 +127,111 @@ class MessageConsumer(AsyncWebsocketConsumer):
             data = json.loads(text_data)
             message_type = data.get('type')
             
+            if not self.rate_limiter.consume():
+                self.dropped_frames[message_type] += 1
+                if message_type == 'direct_message':
+                    await self.send(text_data=json.dumps({'type': 'rate_limited', 'frame_type': message_type}))
+                return
+            
             if message_type == 'direct_message':
                 await self.handle_direct_message(data)
             elif message_type == 'typing':
                 await self.handle_typing(data)
             elif message_type == 'message_read':
                 await self.handle_message_read(data)
+            elif message_type == 'heartbeat':
+                await self.handle_heartbeat()
                 
         except json.JSONDecodeError:
             logger.error('Invalid JSON received')
     
     async def handle_direct_message(self, data):
-        """Handle direct message sending"""
-        recipient_id = data.get('recipient_id')
+        """Queue a direct message for the next batched write"""
         content = data.get('content')
-        
-        if not recipient_id or not content:
+        if not content:
+            return
+        recipient = await self.get_recipient(data.get('recipient_id'))
+        if recipient is None:
             return
         
-        # Save message to database
-        message = await self.save_message(recipient_id, content)
-        
-        # Prepare message data
-        message_data = {
-            'type': 'direct_message',
-            'message_id': message.id,
-            'sender_id': self.user.id,
-            'sender_name': self.user.get_full_name() or self.user.username,
-            'recipient_id': int(recipient_id),
-            'content': content,
-            'timestamp': message.created_at.isoformat(),
-        }
-        
-        # Send to recipient
-        await self.channel_layer.group_send(
-            f'chat_user_{recipient_id}',
-            {
-                'type': 'chat_message',
-                'message': message_data
-            }
-        )
+        # Sending a message ends any typing indicator shown to the recipient
+        await self.stop_typing(recipient.id)
         
-        # Also send confirmation to sender
-        await self.send(text_data=json.dumps(message_data))
+        self.outgoing_messages.append((recipient, content))
+        if self.message_flush_task is None:
+            self.message_flush_task = asyncio.ensure_future(self.flush_messages())
+    
+    async def flush_messages(self):
+        """Write queued messages, one transaction per burst, and echo them to the sender.
+
+        Runs as a task started by handle_direct_message() and awaited by
+        disconnect(). A failed batch is logged and dropped; later messages
+        are still written.
+        """
+        try:
+            while self.outgoing_messages:
+                if self.batch_messages:
+                    await asyncio.sleep(self.message_batch_seconds)
+                    batch, self.outgoing_messages = self.outgoing_messages, []
+                else:
+                    batch = [self.outgoing_messages.pop(0)]
+                try:
+                    payloads = await self.save_messages(batch)
+                except Exception:
+                    logger.exception(f'Failed to write {len(batch)} direct messages for user {self.user.id}')
+                    continue
+                for payload in payloads:
+                    await self.send(text_data=json.dumps(payload))
+        finally:
+            self.message_flush_task = None
+    
+    async def get_recipient(self, recipient_id):
+        """Recipient by id if the user may message them, looked up once per connection"""
+        try:
+            recipient_id = int(recipient_id)
+        except (TypeError, ValueError):
+            return None
+        if recipient_id not in self.recipients:
+            recipient = await get_user_model().objects.filter(id=recipient_id, is_active=True).afirst()
+            if recipient is not None and not await self.can_message(recipient):
+                recipient = None
+            self.recipients[recipient_id] = recipient
+        return self.recipients[recipient_id]
     
     async def handle_typing(self, data):
-        """Handle typing indicators"""
-        recipient_id = data.get('recipient_id')
-        is_typing = data.get('is_typing')
+        """Forward typing state changes only, not every keystroke frame.
+
+        The first `is_typing` frame for a recipient is sent on; later ones
+        just push back the timeout. An explicit stop, the timeout or a
+        disconnect sends the single "stopped typing" event.
+        """
+        try:
+            recipient_id = int(data.get('recipient_id'))
+        except (TypeError, ValueError):
+            return
         
-        if not recipient_id:
+        if not data.get('is_typing'):
+            await self.stop_typing(recipient_id)
             return
         
+        timer = self.typing_timers.pop(recipient_id, None)
+        if timer is not None:
+            timer.cancel()
+        else:
+            await self.send_typing(recipient_id, True)
+        self.typing_timers[recipient_id] = asyncio.get_running_loop().call_later(
+            self.typing_timeout_seconds,
+            lambda: asyncio.ensure_future(self.stop_typing(recipient_id))
+        )
+    
+    async def stop_typing(self, recipient_id):
+        timer = self.typing_timers.pop(recipient_id, None)
+        if timer is None:
+            return
+        timer.cancel()
+        await self.send_typing(recipient_id, False)
+    
+    async def send_typing(self, recipient_id, is_typing):
         typing_data = {
             'type': 'typing',
             'sender_id': self.user.id,
@@ -115,45 +248,121 @@ class MessageConsumer(AsyncWebsocketConsumer):
             }
         )
     
+    def joined_groups(self):
+        return [self.room_group_name, presence.PRESENCE_GROUP, *self.project_groups]
+    
+    async def join_groups(self):
+        await asyncio.gather(*(
+            self.channel_layer.group_add(group, self.channel_name) for group in self.joined_groups()
+        ))
+        self.groups_joined_at = time.monotonic()
+    
+    async def handle_heartbeat(self):
+        """Refresh presence and sweep out users whose sockets died silently.
+
+        Long-lived sockets also re-join their groups before the channel
+        layer's group_expiry drops them.
+        """
+        if time.monotonic() - self.groups_joined_at > self.group_refresh_seconds:
+            await self.join_groups()
+        if await sync_to_async(presence.touch)(self.user.id):
+            await self.broadcast_presence(True)
+        for user_id in await sync_to_async(presence.sweep_stale)():
+            await self.broadcast_presence(False, user_id)
+    
+    async def broadcast_presence(self, online, user_id=None):
+        await self.channel_layer.group_send(
+            presence.PRESENCE_GROUP,
+            presence.presence_event(user_id or self.user.id, online)
+        )
+    
     async def handle_message_read(self, data):
-        """Handle message read receipts"""
-        message_id = data.get('message_id')
-        await self.mark_message_as_read(message_id)
+        """Queue read receipts for coalesced writing.
+
+        Accepts a single `message_id` or a batch in `message_ids`, plus the
+        peer in `recipient_id`. Receipts for the same peer are merged into
+        the highest message id until the window elapses.
+        """
+        message_ids = data.get('message_ids') or [data.get('message_id')]
+        try:
+            upto_id = max(int(message_id) for message_id in message_ids if message_id)
+        except (TypeError, ValueError):
+            return
+        
+        peer_id = data.get('recipient_id') or await self.get_message_sender_id(upto_id)
+        if not peer_id:
+            return
+        peer_id = int(peer_id)
+        
+        self.pending_receipts[peer_id] = max(self.pending_receipts.get(peer_id, 0), upto_id)
+        if self.receipt_flush_task is None:
+            self.receipt_flush_task = asyncio.ensure_future(self.flush_receipts_later())
+    
+    async def flush_receipts_later(self):
+        await asyncio.sleep(self.receipt_coalesce_seconds)
+        self.receipt_flush_task = None
+        await self.flush_receipts()
+    
+    async def flush_receipts(self):
+        """One UPDATE and one aggregated receipt event per peer"""
+        pending, self.pending_receipts = self.pending_receipts, {}
+        for peer_id, upto_id in pending.items():
+            count = await self.mark_messages_read_upto(peer_id, upto_id)
+            if count:
+                await self.channel_layer.group_send(
+                    f'chat_user_{peer_id}',
+                    read_receipt_event(self.user.id, upto_id, count)
+                )
     
     # Receive handlers for group messages
     async def chat_message(self, event):
-        """Receive message from room group"""
+        """Receive message (and the unread totals it brings) from room group"""
         message = event['message']
         await self.send(text_data=json.dumps(message))
+        if event.get('unread_counts'):
+            await self.send(text_data=json.dumps({'type': 'unread_counts', **event['unread_counts']}))
     
     async def chat_typing(self, event):
         """Receive typing indicator from room group"""
         typing_data = event['message']
         await self.send(text_data=json.dumps(typing_data))
     
+    async def chat_receipt(self, event):
+        """Receive aggregated read receipt from room group"""
+        await self.send(text_data=json.dumps(event['message']))
+    
+    async def user_status_update(self, event):
+        """Receive a presence change from the user_status group"""
+        await self.send(text_data=json.dumps(event['message']))
+    
+    async def project_update(self, event):
+        """Receive a task/sprint event from one of the user's project groups"""
+        await self.send(text_data=json.dumps(event['message']))
+    
+    async def unread_update(self, event):
+        """Receive new unread totals (and any new notification) from room group"""
+        await self.send(text_data=json.dumps(event['message']))
+    
     # Database operations
     @database_sync_to_async
-    def save_message(self, recipient_id, content):
-        from core.models import Message
-        from django.contrib.auth import get_user_model
-        
-        User = get_user_model()
-        recipient = User.objects.get(id=recipient_id)
-        
-        message = Message.objects.create(
-            sender=self.user,
-            message_type='direct',
-            content=content,
-        )
-        message.recipients.add(recipient)
-        return message
+    def can_message(self, recipient):
+        return can_message(self.user, recipient)
     
     @database_sync_to_async
-    def mark_message_as_read(self, message_id):
-        from core.models import Message
-        try:
-            message = Message.objects.get(id=message_id)
-            message.is_read = True
-            message.save()
-        except Message.DoesNotExist:
-            pass
+    def save_messages(self, batch):
+        return MessagingService(self.channel_layer).send_direct_batch(self.user, batch)
+    
+    async def get_message_sender_id(self, message_id):
+        return await Message.objects.filter(id=message_id).values_list('sender_id', flat=True).afirst()
+    
+    @database_sync_to_async
+    def mark_messages_read_upto(self, peer_id, upto_id):
+        return mark_read_upto(self.user, peer_id, upto_id)
+    
+    @database_sync_to_async
+    def get_project_ids(self):
+        return user_project_ids(self.user.id)
+    
+    @database_sync_to_async
+    def get_unread_counts(self):
+        return get_unread_counts(self.user)
@@ -0,0 +1,58 @@
+# pm/dashboard_stats.py
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from core.models import Task
+
+OPEN_STATUSES = ['todo', 'in_progress', 'review']
+ACTIVE_STATUSES = ['todo', 'in_progress']
+
+
+def get_project_dashboard_stats(project, sprint=None, today=None):
+    """Compute task counts and sprint points for a project in a single query.
+
+    Every figure shown on the PM dashboard cards is a conditional aggregate
+    over the project's tasks, so the whole block costs one round-trip no
+    matter how many tasks or team members the project has.
+    """
+    if today is None:
+        today = timezone.now().date()
+
+    aggregates = {
+        'total_tasks': Count('id'),
+        'open_tasks': Count('id', filter=Q(status__in=OPEN_STATUSES)),
+        'active_tasks_count': Count('id', filter=Q(status__in=ACTIVE_STATUSES)),
+        'completed_tasks': Count('id', filter=Q(status='done')),
+        'review_count': Count('id', filter=Q(status='review')),
+        'overdue_count': Count('id', filter=Q(status__in=OPEN_STATUSES, due_date__lt=today)),
+    }
+    if sprint is not None:
+        aggregates['total_sprint_points'] = Sum('estimated_hours', filter=Q(sprint=sprint))
+        aggregates['completed_sprint_points'] = Sum(
+            'estimated_hours', filter=Q(sprint=sprint, status='done')
+        )
+
+    stats = Task.objects.filter(project=project).aggregate(**aggregates)
+    stats['total_sprint_points'] = stats.get('total_sprint_points') or 0
+    stats['completed_sprint_points'] = stats.get('completed_sprint_points') or 0
+
+    if stats['total_tasks'] > 0:
+        stats['project_progress'] = int((stats['completed_tasks'] / stats['total_tasks']) * 100)
+    else:
+        stats['project_progress'] = 0
+
+    if stats['total_sprint_points'] > 0:
+        stats['sprint_progress'] = int(
+            (stats['completed_sprint_points'] / stats['total_sprint_points']) * 100
+        )
+    else:
+        stats['sprint_progress'] = 0
+
+    return stats
+
+
+def serialize_dashboard_stats(stats):
+    """Convert dashboard stats to JSON-safe values"""
+    return {
+        key: float(value) if not isinstance(value, int) else value
+        for key, value in stats.items()
+    }
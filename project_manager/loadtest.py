@@ -0,0 +1,243 @@
+# pm/loadtest.py
+"""Load test for the `ws/messages/` WebSocket stack.
+
+`MessagingLoadTest` opens N authenticated sockets against an ASGI
+application (normally `project_management.asgi:application`, so the real
+`AuthMiddlewareStack` and routing are exercised) with
+`channels.testing.WebsocketCommunicator`. Clients are paired in a ring:
+client i talks to client i+1. Each one then sends a fixed number of frames
+at a steady rate, choosing between direct messages, typing indicators and
+read receipts according to a weighted mix.
+
+The report measures connection setup latency, end-to-end delivery latency
+(from the sender's frame to the recipient's socket), Python heap growth per
+open connection (tracemalloc) and the frames the rate limiter dropped.
+`python manage.py loadtest_messaging` runs it and writes the report as JSON.
+"""
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+from collections import Counter
+from importlib import import_module
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+DEFAULT_MIX = {'send': 6, 'typing': 3, 'read': 1}
+WS_PATH = '/ws/messages/'
+
+
+def parse_mix(value):
+    """`'send=6,typing=3,read=1'` -> `{'send': 6.0, 'typing': 3.0, 'read': 1.0}`"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f'Unknown frame type {name!r}; expected one of {", ".join(DEFAULT_MIX)}')
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError('Frame mix weights must add up to more than zero')
+    return mix
+
+
+def percentiles(values):
+    """p50/p99/max/mean of `values` (seconds) in milliseconds"""
+    if not values:
+        return {'count': 0, 'p50': None, 'p99': None, 'max': None, 'mean': None}
+    values = sorted(values)
+
+    def pick(pct):
+        return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))] * 1000
+
+    return {
+        'count': len(values),
+        'p50': pick(50),
+        'p99': pick(99),
+        'max': values[-1] * 1000,
+        'mean': sum(values) / len(values) * 1000,
+    }
+
+
+def create_session(user):
+    """Create a logged-in session for `user` and return its key"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.create()
+    return store.session_key
+
+
+class LoadClient:
+    """One socket: sends frames to its peer and times what it receives"""
+
+    def __init__(self, index, user, session_key):
+        self.index = index
+        self.user = user
+        self.session_key = session_key
+        self.peer = None
+        self.communicator = None
+        self.last_peer_message_id = None
+        self.received = Counter()
+
+
+class MessagingLoadTest:
+    """Drive `clients` sockets through `frames` frames each at `rate` frames/sec.
+
+    `users` must hold at least two users; each must be able to log in. Call
+    `run()` from an event loop; it returns the report dict.
+    """
+
+    def __init__(self, application, users, frames=20, rate=2.0, mix=None,
+                 drain_timeout=10.0, seed=None):
+        if len(users) < 2:
+            raise ValueError('The load test needs at least two users')
+        self.application = application
+        self.users = users
+        self.frames = frames
+        self.rate = rate
+        self.mix = mix or DEFAULT_MIX
+        self.drain_timeout = drain_timeout
+        self.random = random.Random(seed)
+        self.sent = Counter()
+        self.rate_limited = 0
+        self.in_flight = {}
+        self.delivery_latencies = []
+        self.setup_latencies = []
+        self.connect_failures = 0
+        self.clients = []
+
+    def prepare(self):
+        """Create a session per user; synchronous, so call it outside the event loop"""
+        self.clients = [
+            LoadClient(index, user, create_session(user)) for index, user in enumerate(self.users)
+        ]
+        for client in self.clients:
+            client.peer = self.clients[(client.index + 1) % len(self.clients)]
+
+    def end_sessions(self):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        for client in self.clients:
+            store_class(client.session_key).delete()
+
+    async def run(self):
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await asyncio.gather(*(self.open(client) for client in self.clients))
+        connected = [client for client in self.clients if client.communicator is not None]
+        heap_growth = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        readers = [asyncio.ensure_future(self.read(client)) for client in connected]
+        started_at = time.perf_counter()
+        await asyncio.gather(*(self.drive(client) for client in connected))
+        deadline = time.monotonic() + self.drain_timeout
+        # Rate-limited messages are never delivered, so stop once only they are left
+        while len(self.in_flight) > self.rate_limited and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started_at
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await asyncio.gather(
+            *(client.communicator.disconnect() for client in connected), return_exceptions=True
+        )
+        return self.report(connected, heap_growth, elapsed)
+
+    async def open(self, client):
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.session_key}'
+        communicator = WebsocketCommunicator(
+            self.application, WS_PATH, headers=[(b'cookie', cookie.encode())]
+        )
+        start = time.perf_counter()
+        connected, _ = await communicator.connect(timeout=self.drain_timeout)
+        if connected:
+            first = await communicator.receive_json_from(timeout=self.drain_timeout)
+            connected = first.get('type') == 'connection_established'
+        if not connected:
+            self.connect_failures += 1
+            return
+        self.setup_latencies.append(time.perf_counter() - start)
+        client.communicator = communicator
+
+    async def drive(self, client):
+        """Send this client's frames at a steady rate, starting at a random offset"""
+        interval = 1 / self.rate if self.rate else 0
+        await asyncio.sleep(self.random.random() * interval)
+        kinds, weights = zip(*self.mix.items())
+        for seq in range(self.frames):
+            kind = self.random.choices(kinds, weights)[0]
+            if kind == 'read' and client.last_peer_message_id is None:
+                kind = 'typing'
+            await client.communicator.send_json_to(self.frame(client, kind, seq))
+            self.sent[kind] += 1
+            await asyncio.sleep(interval)
+
+    def frame(self, client, kind, seq):
+        peer_id = client.peer.user.id
+        if kind == 'send':
+            content = f'loadtest {client.index}:{seq}'
+            self.in_flight[content] = time.perf_counter()
+            return {'type': 'direct_message', 'recipient_id': peer_id, 'content': content}
+        if kind == 'typing':
+            return {'type': 'typing', 'recipient_id': peer_id, 'is_typing': True}
+        # Receipts go back to whoever sent us messages: the previous client in the ring
+        sender_id = self.clients[client.index - 1].user.id
+        return {'type': 'message_read', 'message_id': client.last_peer_message_id, 'recipient_id': sender_id}
+
+    async def read(self, client):
+        while True:
+            output = await client.communicator.receive_output(timeout=3600)
+            if output['type'] != 'websocket.send':
+                return
+            data = json.loads(output['text'])
+            kind = data.get('type')
+            client.received[kind] += 1
+            if kind == 'rate_limited':
+                self.rate_limited += 1
+            elif kind == 'direct_message' and data.get('recipient_id') == client.user.id:
+                client.last_peer_message_id = data.get('message_id')
+                sent_at = self.in_flight.pop(data.get('content'), None)
+                if sent_at is not None:
+                    self.delivery_latencies.append(time.perf_counter() - sent_at)
+
+    def report(self, connected, heap_growth, elapsed):
+        received = Counter()
+        for client in connected:
+            received.update(client.received)
+        delivered = len(self.delivery_latencies)
+        return {
+            'config': {
+                'clients': len(self.clients),
+                'frames_per_client': self.frames,
+                'rate_per_client': self.rate,
+                'mix': self.mix,
+            },
+            'connections': {
+                'opened': len(connected),
+                'failed': self.connect_failures,
+                'setup_ms': percentiles(self.setup_latencies),
+            },
+            'memory': {
+                'heap_growth_bytes': heap_growth,
+                'per_connection_bytes': heap_growth // len(connected) if connected else None,
+            },
+            'frames': {
+                'sent': dict(self.sent),
+                'received': dict(received),
+                'rate_limited': self.rate_limited,
+            },
+            'delivery': {
+                'sent': self.sent['send'],
+                'delivered': delivered,
+                'lost': max(0, len(self.in_flight) - self.rate_limited),
+                'latency_ms': percentiles(self.delivery_latencies),
+            },
+            'duration_seconds': elapsed,
+            'messages_per_second': delivered / elapsed if elapsed else 0.0,
+        }
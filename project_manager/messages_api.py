@@ -1,42 +1,46 @@
 # pm/messages_api.py
 import json
-import redis
-import os
-from datetime import datetime
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET, require_POST
-from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from django.utils import timezone
-from core.models import User, EmployeeProfile, Message,Project, ProjectMember
-
-# Redis connection
-_redis_url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
-redis_client = redis.from_url(_redis_url)
+from core.models import User, EmployeeProfile, Project, ProjectMember
+from core.conversations import conversation_exists, get_message_page, get_page_size, get_unread_total
+from core import presence
+from core.messaging import MessagingService, can_message, get_user_color
+from core.read_receipts import mark_page_read, mark_read_upto, publish_read_receipt
 
 @login_required
 @require_GET
 def get_conversation_messages(request, user_id):
-    """Get messages for a specific conversation"""
+    """Get one page of messages for a specific conversation.
+
+    Query params: `before` / `after` cursors from a previous response's
+    `next_cursor`, and `limit` (capped at MAX_PAGE_SIZE). Without a cursor
+    the most recent page is returned.
+    """
     try:
         other_user = User.objects.get(id=user_id)
         current_user = request.user
         
-        # Get messages between current user and other user
-        messages = Message.objects.filter(
-            Q(sender=current_user, recipients=other_user, message_type='direct') |
-            Q(sender=other_user, recipients=current_user, message_type='direct')
-        ).order_by('created_at')
+        # Get one keyset page of messages between current user and other user
+        try:
+            messages, next_cursor = get_message_page(
+                current_user, other_user,
+                before=request.GET.get('before'),
+                after=request.GET.get('after'),
+                limit=get_page_size(request.GET.get('limit')),
+            )
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+        
+        # Mark the page's received messages as read
+        read_count = mark_page_read(current_user, other_user, messages)
+        if read_count:
+            publish_read_receipt(current_user, other_user, max(m.id for m in messages), read_count)
         
         messages_data = []
         for msg in messages:
-            is_sent = msg.sender == current_user
-            
-            # Mark as read if recipient is current user
-            if not is_sent and not msg.is_read:
-                msg.is_read = True
-                msg.save()
+            is_sent = msg.sender_id == current_user.id
             
             messages_data.append({
                 'id': msg.id,
@@ -53,11 +57,12 @@ def get_conversation_messages(request, user_id):
         
         # Get other user info
         employee = EmployeeProfile.objects.filter(user=other_user).first()
-        is_online = redis_client.exists(f'user_online_{other_user.id}')
+        is_online = presence.is_online(other_user.id)
         
         return JsonResponse({
             'success': True,
             'messages': messages_data,
+            'next_cursor': next_cursor,
             'other_user': {
                 'id': other_user.id,
                 'name': other_user.get_full_name(),
@@ -85,18 +90,9 @@ def send_message_api(request):
             return JsonResponse({'success': False, 'error': 'Missing required fields'})
         
         recipient = User.objects.get(id=recipient_id)
-        
-        # Create message
-        message = Message.objects.create(
-            sender=request.user,
-            message_type='direct',
-            content=content,
-            created_at=timezone.now()
-        )
-        message.recipients.add(recipient)
-        
-        # Publish to Redis for real-time delivery
-        publish_message(message, request.user, recipient)
+        if not can_message(request.user, recipient):
+            return JsonResponse({'success': False, 'error': 'You cannot message this user'}, status=403)
+        message, _, _ = MessagingService().send_direct(request.user, recipient, content)
         
         return JsonResponse({
             'success': True,
@@ -117,16 +113,8 @@ def mark_as_read_api(request, user_id):
         other_user = User.objects.get(id=user_id)
         
         # Mark messages as read
-        messages = Message.objects.filter(
-            sender=other_user,
-            recipients=request.user,
-            is_read=False,
-            message_type='direct'
-        )
-        
-        for msg in messages:
-            msg.is_read = True
-            msg.save()
+        read_count = mark_read_upto(request.user, other_user)
+        publish_read_receipt(request.user, other_user, None, read_count)
         
         return JsonResponse({'success': True})
         
@@ -136,12 +124,8 @@ def mark_as_read_api(request, user_id):
 @login_required
 @require_GET
 def get_unread_count_api(request):
-    """Get total unread message count"""
-    unread_count = Message.objects.filter(
-        recipients=request.user,
-        is_read=False,
-        message_type='direct'
-    ).count()
+    """Get total unread direct message count"""
+    unread_count = get_unread_total(request.user)
     
     return JsonResponse({
         'success': True,
@@ -159,14 +143,11 @@ def start_conversation_api(request):
         recipient = User.objects.get(id=recipient_id)
         
         # Check if conversation already exists
-        existing_messages = Message.objects.filter(
-            Q(sender=request.user, recipients=recipient, message_type='direct') |
-            Q(sender=recipient, recipients=request.user, message_type='direct')
-        ).exists()
+        existing_messages = conversation_exists(request.user, recipient)
         
         # Get recipient info
         employee = EmployeeProfile.objects.filter(user=recipient).first()
-        is_online = redis_client.exists(f'user_online_{recipient.id}')
+        is_online = presence.is_online(recipient.id)
         
         return JsonResponse({
             'success': True,
@@ -211,44 +192,23 @@ def search_users_api(request):
         query_lower = query.lower()
         
         if query_lower in full_name or query_lower in email:
-            is_online = redis_client.exists(f'user_online_{user.id}')
-            
             results.append({
                 'id': user.id,
                 'name': user.get_full_name(),
                 'email': user.email,
                 'job_position': member.employee.job_position,
                 'project': member.project.name,
-                'is_online': is_online,
+                'is_online': False,
                 'avatar_color': get_user_color(user.id),
             })
     
+    # One ZMSCORE for everyone returned
+    results = results[:10]
+    statuses = presence.get_presence([result['id'] for result in results])
+    for result in results:
+        result['is_online'] = statuses[result['id']]['is_online']
+    
     return JsonResponse({
         'success': True,
-        'results': results[:10]  # Limit to 10 results
+        'results': results  # Limited to 10 results above
     })
-
-def publish_message(message, sender, recipient):
-    """Publish message to Redis for real-time delivery"""
-    message_data = {
-        'type': 'direct_message',
-        'message_id': message.id,
-        'sender_id': sender.id,
-        'sender_name': sender.get_full_name(),
-        'recipient_id': recipient.id,
-        'content': message.content,
-        'timestamp': message.created_at.isoformat(),
-        'avatar_color': get_user_color(sender.id),
-        'initials': f"{sender.first_name[0]}{sender.last_name[0]}" if sender.first_name and sender.last_name else sender.username[:2].upper(),
-    }
-    
-    # Publish to recipient's channel
-    redis_client.publish(f'user_{recipient.id}', json.dumps(message_data))
-    
-    # Also publish to sender's channel (for UI updates)
-    redis_client.publish(f'user_{sender.id}', json.dumps(message_data))
-
-def get_user_color(user_id):
-    """Get consistent color for user avatar"""
-    colors = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron', 'brown-red']
-    return f"bg-{colors[user_id % len(colors)]}"
\ No newline at end of file
@@ -1,18 +1,37 @@
 # views/pm_helpers.py
-from django.db.models import Count, Q
-from core.models import Task, ProjectMember
-from django.db.models import Sum
+from django.db.models import Count
+from core.models import Task
+def get_member_workloads(employee_ids, project=None, statuses=('todo', 'in_progress')):
+    """Return {employee_id: open task count} for a set of employees in one query.
+
+    Employees without matching tasks are included with a count of 0. Pass
+    `project` to restrict the counts to a single project.
+    """
+    employee_ids = set(employee_ids)
+    if not employee_ids:
+        return {}
+
+    tasks = Task.objects.filter(assigned_to__in=employee_ids, status__in=statuses)
+    if project is not None:
+        tasks = tasks.filter(project=project)
+
+    counts = tasks.values('assigned_to').annotate(count=Count('id')).order_by()
+    workloads = dict.fromkeys(employee_ids, 0)
+    for row in counts:
+        workloads[row['assigned_to']] = row['count']
+    return workloads
+
 def calculate_member_task_statuses(project, project_members):
     """Calculate task counts and status indicators for team members"""
     member_data = []
+    project_members = list(project_members)
+    workloads = get_member_workloads(
+        [member.employee_id for member in project_members], project=project
+    )
     
     for member in project_members:
         # Get task count for this member
-        task_count = Task.objects.filter(
-            project=project,
-            assigned_to=member.employee,
-            status__in=['todo', 'in_progress']
-        ).count()
+        task_count = workloads.get(member.employee_id, 0)
         
         # Get member initials
         user = member.employee.user
@@ -55,14 +74,7 @@ def calculate_sprint_progress(sprint):
     if not sprint:
         return 0
     
-    sprint_tasks = Task.objects.filter(sprint=sprint)
-    total_points = sprint_tasks.aggregate(total=Sum('estimated_hours'))['total'] or 0
-    completed_points = sprint_tasks.filter(status='done').aggregate(
-        total=Sum('estimated_hours'))['total'] or 0
-    
-    if total_points > 0:
-        return int((completed_points / total_points) * 100)
-    return 0
+    return sprint.progress_percentage()
 
 def get_task_priority_class(task):
     """Get CSS class for task priority"""
@@ -0,0 +1,63 @@
+# pm/project_listing.py
+from django.db.models import Count, F, IntegerField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
+from core.models import Project, ProjectMember
+
+AVATAR_MEMBER_LIMIT = 4
+AVATAR_COLOR_CLASSES = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron', 'brown-red']
+
+
+def build_project_list_queryset(project_manager):
+    """Projects managed by `project_manager` with list-page statistics.
+
+    Task counts are read from the denormalized counter columns, the active
+    member count comes from a correlated subquery, and the first few active
+    members are prefetched with a window-limited query for the avatar stack.
+    Rendering the list therefore costs a constant number of queries however
+    many projects there are.
+    """
+    active_members = ProjectMember.objects.filter(
+        project=OuterRef('pk'),
+        is_active=True
+    ).order_by().values('project').annotate(count=Count('id')).values('count')
+
+    avatar_members = ProjectMember.objects.filter(
+        is_active=True
+    ).select_related('employee__user')[:AVATAR_MEMBER_LIMIT]
+
+    return Project.objects.filter(
+        project_manager=project_manager
+    ).select_related('department').annotate(
+        task_count=F('tasks_total'),
+        completed_tasks=F('tasks_done'),
+        active_tasks=F('tasks_open'),
+        team_members_count=Coalesce(
+            Subquery(active_members, output_field=IntegerField()), 0
+        ),
+    ).prefetch_related(
+        Prefetch('members', queryset=avatar_members, to_attr='avatar_members')
+    ).order_by('-created_at')
+
+
+def get_project_status_counts(project_manager):
+    """Count a manager's projects by status in one query"""
+    return Project.objects.filter(project_manager=project_manager).aggregate(
+        total_projects=Count('id'),
+        active_projects=Count('id', filter=Q(status='active')),
+        completed_projects=Count('id', filter=Q(status='completed')),
+        on_hold_planning_projects=Count('id', filter=Q(status__in=['on_hold', 'planning'])),
+    )
+
+
+def get_recent_members(project):
+    """Avatar data for the prefetched members of an annotated project"""
+    recent_members = []
+    for i, member in enumerate(project.avatar_members):
+        user = member.employee.user
+        initials = f"{user.first_name[0]}{user.last_name[0]}" if user.first_name and user.last_name else user.username[:2].upper()
+        recent_members.append({
+            'initials': initials,
+            'color': AVATAR_COLOR_CLASSES[i % len(AVATAR_COLOR_CLASSES)],
+            'name': user.get_full_name(),
+        })
+    return recent_members
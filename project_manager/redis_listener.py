@@ -1,42 +1,183 @@
 # pm/redis_listener.py
+"""Bridge from Redis pub/sub to the Channels layer.
+
+Real-time events are published to `user_<id>` Redis channels by
+`core.fanout.publish_events()` (directly, or via the outbox dispatcher).
+`RedisBridge` pattern-subscribes to all of them, maps each event onto the
+`chat_user_<id>` group that `MessageConsumer` joins, and forwards them in
+batches of concurrent `group_send` calls from a single event loop.
+`user_status_updates` is broadcast to the `user_status` group as before.
+
+Run it with `python manage.py redis_bridge`. Throughput and lag counters
+are kept in `RedisBridge.stats` and logged periodically.
+"""
+import asyncio
 import json
-import redis
+import logging
 import os
+import re
+import time
+
+import redis
+import redis.asyncio as aioredis
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+
+logger = logging.getLogger(__name__)
 
 _redis_url = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
-redis_client = redis.from_url(_redis_url)
-channel_layer = get_channel_layer()
 
-def listen_for_messages():
-    """Listen for Redis messages and forward to WebSocket"""
-    pubsub = redis_client.pubsub()
-    
-    # Subscribe to user channels and status updates
-    pubsub.subscribe('user_status_updates')
-    
-    print("Redis listener started...")
-    
-    for message in pubsub.listen():
-        if message['type'] == 'message':
+USER_CHANNEL_PATTERN = 'user_*'
+STATUS_CHANNEL = 'user_status_updates'
+_user_channel = re.compile(r'^user_(\d+)$')
+
+
+def route(channel, data):
+    """Map a pub/sub message onto `(group, event)`, or None if it has nowhere to go"""
+    match = _user_channel.match(channel)
+    if match:
+        return f'chat_user_{match.group(1)}', {'type': 'chat_message', 'message': data}
+    if channel == STATUS_CHANNEL or data.get('type') == 'user_status':
+        return 'user_status', {'type': 'user_status_update', 'message': data}
+    return None
+
+
+class BridgeStats:
+    """Running counters for the bridge; `snapshot()` adds rates and averages"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.received = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def record_lag(self, lag):
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+
+    def snapshot(self):
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        delivered = self.forwarded + self.failed
+        return {
+            'received': self.received,
+            'forwarded': self.forwarded,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches,
+            'per_second': self.forwarded / uptime,
+            'avg_batch': delivered / self.batches if self.batches else 0.0,
+            'avg_lag_ms': self.lag_total / delivered * 1000 if delivered else 0.0,
+            'max_lag_ms': self.lag_max * 1000,
+        }
+
+
+class RedisBridge:
+    """Forward `user_*` pub/sub events to Channels groups in batches.
+
+    Messages are read into a bounded queue; the forwarder takes up to
+    `batch_size` of them at a time, waiting at most `flush_interval`
+    seconds for a batch to fill. Lag is measured from the `published_at`
+    stamp set by `publish_events()`, or from receipt when it is missing.
+    """
+
+    def __init__(self, redis_url=_redis_url, channel_layer=None, batch_size=100,
+                 flush_interval=0.005, queue_size=10000):
+        self.redis_url = redis_url
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = BridgeStats()
+
+    async def run(self, stats_interval=60, on_stats=None):
+        """Subscribe and forward until cancelled, reconnecting on Redis errors"""
+        tasks = [asyncio.ensure_future(self.forward())]
+        if stats_interval:
+            tasks.append(asyncio.ensure_future(self.report_stats(stats_interval, on_stats)))
+        backoff = 1
+        try:
+            while True:
+                client = aioredis.from_url(self.redis_url)
+                pubsub = client.pubsub()
+                try:
+                    await pubsub.psubscribe(USER_CHANNEL_PATTERN)
+                    logger.info('Redis bridge subscribed to %s', USER_CHANNEL_PATTERN)
+                    backoff = 1
+                    await self.read(pubsub)
+                except (redis.ConnectionError, redis.TimeoutError) as e:
+                    logger.warning('Redis bridge lost its connection (%s); retrying in %ss', e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                finally:
+                    await pubsub.aclose()
+                    await client.aclose()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def read(self, pubsub):
+        async for message in pubsub.listen():
+            await self.handle(message)
+
+    async def handle(self, message):
+        """Queue one raw pub/sub message for forwarding"""
+        if message['type'] not in ('message', 'pmessage'):
+            return
+        self.stats.received += 1
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        try:
             data = json.loads(message['data'])
-            
-            if 'recipient_id' in data:
-                # Forward to user's WebSocket
-                async_to_sync(channel_layer.group_send)(
-                    f'user_{data["recipient_id"]}',
-                    {
-                        'type': 'send_message',
-                        'message': data
-                    }
-                )
-            elif data.get('type') == 'user_status':
-                # Broadcast user status to all
-                async_to_sync(channel_layer.group_send)(
-                    'user_status',
-                    {
-                        'type': 'user_status_update',
-                        'message': data
-                    }
-                )
\ No newline at end of file
+        except (TypeError, ValueError):
+            self.stats.dropped += 1
+            logger.warning('Dropping malformed message on %s', channel)
+            return
+
+        routed = route(channel, data) if isinstance(data, dict) else None
+        if routed is None:
+            self.stats.dropped += 1
+            return
+        published_at = data.pop('published_at', None)
+        await self.queue.put((*routed, published_at or time.time()))
+
+    async def forward(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.batch_size - 1 and self.flush_interval:
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.send_batch(batch)
+
+    async def send_batch(self, batch):
+        """Send a batch of `(group, event, published_at)` with concurrent group_sends"""
+        results = await asyncio.gather(
+            *(self.channel_layer.group_send(group, event) for group, event, _ in batch),
+            return_exceptions=True,
+        )
+        now = time.time()
+        self.stats.batches += 1
+        for (group, _, published_at), result in zip(batch, results):
+            self.stats.record_lag(max(0.0, now - published_at))
+            if isinstance(result, Exception):
+                self.stats.failed += 1
+                logger.error('Failed to forward event to %s: %s', group, result)
+            else:
+                self.stats.forwarded += 1
+
+    async def report_stats(self, interval, on_stats=None):
+        while True:
+            await asyncio.sleep(interval)
+            snapshot = self.stats.snapshot()
+            logger.info('Redis bridge stats: %s', snapshot)
+            if on_stats is not None:
+                on_stats(snapshot)
+
+
+def listen_for_messages():
+    """Run the bridge in the current process until interrupted"""
+    asyncio.run(RedisBridge().run())
@@ -1,3 +1,895 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.conversations import record_direct_message
+from core.messaging import MessagingService
+from core.project_events import user_project_ids
+from core.read_receipts import mark_read_upto
+from core.test_utils import FakePubSub, ProjectFixturesMixin, use_fake_redis
+from core.models import (
+    User, Message, MessageReceipt, Notification, OutboxEvent, Project,
+    ProjectMember, Task, ConversationParticipant
+)
+from .consumers import MessageConsumer, TokenBucket
+from .dashboard_stats import get_project_dashboard_stats
+from .loadtest import MessagingLoadTest, parse_mix
+from .pm_helpers import get_member_workloads
+from .redis_listener import RedisBridge, route
+from .views import create_task_api, pm_reports
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProjectDashboardStatsTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_stats_computed_in_single_query(self):
+        self.add_task('todo', sprint=self.sprint, hours='3.00')
+        self.add_task('in_progress', sprint=self.sprint, due_in=-2, hours='5.00')
+        self.add_task('review')
+        self.add_task('done', sprint=self.sprint, hours='2.00')
+        self.add_task('blocked')
+
+        with self.assertNumQueries(1):
+            stats = get_project_dashboard_stats(self.project, self.sprint, self.today)
+
+        self.assertEqual(stats['total_tasks'], 5)
+        self.assertEqual(stats['open_tasks'], 3)
+        self.assertEqual(stats['active_tasks_count'], 2)
+        self.assertEqual(stats['completed_tasks'], 1)
+        self.assertEqual(stats['review_count'], 1)
+        self.assertEqual(stats['overdue_count'], 1)
+        self.assertEqual(stats['project_progress'], 20)
+        self.assertEqual(stats['total_sprint_points'], Decimal('10.00'))
+        self.assertEqual(stats['completed_sprint_points'], Decimal('2.00'))
+        self.assertEqual(stats['sprint_progress'], 20)
+
+    def test_stats_without_sprint(self):
+        self.add_task('todo')
+
+        stats = get_project_dashboard_stats(self.project)
+
+        self.assertEqual(stats['total_tasks'], 1)
+        self.assertEqual(stats['total_sprint_points'], 0)
+        self.assertEqual(stats['sprint_progress'], 0)
+
+    def test_stats_api(self):
+        self.add_task('done', sprint=self.sprint, hours='2.50')
+
+        response = self.client.get(
+            reverse('pm_dashboard_stats_api', args=[self.project.id])
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['active_sprint_id'], self.sprint.id)
+        self.assertEqual(data['stats']['completed_tasks'], 1)
+        self.assertEqual(data['stats']['total_sprint_points'], 2.5)
+
+
+# Measures an uncached render
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class PMDashboardQueryCountTests(ProjectFixturesMixin, TestCase):
+
+    def dashboard_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('pm_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_task_count(self):
+        members = self.add_members(3)
+        for employee in members:
+            self.add_task('todo', sprint=self.sprint, assigned_to=employee)
+        baseline = self.dashboard_query_count()
+
+        for employee in members:
+            for status in ('in_progress', 'review', 'done'):
+                self.add_task(status, sprint=self.sprint, assigned_to=employee, due_in=-1)
+
+        self.assertEqual(self.dashboard_query_count(), baseline)
+
+    def test_query_count_independent_of_team_size(self):
+        for employee in self.add_members(2):
+            self.add_task('todo', assigned_to=employee)
+        baseline = self.dashboard_query_count()
+
+        for employee in self.add_members(10):
+            self.add_task('in_progress', assigned_to=employee)
+
+        self.assertEqual(self.dashboard_query_count(), baseline)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PMDashboardCacheTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.member = self.add_members(1)[0]
+        self.add_task('todo', sprint=self.sprint, assigned_to=self.member)
+
+    def render(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('pm_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_cached_fragments_skip_queries_until_a_task_changes(self):
+        first, cold_queries = self.render()
+        second, warm_queries = self.render()
+        self.assertLess(warm_queries, cold_queries)
+        self.assertEqual(second.context['total_tasks'], 1)
+        self.assertEqual(second.context['member_data'][0]['task_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_task('review', sprint=self.sprint, assigned_to=self.member, due_in=-1)
+
+        third, _ = self.render()
+        self.assertEqual(third.context['total_tasks'], 2)
+        self.assertEqual(third.context['review_count'], 1)
+        self.assertEqual(len(third.context['overdue_tasks']), 1)
+        self.assertEqual(third.context['member_data'][0]['task_count'], 1)
+
+
+class MemberWorkloadTests(ProjectFixturesMixin, TestCase):
+
+    def test_workloads_grouped_in_single_query(self):
+        busy, idle = self.add_members(2)
+        self.add_task('todo', assigned_to=busy)
+        self.add_task('in_progress', assigned_to=busy)
+        self.add_task('review', assigned_to=busy)
+        self.add_task('done', assigned_to=idle)
+
+        with self.assertNumQueries(1):
+            workloads = get_member_workloads({busy.id, idle.id})
+
+        self.assertEqual(workloads, {busy.id: 2, idle.id: 0})
+
+    def test_workloads_with_statuses_and_project(self):
+        employee, = self.add_members(1)
+        self.add_task('review', assigned_to=employee)
+
+        self.assertEqual(
+            get_member_workloads([employee.id], statuses=['review']),
+            {employee.id: 1}
+        )
+        other_project = Project.objects.create(
+            name='Other', description='', department=self.department,
+            project_manager=self.pm, project_type='web',
+            start_date=self.today, due_date=self.today,
+        )
+        self.assertEqual(
+            get_member_workloads([employee.id], project=other_project, statuses=['review']),
+            {employee.id: 0}
+        )
+
+    def test_empty_employee_set(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_member_workloads([]), {})
+
+    def test_team_page_query_count_independent_of_team_size(self):
+        self.add_members(2)
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(reverse('pm_team'))
+
+        for employee in self.add_members(8):
+            self.add_task('todo', assigned_to=employee)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('pm_team'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), len(baseline.captured_queries))
+
+
+class PMProjectListTests(ProjectFixturesMixin, TestCase):
+
+    def add_project(self, name, status='active'):
+        return Project.objects.create(
+            name=name, description='', department=self.department,
+            project_manager=self.pm, project_type='web', status=status,
+            start_date=self.today, due_date=self.today + timedelta(days=10),
+        )
+
+    def projects_page(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('pm_projects'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_annotations_and_avatar_members(self):
+        members = self.add_members(6)
+        ProjectMember.objects.filter(employee=members[0]).update(is_active=False)
+        self.add_task('todo')
+        self.add_task('in_progress')
+        self.add_task('review')
+        self.add_task('done')
+
+        response, _ = self.projects_page()
+
+        project = next(p for p in response.context['projects'] if p.id == self.project.id)
+        self.assertEqual(project.task_count, 4)
+        self.assertEqual(project.completed_tasks, 1)
+        self.assertEqual(project.active_tasks, 3)
+        self.assertEqual(project.team_members_count, 5)
+        self.assertEqual(project.progress_percentage, 25)
+        self.assertEqual(len(project.recent_members), 4)
+        self.assertEqual(response.context['total_projects'], 1)
+        self.assertEqual(response.context['active_projects'], 1)
+
+    def test_query_count_independent_of_project_count(self):
+        self.add_members(3)
+        _, baseline = self.projects_page()
+
+        for i in range(10):
+            project = self.add_project(f'Project {i}', status='completed')
+            Task.objects.create(
+                title='Task', description='', project=project,
+                estimated_hours=Decimal('1.00'), due_date=self.today,
+            )
+
+        response, query_count = self.projects_page()
+        self.assertEqual(query_count, baseline)
+        self.assertEqual(response.context['completed_projects'], 10)
+
+
+class PMMessagesTests(ProjectFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        use_fake_redis(self, 'core.presence')
+
+    def exchange(self, employee):
+        for sender, recipient in ((self.pm, employee.user), (employee.user, self.pm)):
+            message = Message.objects.create(sender=sender, message_type='direct', content='Hello')
+            message.recipients.add(recipient)
+            record_direct_message(message, sender, recipient)
+
+    def messages_page(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('pm_messages'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_conversations_read_from_index(self):
+        first, second = self.add_members(2)
+        self.exchange(first)
+        self.exchange(second)
+
+        response, _ = self.messages_page()
+
+        conversations = response.context['conversations']
+        self.assertEqual([c['other_user'] for c in conversations], [second.user, first.user])
+        self.assertEqual(conversations[0]['unread_count'], 1)
+        self.assertEqual(conversations[0]['job_position'], 'Developer')
+        self.assertTrue(conversations[0]['active'])
+
+    def test_query_count_independent_of_conversation_count(self):
+        for employee in self.add_members(2):
+            self.exchange(employee)
+        _, baseline = self.messages_page()
+
+        for employee in self.add_members(8):
+            self.exchange(employee)
+
+        _, query_count = self.messages_page()
+        self.assertEqual(query_count, baseline)
+
+    def test_unread_count_api_counts_direct_messages_only(self):
+        employee, = self.add_members(1)
+        self.exchange(employee)
+        announcement = Message.objects.create(
+            sender=employee.user, message_type='announcement', content='Release on Friday'
+        )
+        announcement.recipients.add(self.pm)
+
+        response = self.client.get(reverse('get_unread_count_api'))
+
+        self.assertEqual(response.json(), {'success': True, 'unread_count': 1})
+
+
+class ConsumerTestMixin:
+    """Stub out the Redis-backed unread counters and presence, which these tests do not run"""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(mock.patch.stopall)
+        for target in (
+            'core.signals.record_unread', 'core.read_receipts.record_unread',
+        ):
+            mock.patch(target).start()
+        mock.patch('core.messaging.update_unread_counts', return_value={}).start()
+        mock.patch(
+            'project_manager.consumers.get_unread_counts',
+            return_value={'notifications': 2, 'messages': 3},
+        ).start()
+        self.touch = mock.patch('core.presence.touch', return_value=False).start()
+        mock.patch('core.presence.disconnect', return_value=False).start()
+        mock.patch('core.presence.sweep_stale', return_value=[]).start()
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(MessageConsumer.as_asgi(), '/ws/messages/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # connection_established
+        await communicator.receive_json_from()  # unread_counts
+        return communicator
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ReadReceiptConsumerTests(ConsumerTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.sender = User.objects.create_user(username='sender', password='password123', role='pm')
+        self.messages = []
+        for i in range(3):
+            message = Message.objects.create(sender=self.sender, message_type='direct', content=f'm{i}')
+            message.recipients.add(self.reader)
+            record_direct_message(message, self.sender, self.reader)
+            self.messages.append(message)
+
+    @async_to_sync
+    async def exchange_receipts(self, events):
+        channel_layer = get_channel_layer()
+        sender_channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'chat_user_{self.sender.id}', sender_channel)
+
+        communicator = WebsocketCommunicator(MessageConsumer.as_asgi(), '/ws/messages/')
+        communicator.scope['user'] = self.reader
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # connection_established
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'unread_counts', 'notifications': 2, 'messages': 3},
+        )
+
+        for event in events:
+            await communicator.send_json_to(event)
+        receipt = await channel_layer.receive(sender_channel)
+        await communicator.disconnect()
+        return receipt
+
+    def test_receipts_within_window_coalesce_into_one_write(self):
+        events = [
+            {'type': 'message_read', 'message_id': self.messages[0].id, 'recipient_id': self.sender.id},
+            {'type': 'message_read', 'message_ids': [self.messages[2].id, self.messages[1].id]},
+        ]
+        with mock.patch('project_manager.consumers.mark_read_upto', wraps=mark_read_upto) as mark:
+            receipt = self.exchange_receipts(events)
+
+        mark.assert_called_once_with(self.reader, self.sender.id, self.messages[2].id)
+        self.assertEqual(receipt['message'], {
+            'type': 'message_read',
+            'reader_id': self.reader.id,
+            'upto_message_id': self.messages[2].id,
+            'count': 3,
+        })
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+
+    @async_to_sync
+    async def send_over_socket(self, event):
+        channel_layer = get_channel_layer()
+        sender_channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'chat_user_{self.sender.id}', sender_channel)
+
+        communicator = await self.connect(self.reader)
+        await communicator.send_json_to(event)
+        echo = await communicator.receive_json_from()
+        delivered = await channel_layer.receive(sender_channel)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+        return echo, delivered
+
+    def test_direct_message_delivered_once_and_echoed(self):
+        echo, delivered = self.send_over_socket(
+            {'type': 'direct_message', 'recipient_id': self.sender.id, 'content': 'reply'}
+        )
+
+        message = Message.objects.get(content='reply')
+        self.assertEqual(delivered, {'type': 'chat_message', 'message': echo, 'unread_counts': None})
+        self.assertEqual(echo['message_id'], message.id)
+        self.assertEqual(echo['recipient_id'], self.sender.id)
+        self.assertEqual(list(message.recipients.all()), [self.sender])
+
+    @async_to_sync
+    async def message_stranger(self, stranger):
+        communicator = await self.connect(self.reader)
+        await communicator.send_json_to(
+            {'type': 'direct_message', 'recipient_id': stranger.id, 'content': 'hello'}
+        )
+        await communicator.receive_nothing()
+        await communicator.disconnect()
+
+    def test_direct_message_to_user_outside_projects_is_dropped(self):
+        stranger = User.objects.create_user(username='stranger', password='password123')
+
+        self.message_stranger(stranger)
+
+        self.assertFalse(Message.objects.filter(content='hello').exists())
+
+    @async_to_sync
+    async def watch_presence(self, events):
+        channel_layer = get_channel_layer()
+        watcher = await channel_layer.new_channel()
+        await channel_layer.group_add('user_status', watcher)
+
+        communicator = WebsocketCommunicator(MessageConsumer.as_asgi(), '/ws/messages/')
+        communicator.scope['user'] = self.reader
+        await communicator.connect()
+        for event in events:
+            await communicator.send_json_to(event)
+        await communicator.receive_nothing()
+        await communicator.disconnect()
+
+        changes = []
+        while True:
+            try:
+                changes.append(await asyncio.wait_for(channel_layer.receive(watcher), 0.05))
+            except asyncio.TimeoutError:
+                return [(change['message']['user_id'], change['message']['is_online']) for change in changes]
+
+    def test_presence_changes_are_broadcast(self):
+        self.touch.return_value = True
+        with mock.patch('core.presence.disconnect', return_value=True), \
+                mock.patch('core.presence.sweep_stale', return_value=[self.sender.id]):
+            changes = self.watch_presence([{'type': 'heartbeat'}])
+
+        self.touch.assert_any_call(self.reader.id, connected=True)
+        self.touch.assert_called_with(self.reader.id)
+        self.assertEqual(changes, [
+            (self.reader.id, True),  # connect
+            (self.reader.id, True),  # heartbeat after being swept elsewhere
+            (self.sender.id, False),  # swept
+            (self.reader.id, False),  # last socket closed
+        ])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class TypingAndRateLimitTests(ConsumerTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.typist = User.objects.create_user(username='typist', password='password123', role='pm')
+        self.peer = User.objects.create_user(username='peer', password='password123')
+
+    @async_to_sync
+    async def type_frames(self, frames, wait=0):
+        channel_layer = get_channel_layer()
+        peer_channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'chat_user_{self.peer.id}', peer_channel)
+
+        communicator = await self.connect(self.typist)
+        for frame in frames:
+            await communicator.send_json_to(dict(frame, recipient_id=self.peer.id))
+        await asyncio.sleep(wait)
+        await communicator.receive_nothing()
+        await communicator.disconnect()
+
+        states = []
+        while True:
+            try:
+                event = await asyncio.wait_for(channel_layer.receive(peer_channel), 0.05)
+            except asyncio.TimeoutError:
+                return states
+            states.append(event['message']['is_typing'])
+
+    @mock.patch.object(MessageConsumer, 'typing_timeout_seconds', 0.05)
+    def test_keystrokes_coalesce_and_time_out(self):
+        frames = [{'type': 'typing', 'is_typing': True}] * 10
+        self.assertEqual(self.type_frames(frames, wait=0.2), [True, False])
+
+    def test_only_transitions_are_forwarded(self):
+        frames = [
+            {'type': 'typing', 'is_typing': True},
+            {'type': 'typing', 'is_typing': True},
+            {'type': 'typing', 'is_typing': False},
+            {'type': 'typing', 'is_typing': False},
+            {'type': 'typing', 'is_typing': True},
+        ]
+        # The last indicator is cleared when the socket closes
+        self.assertEqual(self.type_frames(frames), [True, False, True, False])
+
+    def send_burst(self, count):
+        @async_to_sync
+        async def send():
+            communicator = await self.connect(self.typist)
+            for i in range(count):
+                await communicator.send_json_to(
+                    {'type': 'direct_message', 'recipient_id': self.peer.id, 'content': f'm{i}'}
+                )
+            echoes = [await communicator.receive_json_from() for _ in range(count)]
+            await communicator.disconnect()
+            return echoes
+
+        with mock.patch(
+            'core.messaging.MessagingService.send_direct_batch', autospec=True,
+            side_effect=MessagingService.send_direct_batch,
+        ) as send_batch:
+            echoes = send()
+        return echoes, [len(call.args[2]) for call in send_batch.call_args_list]
+
+    def test_burst_is_written_in_batches(self):
+        echoes, batch_sizes = self.send_burst(10)
+
+        self.assertEqual([echo['content'] for echo in echoes], [f'm{i}' for i in range(10)])
+        self.assertEqual(sum(batch_sizes), 10)
+        self.assertLess(len(batch_sizes), 10)
+        participant = ConversationParticipant.objects.get(user=self.peer)
+        self.assertEqual(participant.unread_count, 10)
+        self.assertEqual(participant.conversation.last_message.content, 'm9')
+
+    @mock.patch.object(MessageConsumer, 'batch_messages', False)
+    def test_batching_can_be_disabled(self):
+        _, batch_sizes = self.send_burst(3)
+        self.assertEqual(batch_sizes, [1, 1, 1])
+
+    def test_delivered_message_brings_unread_totals(self):
+        @async_to_sync
+        async def receive_message():
+            communicator = await self.connect(self.peer)
+            await get_channel_layer().group_send(f'chat_user_{self.peer.id}', {
+                'type': 'chat_message',
+                'message': {'type': 'direct_message', 'content': 'hi'},
+                'unread_counts': {'notifications': 0, 'messages': 4},
+            })
+            frames = [await communicator.receive_json_from() for _ in range(2)]
+            await communicator.disconnect()
+            return frames
+
+        self.assertEqual(receive_message(), [
+            {'type': 'direct_message', 'content': 'hi'},
+            {'type': 'unread_counts', 'notifications': 0, 'messages': 4},
+        ])
+
+    @mock.patch.object(MessageConsumer, 'batch_messages', False)
+    def test_failed_write_is_logged_and_disconnect_completes(self):
+        @async_to_sync
+        async def send_and_disconnect():
+            communicator = await self.connect(self.typist)
+            for content in ('lost', 'kept'):
+                await communicator.send_json_to(
+                    {'type': 'direct_message', 'recipient_id': self.peer.id, 'content': content}
+                )
+            await communicator.disconnect()
+
+        send_direct_batch = MessagingService.send_direct_batch
+        failures = iter([True])
+
+        def flaky_send_batch(service, sender, items):
+            if next(failures, False):
+                raise DatabaseError('connection lost')
+            return send_direct_batch(service, sender, items)
+
+        with mock.patch(
+            'core.messaging.MessagingService.send_direct_batch', autospec=True,
+            side_effect=flaky_send_batch,
+        ), mock.patch('core.presence.disconnect', return_value=False) as disconnect, \
+                self.assertLogs('project_manager.consumers', 'ERROR') as logs:
+            send_and_disconnect()
+
+        self.assertIn('Failed to write 1 direct messages', logs.output[0])
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['kept'])
+        disconnect.assert_called_once_with(self.typist.id)
+
+    @mock.patch.object(MessageConsumer, 'frame_rate', 0)
+    @mock.patch.object(MessageConsumer, 'frame_burst', 2)
+    def test_frames_over_budget_are_dropped_and_counted(self):
+        @async_to_sync
+        async def send_messages():
+            communicator = await self.connect(self.typist)
+            for i in range(3):
+                await communicator.send_json_to(
+                    {'type': 'direct_message', 'recipient_id': self.peer.id, 'content': f'm{i}'}
+                )
+            replies = [await communicator.receive_json_from() for _ in range(3)]
+            await communicator.disconnect()
+            return replies
+
+        with self.assertLogs('project_manager.consumers', 'INFO') as logs:
+            replies = send_messages()
+
+        self.assertEqual(
+            sorted(reply['type'] for reply in replies), ['direct_message', 'direct_message', 'rate_limited']
+        )
+        self.assertEqual(Message.objects.filter(sender=self.typist).count(), 2)
+        self.assertIn("{'direct_message': 1}", '\n'.join(logs.output))
+
+    def test_token_bucket_refills_at_rate(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0])
+
+        self.assertEqual([bucket.consume() for _ in range(4)], [True, True, True, False])
+        now[0] = 1.0
+        self.assertEqual([bucket.consume() for _ in range(3)], [True, True, False])
+        now[0] = 10.0
+        self.assertEqual(sum(bucket.consume() for _ in range(5)), 3)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ProjectGroupTests(ConsumerTestMixin, ProjectFixturesMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member = self.add_members(1)[0]
+        self.outsider = User.objects.create_user(username='outsider', password='password123')
+
+    def test_user_project_ids(self):
+        other = Project.objects.create(
+            name='Other', department=self.department, project_type='web', status='active',
+            start_date=self.today, due_date=self.today + timedelta(days=30),
+        )
+        ProjectMember.objects.create(project=other, employee=self.member, role='dev', is_active=False)
+
+        self.assertEqual(user_project_ids(self.pm.id), [self.project.id])
+        self.assertEqual(user_project_ids(self.member.user_id), [self.project.id])
+        self.assertEqual(user_project_ids(self.outsider.id), [])
+
+    def test_task_status_change_is_broadcast_to_the_project_group(self):
+        task = self.add_task(assigned_to=self.member)
+        self.client.force_login(self.member.user)
+
+        @async_to_sync
+        async def run():
+            pm_socket = await self.connect(self.pm)
+            outsider_socket = await self.connect(self.outsider)
+            await sync_to_async(self.client.post)(
+                reverse('employee:update_task_status', args=[task.id]), {'status': 'in_progress'},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+            event = await pm_socket.receive_json_from()
+            outsider_idle = await outsider_socket.receive_nothing()
+            await pm_socket.disconnect()
+            await outsider_socket.disconnect()
+            return event, outsider_idle
+
+        event, outsider_idle = run()
+        self.assertEqual(event, {
+            'type': 'task_status', 'project_id': self.project.id,
+            'task_id': task.id, 'status': 'in_progress', 'progress': 50,
+        })
+        self.assertTrue(outsider_idle)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MessagingLoadTestTests(ConsumerTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(username=f'load{i}', password='password123', role='pm')
+            for i in range(3)
+        ]
+
+    def test_clients_authenticate_and_deliver_through_asgi_application(self):
+        from project_management.asgi import application
+
+        load_test = MessagingLoadTest(
+            application, self.users, frames=3, rate=0, mix={'send': 1}, drain_timeout=5, seed=1
+        )
+        load_test.prepare()
+        report = async_to_sync(load_test.run)()
+        load_test.end_sessions()
+
+        self.assertEqual(report['connections']['opened'], 3)
+        self.assertEqual(report['connections']['failed'], 0)
+        self.assertEqual(report['delivery']['sent'], 9)
+        self.assertEqual(report['delivery']['delivered'], 9)
+        self.assertEqual(report['delivery']['lost'], 0)
+        self.assertEqual(report['delivery']['latency_ms']['count'], 9)
+        self.assertIsNotNone(report['delivery']['latency_ms']['p99'])
+        self.assertGreater(report['memory']['per_connection_bytes'], 0)
+        # Every message went to the next client in the ring
+        self.assertEqual(Message.objects.count(), 9)
+        self.assertEqual(
+            set(MessageReceipt.objects.values_list('message__sender_id', 'user_id')),
+            {(self.users[0].id, self.users[1].id), (self.users[1].id, self.users[2].id),
+             (self.users[2].id, self.users[0].id)},
+        )
+        json.dumps(report)
+
+    def test_consumer_benchmark_reports_throughput(self):
+        out = StringIO()
+        call_command('benchmark_consumer', '--messages', '4', '--connections', '2', stdout=out)
+
+        self.assertRegex(out.getvalue(), r'batched: 4 messages over 2 sockets in \d+ ms')
+        self.assertFalse(User.objects.filter(username__startswith='consumer-bench-').exists())
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('send=3, typing=1'), {'send': 3.0, 'typing': 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix('shout=1')
+        with self.assertRaises(ValueError):
+            parse_mix('send=0')
+
+
+@mock.patch('core.fanout.publish_events')
+class FanOutCallSiteTests(ProjectFixturesMixin, TestCase):
+
+    def post_json(self, name, payload):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse(name), json.dumps(payload), content_type='application/json'
+            )
+        self.assertTrue(response.json().get('success'), response.content)
+        return len(ctx.captured_queries)
+
+    def schedule_meeting(self):
+        return self.post_json('schedule_meeting_api', {
+            'title': 'Planning', 'date': '2026-01-05', 'time': '10:00',
+            'project_id': self.project.id,
+        })
+
+    def test_meeting_invitations_cost_constant_queries(self, publish_events):
+        self.add_members(2)
+        baseline = self.schedule_meeting()
+
+        members = self.add_members(10)
+        self.assertEqual(self.schedule_meeting(), baseline)
+
+        meeting = Message.objects.filter(subject='Team Meeting: Planning').first()
+        self.assertEqual(meeting.recipients.count(), 12)
+        self.assertTrue(Notification.objects.filter(
+            user=members[0].user, related_id=meeting.id, related_type='message'
+        ).exists())
+
+    def test_assign_to_all_notifies_each_member_about_own_task(self, publish_events):
+        members = self.add_members(3)
+
+        # The admins app shadows this URL, so call the view directly
+        request = RequestFactory().post('/', json.dumps({
+            'title': 'Write docs', 'project_id': self.project.id, 'due_date': '2026-01-05',
+            'estimated_hours': '2', 'assigned_to': 'all', 'sprint_id': self.sprint.id,
+        }), content_type='application/json')
+        request.user = self.pm
+        with redirect_stdout(StringIO()):
+            response = create_task_api(request)
+        self.assertTrue(json.loads(response.content)['success'])
+
+        for employee in members:
+            task = Task.objects.get(assigned_to=employee, title='Write docs')
+            self.assertEqual(task.sprint, self.sprint)
+            notification = Notification.objects.get(user=employee.user, notification_type='task_assigned')
+            self.assertEqual(notification.related_id, task.id)
+        self.sprint.refresh_from_db()
+        self.assertEqual(self.sprint.tasks_total, 3)
+
+
+class PMReportsTests(ProjectFixturesMixin, TestCase):
+
+    def test_overdue_count_is_live(self):
+        self.add_task('todo', due_in=-2)
+        self.add_task('blocked', due_in=-1)
+        self.add_task('done', due_in=-2)
+        self.add_task('todo', due_in=3)
+
+        # The admins app shadows this URL, so call the view directly
+        request = RequestFactory().get('/')
+        request.user = self.pm
+        with mock.patch('project_manager.views.render') as render:
+            pm_reports(request)
+        stats = render.call_args.args[2]['project_stats'][0]
+        # Blocked tasks aren't open, matching the dashboard's overdue count
+        self.assertEqual(stats['overdue_tasks'], 1)
+        self.assertEqual(stats['total_tasks'], 4)
+
+
+class OutboxCallSiteTests(ProjectFixturesMixin, TestCase):
+
+    def post_json(self, name, payload):
+        response = self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+        self.assertTrue(response.json().get('success'), response.content)
+
+    def assert_queued(self, user, title):
+        self.assertFalse(Notification.objects.exists())
+        payload = OutboxEvent.objects.get(payload__notification__title=title).payload
+        self.assertEqual(payload['recipient_ids'], [user.id])
+
+    def test_team_changes_queue_notifications(self):
+        employee = self.add_employee('dev', member=False, first_name='D', last_name='V')
+        user = employee.user
+        member = {'project_id': self.project.id, 'employee_id': employee.id}
+
+        self.post_json('add_team_member_api', {**member, 'role': 'dev'})
+        self.assert_queued(user, 'Added to Project: Apollo')
+        self.post_json('remove_team_member_api', member)
+        self.assert_queued(user, 'Removed from Project: Apollo')
+
+    def test_task_update_queues_notification(self):
+        employee = self.add_members(1)[0]
+        task = self.add_task(assigned_to=employee)
+
+        response = self.client.post(
+            reverse('update_task_api', args=[task.id]), json.dumps({'assigned_to': employee.id}),
+            content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+        self.assert_queued(employee.user, f'Task Updated: {task.title}')
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class RedisBridgeTests(TestCase):
+
+    def pmessage(self, channel, data):
+        return {'type': 'pmessage', 'pattern': b'user_*', 'channel': channel.encode(), 'data': data}
+
+    def test_route(self):
+        self.assertEqual(route('user_7', {'type': 'notification'}), (
+            'chat_user_7', {'type': 'chat_message', 'message': {'type': 'notification'}}
+        ))
+        self.assertEqual(route('user_status_updates', {'type': 'user_status'})[0], 'user_status')
+        self.assertIsNone(route('user_abc', {}))
+
+    @async_to_sync
+    async def bridge_events(self, messages, batch_size=100):
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add('chat_user_7', channel)
+
+        bridge = RedisBridge(channel_layer=channel_layer, batch_size=batch_size, flush_interval=0)
+        await bridge.read(FakePubSub(messages))
+        while not bridge.queue.empty():
+            batch = [bridge.queue.get_nowait() for _ in range(min(batch_size, bridge.queue.qsize()))]
+            await bridge.send_batch(batch)
+
+        received = []
+        while True:
+            try:
+                received.append(await asyncio.wait_for(channel_layer.receive(channel), 0.1))
+            except asyncio.TimeoutError:
+                return bridge.stats.snapshot(), received
+
+    def test_user_channels_forwarded_to_consumer_groups_in_batches(self):
+        messages = [{'type': 'psubscribe', 'channel': b'user_*', 'data': 1}] + [
+            self.pmessage('user_7', json.dumps({
+                'type': 'notification', 'recipient_id': 7, 'n': i, 'published_at': time.time(),
+            }))
+            for i in range(5)
+        ] + [self.pmessage('user_8', 'not json'), self.pmessage('user_x', '{}')]
+
+        with self.assertLogs('project_manager.redis_listener', 'WARNING'):
+            stats, received = self.bridge_events(messages, batch_size=2)
+
+        self.assertEqual([event['message']['n'] for event in received], [0, 1, 2, 3, 4])
+        self.assertEqual(received[0]['type'], 'chat_message')
+        self.assertNotIn('published_at', received[0]['message'])
+        self.assertEqual(stats['received'], 7)
+        self.assertEqual(stats['forwarded'], 5)
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['batches'], 3)
+
+    def test_failed_sends_are_counted(self):
+        channel_layer = mock.Mock()
+        channel_layer.group_send = mock.AsyncMock(side_effect=[None, RuntimeError('layer down')])
+        bridge = RedisBridge(channel_layer=channel_layer)
+
+        with self.assertLogs('project_manager.redis_listener', 'ERROR'):
+            async_to_sync(bridge.send_batch)([
+                ('chat_user_1', {'type': 'chat_message'}, time.time()),
+                ('chat_user_2', {'type': 'chat_message'}, time.time()),
+            ])
+
+        stats = bridge.stats.snapshot()
+        self.assertEqual((stats['forwarded'], stats['failed'], stats['batches']), (1, 1, 1))
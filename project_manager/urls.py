@@ -1,7 +1,7 @@
 from django.urls import path
 from . import messages_api
 from .views import (
-    pm_dashboard, pm_projects, pm_project_detail,
+    pm_dashboard, pm_dashboard_stats_api, pm_projects, pm_project_detail,
     pm_tasks, pm_sprints, pm_team, pm_reports
 )
 from .views import (
@@ -14,6 +14,7 @@ from .views import (
 urlpatterns = [
     # Dashboard
     path('dashboard/', pm_dashboard, name='pm_dashboard'),
+    path('api/projects/<int:project_id>/dashboard-stats/', pm_dashboard_stats_api, name='pm_dashboard_stats_api'),
     
     # Project Management
     path('my_projects/', pm_projects, name='pm_projects'),
@@ -11,15 +11,27 @@ def user_passes_test(test_func, login_url=None, **kwargs):
     return _django_user_passes_test(test_func, login_url=login_url, **kwargs)
 from django.conf import settings
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Count, Sum, Avg, Q
 from django.utils import timezone
 from datetime import timedelta
 from core.models import (
     User, EmployeeProfile, Department, Project, 
     Task, Sprint, ProjectMember, Message, Comment, 
-    TimeLog, Notification, StandupUpdate
+    TimeLog, StandupUpdate
+)
+from core.counters import rebuild_counters
+from core.conversations import get_inbox
+from core.dashboard_cache import cached_fragment
+from core.fanout import fan_out
+from core.outbox import enqueue_notification
+from core.presence import get_presence
+from core.project_events import broadcast_project_event
+from .pm_helpers import calculate_member_task_statuses, get_member_workloads
+from .dashboard_stats import OPEN_STATUSES, get_project_dashboard_stats, serialize_dashboard_stats
+from .project_listing import (
+    build_project_list_queryset, get_project_status_counts, get_recent_members
 )
-from .pm_helpers import calculate_member_task_statuses
 def get_user_websocket_url(request):
     """Get WebSocket URL for the current user"""
     if request.is_secure():
@@ -70,29 +82,23 @@ def pm_dashboard(request):
         ).values_list('employee_id', flat=True)
     ).select_related('user', 'department')[:10]
         
-        # Project statistics
-        total_tasks = Task.objects.filter(project=active_project).count()
-        active_tasks = Task.objects.filter(
-            project=active_project,
-            status__in=['todo', 'in_progress', 'review']
-        ).count()
-        completed_tasks = Task.objects.filter(
-            project=active_project,
-            status='done'
-        ).count()
-        
-        # Calculate project progress
-        if total_tasks > 0:
-            project_progress = int((completed_tasks / total_tasks) * 100)
-        else:
-            project_progress = 0
-        
         # Get active sprint
         active_sprint = Sprint.objects.filter(
             project=active_project,
             status='active'
         ).first()
         
+        # Stats, members and task lists are cached until the project's tasks,
+        # sprints or members change (see core/dashboard_cache.py)
+        project_scope = [('project', active_project.id)]
+        
+        # Task counts, overdue/review counts and sprint points in one query
+        stats = cached_fragment(
+            'pm_stats', project_scope,
+            lambda: get_project_dashboard_stats(active_project, active_sprint, today),
+            parts=[active_sprint.id if active_sprint else 0, today],
+        )
+        
         # Get team members for active project
         project_members = ProjectMember.objects.filter(
             project=active_project,
@@ -100,65 +106,43 @@ def pm_dashboard(request):
         ).select_related('employee__user')
 
         # Prepare member data for templates (initials, status, colors)
-        member_data = calculate_member_task_statuses(active_project, project_members)
+        member_data = cached_fragment(
+            'pm_members', project_scope,
+            lambda: calculate_member_task_statuses(active_project, project_members),
+        )
         
-        # Get overdue tasks
-        overdue_tasks = Task.objects.filter(
-            project=active_project,
-            due_date__lt=today,
-            status__in=['todo', 'in_progress', 'review']
-        ).select_related('assigned_to__user')[:5]
+        # Overdue tasks and tasks under review
+        task_lists = cached_fragment(
+            'pm_task_lists', project_scope,
+            lambda: get_project_task_lists(active_project, today), parts=[today],
+        )
+        overdue_tasks = task_lists['overdue_tasks']
+        review_tasks = task_lists['review_tasks']
         
         # Get recent messages
         recent_messages = Message.objects.filter(
             Q(project=active_project) | 
-            Q(sender__in=[member.employee.user for member in project_members]),
+            Q(sender__in=[info['member'].employee.user_id for info in member_data]),
             created_at__gte=today - timedelta(days=7)
-        ).select_related('sender').order_by('-created_at')[:10]
+        ).select_related('sender', 'task').order_by('-created_at')[:10]
         
-        # Get tasks under review
-        review_tasks = Task.objects.filter(
-            project=active_project,
-            status='review'
-        ).select_related('assigned_to__user')[:5]
-        
-        # Get quick stats for dashboard cards
-        active_tasks_count = Task.objects.filter(
-            project=active_project,
-            status__in=['todo', 'in_progress']
-        ).count()
+        team_members_count = len(member_data)
         
-        team_members_count = project_members.count()
-        
-        # Sprint progress
-        sprint_progress = 0
+        # Sprint days left
         sprint_days_left = 0
-        if active_sprint:
-            sprint_tasks = Task.objects.filter(sprint=active_sprint)
-            total_sprint_points = sprint_tasks.aggregate(
-                total=Sum('estimated_hours')
-            )['total'] or 0
-            completed_sprint_points = sprint_tasks.filter(
-                status='done'
-            ).aggregate(
-                total=Sum('estimated_hours')
-            )['total'] or 0
-            
-            if total_sprint_points > 0:
-                sprint_progress = int((completed_sprint_points / total_sprint_points) * 100)
-            
-            if active_sprint.end_date > today:
-                sprint_days_left = (active_sprint.end_date - today).days
-            
+        if active_sprint and active_sprint.end_date > today:
+            sprint_days_left = (active_sprint.end_date - today).days
         
         # Add all context data
         context.update({
-            'total_tasks': total_tasks,
-            'active_tasks_count': active_tasks_count,
-            'completed_tasks': completed_tasks,
-            'project_progress': project_progress,
+            'total_tasks': stats['total_tasks'],
+            'active_tasks_count': stats['active_tasks_count'],
+            'completed_tasks': stats['completed_tasks'],
+            'overdue_count': stats['overdue_count'],
+            'review_count': stats['review_count'],
+            'project_progress': stats['project_progress'],
             'active_sprint': active_sprint,
-            'sprint_progress': sprint_progress,
+            'sprint_progress': stats['sprint_progress'],
             'sprint_days_left': sprint_days_left,
             'project_members': project_members,
             'member_data': member_data,
@@ -174,40 +158,45 @@ def pm_dashboard(request):
     
     return render(request, 'pm/dashboard.html', context)
 
+def get_project_task_lists(project, today):
+    """First five overdue tasks and tasks under review for the PM dashboard"""
+    overdue_tasks = Task.objects.filter(
+        project=project,
+        due_date__lt=today,
+        status__in=['todo', 'in_progress', 'review']
+    ).select_related('assigned_to__user')[:5]
+    review_tasks = Task.objects.filter(
+        project=project,
+        status='review'
+    ).select_related('assigned_to__user')[:5]
+    return {'overdue_tasks': list(overdue_tasks), 'review_tasks': list(review_tasks)}
+
 @login_required
 @user_passes_test(is_project_manager, login_url='/login/')
-def pm_projects(request):
-    """PM Projects List""" 
-    current_user = request.user
-    
-    projects = Project.objects.filter(
-        project_manager=current_user
-    ).select_related('department').order_by('-created_at')
-    
-    # Get statistics for each project
-    for project in projects:
-        project.task_count = Task.objects.filter(project=project).count()
-        project.completed_tasks = Task.objects.filter(
-            project=project, status='done'
-        ).count()
-        project.active_tasks = Task.objects.filter(
-            project=project, status__in=['todo', 'in_progress']
-        ).count()
-        
-        if project.task_count > 0:
-            project.progress_percentage = int((project.completed_tasks / project.task_count) * 100)
-        else:
-            project.progress_percentage = 0
-        
-        project.days_remaining_val = project.days_remaining()
-    
-    context = {
-        'user': current_user,
-        'projects': projects,
-        'today': timezone.now().date(),
-    }
+def pm_dashboard_stats_api(request, project_id):
+    """API endpoint returning the dashboard statistics block for a project"""
+    project = get_object_or_404(
+        Project,
+        id=project_id,
+        project_manager=request.user
+    )
+    active_sprint = Sprint.objects.filter(
+        project=project,
+        status='active'
+    ).first()
+    today = timezone.now().date()
+    stats = cached_fragment(
+        'pm_stats', [('project', project.id)],
+        lambda: get_project_dashboard_stats(project, active_sprint, today),
+        parts=[active_sprint.id if active_sprint else 0, today],
+    )
     
-    return render(request, 'pm/projects.html', context)
+    return JsonResponse({
+        'success': True,
+        'project_id': project.id,
+        'active_sprint_id': active_sprint.id if active_sprint else None,
+        'stats': serialize_dashboard_stats(stats),
+    })
 
 @login_required
 @user_passes_test(is_project_manager, login_url='/login/')
@@ -434,15 +423,14 @@ def pm_sprints(request):
     managed_projects = Project.objects.filter(project_manager=current_user)
     sprints = Sprint.objects.filter(
         project__in=managed_projects
-    ).select_related('project').order_by('-start_date')
+    ).select_related('project').annotate(
+        in_progress_tasks=Count('tasks', filter=Q(tasks__status='in_progress'))
+    ).order_by('-start_date')
     
-    # Calculate sprint statistics
+    # Total/completed counts come from the denormalized sprint counters
     for sprint in sprints:
-        sprint_tasks = Task.objects.filter(sprint=sprint)
-        sprint.total_tasks = sprint_tasks.count()
-        sprint.completed_tasks = sprint_tasks.filter(status='done').count()
-        sprint.in_progress_tasks = sprint_tasks.filter(status='in_progress').count()
-        
+        sprint.total_tasks = sprint.tasks_total
+        sprint.completed_tasks = sprint.tasks_done
         if sprint.total_tasks > 0:
             sprint.progress = int((sprint.completed_tasks / sprint.total_tasks) * 100)
         else:
@@ -474,23 +462,18 @@ def pm_reports(request):
     # Get PM's projects
     projects = Project.objects.filter(project_manager=current_user)
     
-    # Project completion stats
+    # Project completion stats: denormalized totals, plus a live overdue
+    # count since that depends on today's date rather than on writes
     project_stats = []
-    for project in projects:
-        total_tasks = Task.objects.filter(project=project).count()
-        completed_tasks = Task.objects.filter(project=project, status='done').count()
-        overdue_tasks = Task.objects.filter(
-            project=project,
-            due_date__lt=today,
-            status__in=['todo', 'in_progress', 'review']
-        ).count()
-        
+    for project in projects.annotate(
+        overdue_count=Count('tasks', filter=Q(tasks__due_date__lt=today, tasks__status__in=OPEN_STATUSES))
+    ):
         project_stats.append({
             'project': project,
-            'total_tasks': total_tasks,
-            'completed_tasks': completed_tasks,
-            'overdue_tasks': overdue_tasks,
-            'progress': int((completed_tasks / total_tasks * 100)) if total_tasks > 0 else 0,
+            'total_tasks': project.tasks_total,
+            'completed_tasks': project.tasks_done,
+            'overdue_tasks': project.overdue_count,
+            'progress': int((project.tasks_done / project.tasks_total * 100)) if project.tasks_total > 0 else 0,
         })
     
     # Team productivity (last 30 days)
@@ -538,17 +521,21 @@ def update_task_status(request):
             task.status = new_status
             if new_status == 'done':
                 task.completed_at = timezone.now()
-            task.save()
-            
-            # Create notification
-            Notification.objects.create(
-                user=task.assigned_to.user if task.assigned_to else task.project.project_manager,
-                notification_type='task_updated',
-                title=f'Task Updated: {task.title}',
-                message=f'Task status changed to {task.get_status_display()}',
-                related_id=task.id,
-                related_type='task'
-            )
+            with transaction.atomic():
+                task.save()
+                broadcast_project_event(
+                    task.project_id, 'task_status', task_id=task.id, status=task.status, progress=task.progress
+                )
+                
+                # Queue notification
+                enqueue_notification(
+                    task.assigned_to.user_id if task.assigned_to else task.project.project_manager_id,
+                    notification_type='task_updated',
+                    title=f'Task Updated: {task.title}',
+                    message=f'Task status changed to {task.get_status_display()}',
+                    related_id=task.id,
+                    related_type='task'
+                )
             
             return JsonResponse({'success': True})
         except Task.DoesNotExist:
@@ -569,33 +556,34 @@ def add_team_member(request):
             project = Project.objects.get(id=project_id, project_manager=request.user)
             employee = EmployeeProfile.objects.get(id=employee_id)
             
-            # Check if already a member
-            existing_member = ProjectMember.objects.filter(
-                project=project, employee=employee
-            ).first()
-            
-            if existing_member:
-                existing_member.is_active = True
-                existing_member.role = role
-                existing_member.save()
-            else:
-                ProjectMember.objects.create(
-                    project=project,
-                    employee=employee,
-                    role=role,
-                    is_active=True
+            with transaction.atomic():
+                # Check if already a member
+                existing_member = ProjectMember.objects.filter(
+                    project=project, employee=employee
+                ).first()
+                
+                if existing_member:
+                    existing_member.is_active = True
+                    existing_member.role = role
+                    existing_member.save()
+                else:
+                    ProjectMember.objects.create(
+                        project=project,
+                        employee=employee,
+                        role=role,
+                        is_active=True
+                    )
+                
+                # Queue notification
+                enqueue_notification(
+                    employee.user_id,
+                    notification_type='task_assigned',
+                    title=f'Added to Project: {project.name}',
+                    message=f'You have been added to project {project.name} as {role}',
+                    related_id=project.id,
+                    related_type='project'
                 )
             
-            # Create notification
-            Notification.objects.create(
-                user=employee.user,
-                notification_type='task_assigned',
-                title=f'Added to Project: {project.name}',
-                message=f'You have been added to project {project.name} as {role}',
-                related_id=project.id,
-                related_type='project'
-            )
-            
             return JsonResponse({'success': True})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
@@ -613,7 +601,7 @@ import json
 from datetime import datetime, timedelta
 from core.models import (
     Task, Sprint, Project, ProjectMember,
-    EmployeeProfile, User, Notification, Message
+    EmployeeProfile, User, Message
 )
 
 def is_project_manager(user):
@@ -674,45 +662,45 @@ def create_task_api(request):
 
         if assigned_val == 'all':
             # Create one task per active project member
-            members = ProjectMember.objects.filter(project=project, is_active=True).select_related('employee__user')
-            for member in members:
-                t = Task.objects.create(
-                    title=data['title'],
-                    description=data.get('description', ''),
-                    project=project,
-                    assigned_to=member.employee,
-                    task_type=data.get('task_type', 'feature'),
-                    priority=data.get('priority', 'medium'),
-                    estimated_hours=data['estimated_hours'],
-                    due_date=datetime.strptime(data['due_date'], '%Y-%m-%d').date(),
-                    status='todo',
-                    progress=0,
-                    actual_hours=0,
-                    created_by=request.user,
-                    created_at=timezone.now(),
-                    updated_at=timezone.now()
-                )
-
-                # Add to sprint if specified
-                if data.get('sprint_id'):
-                    sprint = get_object_or_404(Sprint, id=data['sprint_id'], project=project)
-                    t.sprint = sprint
-                    t.save()
-
-                # Notify each member
-                try:
-                    Notification.objects.create(
-                        user=member.employee.user,
-                        notification_type='task_assigned',
-                        title=f'New Task Assigned: {t.title}',
-                        message=f'You have been assigned a new task: {t.title}',
-                        related_id=t.id,
-                        related_type='task'
+            members = ProjectMember.objects.filter(project=project, is_active=True).select_related('employee')
+            sprint = None
+            if data.get('sprint_id'):
+                sprint = get_object_or_404(Sprint, id=data['sprint_id'], project=project)
+
+            notification_overrides = {}
+            with transaction.atomic():
+                for member in members:
+                    t = Task.objects.create(
+                        title=data['title'],
+                        description=data.get('description', ''),
+                        project=project,
+                        sprint=sprint,
+                        assigned_to=member.employee,
+                        task_type=data.get('task_type', 'feature'),
+                        priority=data.get('priority', 'medium'),
+                        estimated_hours=data['estimated_hours'],
+                        due_date=datetime.strptime(data['due_date'], '%Y-%m-%d').date(),
+                        status='todo',
+                        progress=0,
+                        actual_hours=0,
+                        created_by=request.user,
+                        created_at=timezone.now(),
+                        updated_at=timezone.now()
                     )
-                except Exception:
-                    pass
-
-                created_task_ids.append(t.id)
+                    notification_overrides[member.employee.user_id] = {'related_id': t.id}
+                    created_task_ids.append(t.id)
+
+                # Notify every member about their own task
+                fan_out(
+                    notification_overrides,
+                    notification={
+                        'notification_type': 'task_assigned',
+                        'title': f'New Task Assigned: {data["title"]}',
+                        'message': f'You have been assigned a new task: {data["title"]}',
+                        'related_type': 'task',
+                    },
+                    notification_overrides=notification_overrides,
+                )
 
             return JsonResponse({
                 'success': True,
@@ -734,43 +722,44 @@ def create_task_api(request):
         if assigned_for_db is not None:
             assigned_employee = EmployeeProfile.objects.filter(id=assigned_for_db).first()
 
-        try:
-            task = Task.objects.create(
-                title=data['title'],
-                description=data.get('description', ''),
-                project=project,
-                assigned_to=assigned_employee,
-                task_type=data.get('task_type', 'feature'),
-                priority=data.get('priority', 'medium'),
-                estimated_hours=data['estimated_hours'],
-                due_date=datetime.strptime(data['due_date'], '%Y-%m-%d').date(),
-                status='todo',
-                progress=0,
-                actual_hours=0,
-                created_by=request.user,
-                created_at=timezone.now(),
-                updated_at=timezone.now()
-            )
-        except Exception as e:
-            print(f"[create_task_api] create single task exception: {e}")
-            return JsonResponse({'success': False, 'error': str(e)})
-
         # Add to sprint if specified
+        sprint = None
         if data.get('sprint_id'):
             sprint = get_object_or_404(Sprint, id=data['sprint_id'], project=project)
-            task.sprint = sprint
-            task.save()
 
-        # Create notification if assigned
-        if task.assigned_to:
-            Notification.objects.create(
-                user=task.assigned_to.user,
-                notification_type='task_assigned',
-                title=f'New Task Assigned: {task.title}',
-                message=f'You have been assigned a new task: {task.title}',
-                related_id=task.id,
-                related_type='task'
-            )
+        try:
+            with transaction.atomic():
+                task = Task.objects.create(
+                    title=data['title'],
+                    description=data.get('description', ''),
+                    project=project,
+                    sprint=sprint,
+                    assigned_to=assigned_employee,
+                    task_type=data.get('task_type', 'feature'),
+                    priority=data.get('priority', 'medium'),
+                    estimated_hours=data['estimated_hours'],
+                    due_date=datetime.strptime(data['due_date'], '%Y-%m-%d').date(),
+                    status='todo',
+                    progress=0,
+                    actual_hours=0,
+                    created_by=request.user,
+                    created_at=timezone.now(),
+                    updated_at=timezone.now()
+                )
+
+                # Queue notification if assigned
+                if task.assigned_to:
+                    enqueue_notification(
+                        task.assigned_to.user_id,
+                        notification_type='task_assigned',
+                        title=f'New Task Assigned: {task.title}',
+                        message=f'You have been assigned a new task: {task.title}',
+                        related_id=task.id,
+                        related_type='task'
+                    )
+        except Exception as e:
+            print(f"[create_task_api] create single task exception: {e}")
+            return JsonResponse({'success': False, 'error': str(e)})
         
         return JsonResponse({
             'success': True,
@@ -840,22 +829,24 @@ def start_sprint_api(request):
                 sprint__isnull=True  # Only add tasks not already in a sprint
             )
             tasks.update(sprint=sprint)
+            # Bulk update bypasses Task.save(), so recount the sprint
+            rebuild_counters(Sprint.objects.filter(pk=sprint.pk))
+        
+        broadcast_project_event(project.id, 'sprint_started', sprint_id=sprint.id, name=sprint.name)
         
         # Notify team members
-        team_members = ProjectMember.objects.filter(
+        team_member_ids = ProjectMember.objects.filter(
             project=project,
             is_active=True
-        ).select_related('employee__user')
-        
-        for member in team_members:
-            Notification.objects.create(
-                user=member.employee.user,
-                notification_type='sprint',
-                title=f'New Sprint Started: {sprint.name}',
-                message=f'A new sprint "{sprint.name}" has started. Goal: {sprint.goal}',
-                related_id=sprint.id,
-                related_type='sprint'
-            )
+        ).values_list('employee__user_id', flat=True)
+        
+        fan_out(team_member_ids, notification={
+            'notification_type': 'sprint',
+            'title': f'New Sprint Started: {sprint.name}',
+            'message': f'A new sprint "{sprint.name}" has started. Goal: {sprint.goal}',
+            'related_id': sprint.id,
+            'related_type': 'sprint',
+        })
         
         return JsonResponse({
             'success': True,
@@ -898,49 +889,50 @@ def add_team_member_api(request):
         # Get employee
         employee = get_object_or_404(EmployeeProfile, id=data['employee_id'])
         
-        # Check if already a member
-        existing_member = ProjectMember.objects.filter(
-            project=project,
-            employee=employee
-        ).first()
-        
-        if existing_member:
-            # Reactivate if previously removed
-            existing_member.is_active = True
-            existing_member.role = data['role']
-            existing_member.save()
-            member = existing_member
-        else:
-            # Create new member
-            member = ProjectMember.objects.create(
+        with transaction.atomic():
+            # Check if already a member
+            existing_member = ProjectMember.objects.filter(
+                project=project,
+                employee=employee
+            ).first()
+            
+            if existing_member:
+                # Reactivate if previously removed
+                existing_member.is_active = True
+                existing_member.role = data['role']
+                existing_member.save()
+                member = existing_member
+            else:
+                # Create new member
+                member = ProjectMember.objects.create(
+                    project=project,
+                    employee=employee,
+                    role=data['role'],
+                    is_active=True,
+                    joined_at=timezone.now()
+                )
+            
+            # Queue notification for the employee
+            enqueue_notification(
+                employee.user_id,
+                notification_type='project',
+                title=f'Added to Project: {project.name}',
+                message=f'You have been added to project "{project.name}" as {member.get_role_display()}',
+                related_id=project.id,
+                related_type='project'
+            )
+            
+            # Send message to the project channel
+            Message.objects.create(
+                sender=request.user,
+                message_type='announcement',
+                subject=f'New Team Member: {employee.user.get_full_name()}',
+                content=f'{employee.user.get_full_name()} has joined the project as {member.get_role_display()}',
                 project=project,
-                employee=employee,
-                role=data['role'],
-                is_active=True,
-                joined_at=timezone.now()
+                is_read=False,
+                created_at=timezone.now()
             )
         
-        # Create notification for the employee
-        Notification.objects.create(
-            user=employee.user,
-            notification_type='project',
-            title=f'Added to Project: {project.name}',
-            message=f'You have been added to project "{project.name}" as {member.get_role_display()}',
-            related_id=project.id,
-            related_type='project'
-        )
-        
-        # Send message to the project channel
-        Message.objects.create(
-            sender=request.user,
-            message_type='announcement',
-            subject=f'New Team Member: {employee.user.get_full_name()}',
-            content=f'{employee.user.get_full_name()} has joined the project as {member.get_role_display()}',
-            project=project,
-            is_read=False,
-            created_at=timezone.now()
-        )
-        
         # Get updated team members for response
         team_members = ProjectMember.objects.filter(
             project=project,
@@ -1003,19 +995,20 @@ def remove_team_member_api(request):
             is_active=True
         )
         
-        # Deactivate instead of delete
-        project_member.is_active = False
-        project_member.save()
-        
-        # Create notification for the employee
-        Notification.objects.create(
-            user=project_member.employee.user,
-            notification_type='project',
-            title=f'Removed from Project: {project.name}',
-            message=f'You have been removed from project "{project.name}"',
-            related_id=project.id,
-            related_type='project'
-        )
+        with transaction.atomic():
+            # Deactivate instead of delete
+            project_member.is_active = False
+            project_member.save()
+            
+            # Queue notification for the employee
+            enqueue_notification(
+                project_member.employee.user_id,
+                notification_type='project',
+                title=f'Removed from Project: {project.name}',
+                message=f'You have been removed from project "{project.name}"',
+                related_id=project.id,
+                related_type='project'
+            )
         
         return JsonResponse({
             'success': True,
@@ -1067,18 +1060,19 @@ def approve_task_api(request, task_id=None):
         task.progress = 100
         task.completed_at = timezone.now()
         task.updated_at = timezone.now()
-        task.save()
-        
-        # Create notification for assignee
-        if task.assigned_to:
-            Notification.objects.create(
-                user=task.assigned_to.user,
-                notification_type='task_completed',
-                title=f'Task Approved: {task.title}',
-                message=f'Your task "{task.title}" has been approved and marked as completed',
-                related_id=task.id,
-                related_type='task'
-            )
+        with transaction.atomic():
+            task.save()
+            
+            # Queue notification for assignee
+            if task.assigned_to:
+                enqueue_notification(
+                    task.assigned_to.user_id,
+                    notification_type='task_completed',
+                    title=f'Task Approved: {task.title}',
+                    message=f'Your task "{task.title}" has been approved and marked as completed',
+                    related_id=task.id,
+                    related_type='task'
+                )
         
         return JsonResponse({
             'success': True,
@@ -1137,29 +1131,30 @@ def request_task_changes_api(request, task_id=None):
         # Update task
         task.status = 'in_progress'  # Send back to in progress
         task.updated_at = timezone.now()
-        task.save()
-        
-        # Create notification for assignee
-        if task.assigned_to:
-            Notification.objects.create(
-                user=task.assigned_to.user,
-                notification_type='task_updated',
-                title=f'Changes Requested: {task.title}',
-                message=f'Changes requested on task "{task.title}": {data["feedback"]}',
-                related_id=task.id,
-                related_type='task'
+        with transaction.atomic():
+            task.save()
+            
+            # Queue notification for assignee
+            if task.assigned_to:
+                enqueue_notification(
+                    task.assigned_to.user_id,
+                    notification_type='task_updated',
+                    title=f'Changes Requested: {task.title}',
+                    message=f'Changes requested on task "{task.title}": {data["feedback"]}',
+                    related_id=task.id,
+                    related_type='task'
+                )
+            
+            # Create comment with feedback
+            from core.models import Comment
+            Comment.objects.create(
+                task=task,
+                user=request.user,
+                content=f"PM requested changes: {data['feedback']}",
+                created_at=timezone.now(),
+                updated_at=timezone.now()
             )
         
-        # Create comment with feedback
-        from core.models import Comment
-        Comment.objects.create(
-            task=task,
-            user=request.user,
-            content=f"PM requested changes: {data['feedback']}",
-            created_at=timezone.now(),
-            updated_at=timezone.now()
-        )
-        
         return JsonResponse({
             'success': True,
             'message': 'Changes requested successfully!',
@@ -1311,37 +1306,30 @@ def schedule_meeting_api(request):
         )
         
         # Get team members
-        team_members = ProjectMember.objects.filter(
+        team_member_ids = ProjectMember.objects.filter(
             project=project,
             is_active=True
-        ).select_related('employee__user')
+        ).values_list('employee__user_id', flat=True)
         
-        # Create message/announcement
+        # Create message/announcement and deliver it with notifications
         meeting_datetime = f"{data['date']} {data['time']}"
-        message = Message.objects.create(
-            sender=request.user,
-            message_type='announcement',
-            subject=f'Team Meeting: {data["title"]}',
-            content=f'Team meeting scheduled for {meeting_datetime}. Agenda: {data.get("agenda", "General discussion")}',
-            project=project,
-            is_read=False,
-            created_at=timezone.now()
-        )
-        
-        # Add recipients
-        for member in team_members:
-            message.recipients.add(member.employee.user)
-        
-        # Create notifications
-        for member in team_members:
-            Notification.objects.create(
-                user=member.employee.user,
-                notification_type='project',
-                title=f'Team Meeting Scheduled: {data["title"]}',
-                message=f'Team meeting scheduled for {meeting_datetime}',
-                related_id=message.id,
-                related_type='message'
+        with transaction.atomic():
+            message = Message.objects.create(
+                sender=request.user,
+                message_type='announcement',
+                subject=f'Team Meeting: {data["title"]}',
+                content=f'Team meeting scheduled for {meeting_datetime}. Agenda: {data.get("agenda", "General discussion")}',
+                project=project,
+                is_read=False,
+                created_at=timezone.now()
             )
+            fan_out(team_member_ids, message=message, notification={
+                'notification_type': 'project',
+                'title': f'Team Meeting Scheduled: {data["title"]}',
+                'message': f'Team meeting scheduled for {meeting_datetime}',
+                'related_id': message.id,
+                'related_type': 'message',
+            })
         
         return JsonResponse({
             'success': True,
@@ -1362,69 +1350,25 @@ def pm_projects(request):
     current_user = request.user
     today = timezone.now().date()
     
-    # Get projects managed by this PM
-    projects = Project.objects.filter(
-        project_manager=current_user
-    ).select_related('department').order_by('-created_at')
-    
-    # Color classes for member avatars
-    color_classes = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron', 'brown-red']
+    # Projects with task/member counts annotated and avatar members prefetched
+    projects = build_project_list_queryset(current_user)
     
-    # Get statistics for each project
     for project in projects:
-        project.task_count = Task.objects.filter(project=project).count()
-        project.completed_tasks = Task.objects.filter(
-            project=project, status='done'
-        ).count()
-        project.active_tasks = Task.objects.filter(
-            project=project, status__in=['todo', 'in_progress']
-        ).count()
-        
         if project.task_count > 0:
             project.progress_percentage = int((project.completed_tasks / project.task_count) * 100)
         else:
             project.progress_percentage = 0
         
         project.days_remaining_val = project.days_remaining()
-        
-        # Get team members for this project
-        project_members = ProjectMember.objects.filter(
-            project=project, is_active=True
-        ).select_related('employee__user')[:6]
-        
-        project.team_members_count = ProjectMember.objects.filter(
-            project=project, is_active=True
-        ).count()
-        
-        # Prepare recent members data for avatars
-        recent_members = []
-        for i, member in enumerate(project_members[:4]):
-            user = member.employee.user
-            initials = f"{user.first_name[0]}{user.last_name[0]}" if user.first_name and user.last_name else user.username[:2].upper()
-            color = color_classes[i % len(color_classes)]
-            recent_members.append({
-                'initials': initials,
-                'color': color,
-                'name': user.get_full_name()
-            })
-        
-        project.recent_members = recent_members
-    
-    # Calculate project status statistics
-    total_projects = projects.count()
-    active_projects = projects.filter(status='active').count()
-    completed_projects = projects.filter(status='completed').count()
-    on_hold_planning_projects = projects.filter(status__in=['on_hold', 'planning']).count()
+        project.recent_members = get_recent_members(project)
     
     context = {
         'user': current_user,
         'projects': projects,
         'today': today,
-        'total_projects': total_projects,
-        'active_projects': active_projects,
-        'completed_projects': completed_projects,
-        'on_hold_planning_projects': on_hold_planning_projects,
     }
+    # Project status statistics
+    context.update(get_project_status_counts(current_user))
     
     return render(request, 'pm/projects.html', context)
 
@@ -1456,6 +1400,12 @@ def pm_team(request):
     for i, project in enumerate(managed_projects):
         project_colors[project.id] = color_classes[i % len(color_classes)]
     
+    # Active task counts for every team member in one query
+    workloads = get_member_workloads(
+        {member.employee_id for member in team_members},
+        statuses=['todo', 'in_progress', 'review']
+    )
+    
     # Process team members data
     processed_members = []
     member_data_dict = {}
@@ -1470,10 +1420,7 @@ def pm_team(request):
             initials = f"{user.first_name[0]}{user.last_name[0]}" if user.first_name and user.last_name else user.username[:2].upper()
             
             # Get active tasks count
-            active_tasks = Task.objects.filter(
-                assigned_to=employee,
-                status__in=['todo', 'in_progress', 'review']
-            ).count()
+            active_tasks = workloads.get(employee.id, 0)
             
             # Calculate workload percentage (max 10 tasks = 100%)
             workload_percentage = min(100, (active_tasks / 10) * 100) if active_tasks > 0 else 0
@@ -1577,7 +1524,7 @@ def get_team_member_details(request, project_id, employee_id):
         
         # Get team member
         project_member = get_object_or_404(
-            ProjectMember,
+            ProjectMember.objects.select_related('employee__user', 'employee__department'),
             project=project,
             employee_id=employee_id,
             is_active=True
@@ -1601,6 +1548,12 @@ def get_team_member_details(request, project_id, employee_id):
                 'due_date': t.due_date.strftime('%Y-%m-%d') if t.due_date else None,
             })
 
+        # Active tasks across all projects, matching the team page workload
+        active_tasks = get_member_workloads(
+            {employee.id},
+            statuses=['todo', 'in_progress', 'review']
+        )[employee.id]
+
         return JsonResponse({
             'success': True,
             'employee_id': employee.id,
@@ -1614,6 +1567,7 @@ def get_team_member_details(request, project_id, employee_id):
             'position': employee.job_position or 'Not specified',
             'department': employee.department.name if employee.department else 'No department',
             'assigned_tasks': assigned_tasks,
+            'active_tasks': active_tasks,
         })
         
     except Exception as e:
@@ -1689,18 +1643,19 @@ def delete_task_api(request):
         # Delete task
         task_id = task.id
         task_title = task.title
-        task.delete()
-        
-        # Create notification for assignee if they exist
-        if task.assigned_to:
-            Notification.objects.create(
-                user=task.assigned_to.user,
-                notification_type='task_updated',
-                title=f'Task Deleted: {task_title}',
-                message=f'Task "{task_title}" has been deleted',
-                related_id=task_id,
-                related_type='task'
-            )
+        with transaction.atomic():
+            task.delete()
+            
+            # Queue notification for assignee if they exist
+            if task.assigned_to:
+                enqueue_notification(
+                    task.assigned_to.user_id,
+                    notification_type='task_updated',
+                    title=f'Task Deleted: {task_title}',
+                    message=f'Task "{task_title}" has been deleted',
+                    related_id=task_id,
+                    related_type='task'
+                )
         
         return JsonResponse({
             'success': True,
@@ -1764,18 +1719,23 @@ def update_task_api(request, task_id):
             task.progress = data['progress']
         
         task.updated_at = timezone.now()
-        task.save()
-        
-        # Create notification for assignee if changed
-        if 'assigned_to' in data and task.assigned_to:
-            Notification.objects.create(
-                user=task.assigned_to.user,
-                notification_type='task_updated',
-                title=f'Task Updated: {task.title}',
-                message=f'Task "{task.title}" has been updated',
-                related_id=task.id,
-                related_type='task'
-            )
+        with transaction.atomic():
+            task.save()
+            if 'status' in data:
+                broadcast_project_event(
+                    task.project_id, 'task_status', task_id=task.id, status=task.status, progress=task.progress
+                )
+            
+            # Queue notification for assignee if changed
+            if 'assigned_to' in data and task.assigned_to:
+                enqueue_notification(
+                    task.assigned_to.user_id,
+                    notification_type='task_updated',
+                    title=f'Task Updated: {task.title}',
+                    message=f'Task "{task.title}" has been updated',
+                    related_id=task.id,
+                    related_type='task'
+                )
         
         return JsonResponse({
             'success': True,
@@ -1870,83 +1830,40 @@ def pm_messages(request):
     current_user = request.user
     today = timezone.now()
     
-    # Get all direct messages for this PM
-    messages = Message.objects.filter(
-        Q(sender=current_user) | Q(recipients=current_user),
-        message_type='direct'
-    ).distinct().order_by('-created_at')
+    colors = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron', 'brown-red']
     
-    # Group by conversation (other user)
+    # Read the conversation index: one row per peer, newest first
     conversations = []
+    for participant in get_inbox(current_user):
+        other_user = participant.peer
+        employee = getattr(other_user, 'employee_profile', None)
+        last_message = participant.conversation.last_message
+
+        # Get last message content
+        last_message_content = ""
+        if last_message:
+            last_message_content = last_message.content
+            if len(last_message_content) > 50:
+                last_message_content = last_message_content[:50] + '...'
+
+        conversations.append({
+            'id': f"conv_{current_user.id}_{other_user.id}",
+            'other_user': other_user,
+            'name': other_user.get_full_name() or other_user.username,
+            'initials': get_user_initials(other_user),
+            'color': f"bg-{colors[other_user.id % len(colors)]}",
+            'job_position': employee.job_position if employee else 'Team Member',
+            'last_message': last_message_content,
+            'last_message_time': participant.last_message_at,
+            'unread_count': participant.unread_count,
+            'unread': participant.unread_count > 0,
+            'is_online': False,
+        })
     
-    # Get unique users from messages
-    users_dict = {}
-    for msg in messages:
-        try:
-            # Determine the other user in conversation
-            if msg.sender == current_user:
-                recipient = msg.recipients.first()
-                other_user = recipient if recipient else None
-            else:
-                other_user = msg.sender
-
-            if not other_user or other_user.id in users_dict:
-                continue
-
-            # Get employee profile
-            employee = EmployeeProfile.objects.filter(user=other_user).first()
-
-            # Get last message between users
-            last_message = Message.objects.filter(
-                Q(sender=current_user, recipients=other_user, message_type='direct') |
-                Q(sender=other_user, recipients=current_user, message_type='direct')
-            ).order_by('-created_at').first()
-
-            # Count unread messages
-            unread_count = Message.objects.filter(
-                sender=other_user,
-                recipients=current_user,
-                is_read=False,
-                message_type='direct'
-            ).count()
-
-            # Get user initials
-            initials = get_user_initials(other_user)
-            
-            # Get color
-            colors = ['dark-teal', 'dark-cyan', 'golden-orange', 'rusty-spice', 'oxidized-iron', 'brown-red']
-            color = f"bg-{colors[other_user.id % len(colors)]}"
-
-            # Get last message content
-            last_message_content = ""
-            if last_message:
-                last_message_content = last_message.content
-                if len(last_message_content) > 50:
-                    last_message_content = last_message_content[:50] + '...'
-
-            # Create conversation entry
-            conversations.append({
-                'id': f"conv_{current_user.id}_{other_user.id}",
-                'other_user': other_user,
-                'name': other_user.get_full_name() or other_user.username,
-                'initials': initials,
-                'color': color,
-                'job_position': employee.job_position if employee else 'Team Member',
-                'last_message': last_message_content,
-                'last_message_time': last_message.created_at if last_message else today,  # Make sure this is datetime
-                'unread_count': unread_count,
-                'unread': unread_count > 0,
-                'is_online': False,  # You can implement online status if needed
-            })
-
-            users_dict[other_user.id] = True
-
-        except Exception as e:
-            logger.exception('Error processing message id=%s', getattr(msg, 'id', None))
-            continue
-    
-    # Sort conversations by last message time
-    conversations.sort(key=lambda x: x['last_message_time'], reverse=True)
+    # Online status for every peer in one ZMSCORE
+    statuses = get_presence(conv['other_user'].id for conv in conversations)
+    for conv in conversations:
+        conv['is_online'] = statuses[conv['other_user'].id]['is_online']
     
     # Mark first conversation as active if there are any
     if conversations: